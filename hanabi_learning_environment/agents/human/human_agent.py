@@ -2,10 +2,10 @@ import rl_env
 from rl_env import Agent
 
 import asyncio
+import collections.abc
 import json
 import uvicorn
 from fastapi import FastAPI, WebSocket
-import threading
 
 
 
@@ -30,7 +30,7 @@ class HumanAgent(Agent):
         print("Invalid input. Please enter a number.")
 
   def act(self, observation):
-    if not isinstance(observation, dict):
+    if not isinstance(observation, collections.abc.Mapping):
         return None
     if observation['current_player_offset'] != 0:
       return None
@@ -41,11 +41,18 @@ class HumanAgent(Agent):
     
     return action
   
-import queue
 class HumanWebAgent(Agent):
+    """Agent whose moves come from a websocket client.
+
+    The coroutines (`act_async`, `update_observation_async`, `act_end_async`)
+    run on the event loop serving the websocket; the blocking `act`,
+    `update_observation` and `act_end` submit them to that loop and wait, for
+    callers running in another thread.
+    """
     def __init__(self):
-        self.action_queue = queue.Queue()
+        self.action_queue = asyncio.Queue()
         self.websocket = None
+        self.loop = None
         self.player_id = -1
         self.last_action = None
     
@@ -54,30 +61,26 @@ class HumanWebAgent(Agent):
 
     def set_websocket(self, websocket: WebSocket):
         self.websocket = websocket
+        self.loop = asyncio.get_event_loop()
 
     def receive_action(self, action_idx):
-        self.action_queue.put(action_idx)
+        """Deliver the client's action; must be called on the websocket's loop."""
+        self.action_queue.put_nowait(action_idx)
 
     async def send_observation(self, observation_data):
-        while self.websocket is None:
-            await asyncio.sleep(0.1)
         await self.websocket.send_json(observation_data)
 
     async def wait_for_action(self):
-        while self.action_queue.empty():
-            await asyncio.sleep(0.1)
-        return self.action_queue.get()
+        return await self.action_queue.get()
+
+    def _run_on_loop(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
 
     def act(self, observation):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        action = loop.run_until_complete(self._act(observation))
-        loop.close()
-        self.last_action = action
-        return action
+        return self._run_on_loop(self.act_async(observation))
 
-    async def _act(self, observation):
-        if not isinstance(observation, dict):
+    async def act_async(self, observation):
+        if not isinstance(observation, collections.abc.Mapping):
             await self.send_observation({'event': f'game end with score {observation}'})
             if self.websocket is not None:
                 await self.websocket.close()
@@ -92,15 +95,14 @@ class HumanWebAgent(Agent):
         print(translate_observation_to_natural_language(data))
         await self.send_observation(data)
         action_idx = await self.wait_for_action()
-        return observation['legal_moves'][action_idx]
+        action = observation['legal_moves'][action_idx]
+        self.last_action = action
+        return action
     
     def act_end(self, episode_reward):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self._act_end(episode_reward))
-        loop.close()
+        self._run_on_loop(self.act_end_async(episode_reward))
 
-    async def _act_end(self, episode_reward):
+    async def act_end_async(self, episode_reward):
         # Send a game-end notification to the client with the final score.
         await self.send_observation({'event': f'game end with score {episode_reward}'})
     
@@ -109,12 +111,9 @@ class HumanWebAgent(Agent):
         Update the client with the latest observation and a waiting status.
         waiting_message: a string such as "Waiting for opponent to play" or "Your turn to play"
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self._update_observation(observation, waiting_message))
-        loop.close()
+        self._run_on_loop(self.update_observation_async(observation, waiting_message))
     
-    async def _update_observation(self, observation, waiting_message):
+    async def update_observation_async(self, observation, waiting_message):
         print("observation try to send", observation)
         observation = observation['player_observations'][self.player_id]
         data = {
@@ -0,0 +1,431 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Decoupled actor/learner training for the Rainbow agent.
+
+In the default training loop a single thread alternates between playing and
+learning: every agent step selects an action, stores a transition and
+periodically runs a training op, so games wait for gradient updates and
+gradient updates wait for games. In actor/learner mode, actor processes play
+self-play games with a recent copy of the online network and send each
+finished episode to the `Learner`. The learner wraps the RainbowAgent of the
+main process: it adds the episodes to the agent's replay memory, trains
+continuously, and publishes the online weights back to the actors every
+`weights_update_period` updates.
+
+As in the default loop, the agent's `training_steps` counts steps played,
+here by the actors, so the epsilon decay and target network syncs keep their
+schedules in environment steps whatever the learner's throughput. Gradient
+updates are not tied to steps: `update_period` is unused and the learner runs
+one update after another, so the number of updates per step played depends on
+the relative speed of the learner and the actors.
+
+`run_experiment.run_experiment` runs in this mode when `num_actors` > 0:
+
+```python
+
+run_experiment.num_actors = 4
+Learner.weights_update_period = 100
+```
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import queue
+import random
+
+import gin.tf
+import numpy as np
+import rainbow_agent
+import tensorflow as tf
+
+
+class SharedWeights(object):
+  """Online network weights published by the learner and read by actors.
+
+  The weights live in one shared float32 array, together with a version
+  number that the learner increments on every publish, so actors copy them
+  only when they changed, and the epsilon actors should explore with.
+  """
+
+  def __init__(self, context, variable_specs):
+    """Allocates the shared memory.
+
+    Args:
+      context: multiprocessing context the actors are started with.
+      variable_specs: list of (name, shape) of the network variables.
+    """
+    self.variable_specs = variable_specs
+    size = sum(int(np.prod(shape)) for _, shape in variable_specs)
+    self._array = context.Array('f', size)
+    # Both are guarded by the lock of _array.
+    self._version = context.Value('q', 0, lock=False)
+    self._epsilon = context.Value('d', 1.0, lock=False)
+
+  def publish(self, weights, epsilon):
+    """Makes weights, a dict of arrays by variable name, the latest version."""
+    with self._array.get_lock():
+      flat = np.frombuffer(self._array.get_obj(), dtype=np.float32)
+      offset = 0
+      for name, shape in self.variable_specs:
+        size = int(np.prod(shape))
+        flat[offset:offset + size] = np.ravel(weights[name])
+        offset += size
+      self._version.value += 1
+      self._epsilon.value = epsilon
+
+  def read(self, version):
+    """Returns the latest weights, if newer than version.
+
+    Args:
+      version: int, version of the weights the caller has, 0 for none.
+
+    Returns:
+      None if version is the latest, else a tuple (version, weights,
+        epsilon) with weights a dict of arrays by variable name.
+    """
+    with self._array.get_lock():
+      if self._version.value == version:
+        return None
+      flat = np.frombuffer(self._array.get_obj(), dtype=np.float32).copy()
+      version = self._version.value
+      epsilon = self._epsilon.value
+    weights = {}
+    offset = 0
+    for name, shape in self.variable_specs:
+      size = int(np.prod(shape))
+      weights[name] = flat[offset:offset + size].reshape(shape)
+      offset += size
+    return version, weights, epsilon
+
+
+class ActorNetwork(object):
+  """Rainbow online network used for acting, with weights set from arrays."""
+
+  def __init__(self, observation_size, num_actions, num_atoms=51, vmax=25.):
+    """Builds the acting graph on the CPU, in its own graph and session.
+
+    Args:
+      observation_size: int, size of the (stacked) observation vector.
+      num_actions: int, number of actions the agent can take.
+      num_atoms: int, the number of buckets of the value distribution. Must
+        match the learner's network.
+      vmax: float, maximum return predicted by a value distribution. Must match
+        the learner's network.
+    """
+    self._graph = tf.Graph()
+    with self._graph.as_default(), tf.device('/cpu:*'):
+      self._state_ph, self._legal_actions_ph, q_argmax = (
+          rainbow_agent.build_greedy_policy(observation_size, num_actions,
+                                            num_atoms, vmax, batch_size=1))
+      self._q_argmax = q_argmax[0]
+
+      self._weight_phs = {}
+      assign_ops = []
+      for variable in tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES,
+                                        scope='Online'):
+        weight_ph = tf.placeholder(variable.dtype.base_dtype,
+                                   variable.shape)
+        self._weight_phs[variable.op.name] = weight_ph
+        assign_ops.append(variable.assign(weight_ph))
+      self._assign_op = tf.group(*assign_ops)
+    # Actors share the host's cores with each other and with the learner.
+    self._sess = tf.Session(
+        '', graph=self._graph,
+        config=tf.ConfigProto(device_count={'GPU': 0},
+                              intra_op_parallelism_threads=1,
+                              inter_op_parallelism_threads=1))
+    self._state = np.zeros((1, observation_size, 1), dtype=np.uint8)
+
+  def set_weights(self, weights):
+    """Sets the network variables from a dict of arrays by variable name."""
+    self._sess.run(self._assign_op,
+                   {weight_ph: weights[name]
+                    for name, weight_ph in self._weight_phs.items()})
+
+  def select_action(self, observation, legal_actions, epsilon):
+    """Returns an epsilon-greedy legal action, as DQNAgent._select_action."""
+    if random.random() <= epsilon:
+      # Choose a random action with probability epsilon.
+      legal_action_indices = np.where(legal_actions == 0.0)
+      return np.random.choice(legal_action_indices[0])
+    self._state[0, :, 0] = observation
+    return self._sess.run(self._q_argmax,
+                          {self._state_ph: self._state,
+                           self._legal_actions_ph: legal_actions[None]})
+
+
+class ActorAgent(object):
+  """Plays self-play games like a training DQNAgent, in an actor process.
+
+  It has the begin_episode/step/end_episode interface that
+  run_experiment.run_one_episode expects, but instead of storing transitions
+  in a replay memory it collects each finished episode, in the order
+  DQNAgent._post_transitions stores it, for the learner to add.
+  """
+
+  def __init__(self, network, num_players):
+    """Initializes the agent.
+
+    Args:
+      network: `ActorNetwork` choosing the actions.
+      num_players: int, number of players playing this game.
+    """
+    self.network = network
+    self.num_players = num_players
+    self.epsilon = 1.0
+    self.eval_mode = False
+    self.transitions = [[] for _ in range(num_players)]
+    self.episodes = []
+
+  def begin_episode(self, current_player, legal_actions, observation):
+    """Returns the agent's first action for current_player."""
+    return self.step(0, current_player, legal_actions, observation)
+
+  def step(self, reward, current_player, legal_actions, observation):
+    """Records the last transition of current_player and chooses an action."""
+    action = self.network.select_action(observation, legal_actions,
+                                        self.epsilon)
+    self.transitions[current_player].append(
+        (reward, np.array(observation, dtype=np.uint8, copy=True),
+         np.array(legal_actions, dtype=np.float32, copy=True), action))
+    return action
+
+  def end_episode(self, final_rewards):
+    """Turns the recorded transitions into an episode for the learner.
+
+    Args:
+      final_rewards: `np.array`, the last rewards from the environment. Each
+        player gets their own reward, which is the sum of the rewards since
+        their last move.
+    """
+    observations, actions, rewards, terminals, legal_actions = (
+        [], [], [], [], [])
+    # Each player's episode is stored consecutively.
+    for player in range(self.num_players):
+      player_transitions = self.transitions[player]
+      for index, (_, observation, legal, action) in enumerate(
+          player_transitions):
+        # Add: o_t, l_t, a_t, r_{t+1}, term_{t+1}
+        final_transition = index == len(player_transitions) - 1
+        if final_transition:
+          rewards.append(final_rewards[player])
+        else:
+          rewards.append(player_transitions[index + 1][0])
+        observations.append(observation)
+        actions.append(action)
+        terminals.append(final_transition)
+        legal_actions.append(legal)
+      self.transitions[player] = []
+    self.episodes.append(
+        (np.array(observations, dtype=np.uint8),
+         np.array(actions, dtype=np.int32),
+         np.array(rewards, dtype=np.float32),
+         np.array(terminals, dtype=np.uint8),
+         np.array(legal_actions, dtype=np.float32)))
+
+
+@gin.configurable(denylist=['agent', 'num_actors', 'actor_fn'])
+class Learner(object):
+  """Trains a RainbowAgent on episodes played by actor processes."""
+
+  def __init__(self,
+               agent,
+               num_actors,
+               actor_fn,
+               weights_update_period=100,
+               episode_queue_size=1000,
+               actor_timeout=600.):
+    """Prepares the shared state. Call start() to launch the actors.
+
+    Args:
+      agent: `RainbowAgent` to train.
+      num_actors: int, number of actor processes.
+      actor_fn: picklable function run in each actor process, called as
+        actor_fn(actor_index, shared_weights, episode_queue, stop_event,
+        num_atoms, vmax). It should play games with the latest weights, put a
+        tuple (episode, episode_length, episode_return) on episode_queue for
+        each game, with episode as built by ActorAgent.end_episode, and return
+        once stop_event is set.
+      weights_update_period: int, number of gradient updates between two
+        publications of the weights to the actors.
+      episode_queue_size: int, maximum number of finished episodes waiting
+        for the learner. Actors block once it is reached.
+      actor_timeout: float, seconds to wait for an episode, while unable to
+        train, before checking that the actors are still alive.
+
+    Raises:
+      ValueError: If agent is not a RainbowAgent or num_actors is not
+        positive.
+    """
+    if not isinstance(agent, rainbow_agent.RainbowAgent):
+      raise ValueError('Actor/learner training requires a RainbowAgent.')
+    if num_actors <= 0:
+      raise ValueError('num_actors must be positive. Got: {}'.format(
+          num_actors))
+    self.agent = agent
+    self.num_actors = num_actors
+    self.weights_update_period = weights_update_period
+    self.actor_timeout = actor_timeout
+    self._actor_fn = actor_fn
+    self._num_updates = 0
+
+    # pylint: disable=protected-access
+    self._sess = agent._sess
+    self._memory = agent._replay.memory
+    # pylint: enable=protected-access
+    # The optimizer's slots are global variables in the same scope; only the
+    # trainable ones are needed to act.
+    self._variables = self._sess.graph.get_collection(
+        tf.GraphKeys.TRAINABLE_VARIABLES, scope='Online')
+
+    # Spawn, rather than fork, so that actors do not inherit the learner's
+    # TensorFlow runtime.
+    self._context = multiprocessing.get_context('spawn')
+    self._weights = SharedWeights(
+        self._context,
+        [(variable.op.name, variable.shape.as_list())
+         for variable in self._variables])
+    self._episode_queue = self._context.Queue(episode_queue_size)
+    self._stop_event = self._context.Event()
+    self._actors = []
+
+  def start(self):
+    """Publishes the current weights and starts the actor processes."""
+    self.publish_weights()
+    for actor_index in range(self.num_actors):
+      actor = self._context.Process(
+          target=self._actor_fn,
+          args=(actor_index, self._weights, self._episode_queue,
+                self._stop_event, self.agent.num_atoms, self.agent.vmax),
+          daemon=True)
+      actor.start()
+      self._actors.append(actor)
+
+  def stop(self):
+    """Stops the actor processes, dropping the episodes still queued."""
+    self._stop_event.set()
+    for actor in self._actors:
+      # Actors may be blocked putting episodes on a full queue.
+      while actor.is_alive():
+        self._drain_episodes()
+        actor.join(timeout=0.1)
+    self._drain_episodes()
+    self._actors = []
+
+  def publish_weights(self):
+    """Sends the online weights and exploration epsilon to the actors."""
+    agent = self.agent
+    epsilon = agent.epsilon_fn(agent.epsilon_decay_period,
+                               agent.training_steps,
+                               agent.min_replay_history,
+                               agent.epsilon_train)
+    values = self._sess.run(self._variables)
+    self._weights.publish(
+        {variable.op.name: value
+         for variable, value in zip(self._variables, values)},
+        float(epsilon))
+
+  def run_phase(self, min_steps, statistics, run_mode_str):
+    """Trains until the actors have played at least min_steps steps.
+
+    Replaces run_experiment.run_one_phase in actor/learner mode.
+
+    Args:
+      min_steps: int, minimum number of environment steps to receive.
+      statistics: `IterationStatistics` object which records the experimental
+        results.
+      run_mode_str: str, describes the run mode for this agent.
+
+    Returns:
+      The number of steps received in this phase, the sum of returns, and the
+        number of episodes received.
+    """
+    step_count = 0
+    num_episodes = 0
+    sum_returns = 0.
+
+    while step_count < min_steps:
+      can_train = self._memory.add_count > self.agent.min_replay_history
+      for episode, episode_length, episode_return in self._receive_episodes(
+          block=not can_train):
+        self._add_episode(episode)
+        self._advance_schedules(episode_length)
+        statistics.append({
+            '{}_episode_lengths'.format(run_mode_str): episode_length,
+            '{}_episode_returns'.format(run_mode_str): episode_return
+        })
+        step_count += episode_length
+        sum_returns += episode_return
+        num_episodes += 1
+      if can_train:
+        self._train()
+
+    return step_count, sum_returns, num_episodes
+
+  def _receive_episodes(self, block):
+    """Returns the queued episodes, waiting for one if block is True."""
+    episodes = []
+    if block:
+      while not episodes:
+        try:
+          episodes.append(self._episode_queue.get(timeout=self.actor_timeout))
+        except queue.Empty:
+          if not all(actor.is_alive() for actor in self._actors):
+            raise RuntimeError('An actor process exited unexpectedly.')
+    while True:
+      try:
+        episodes.append(self._episode_queue.get_nowait())
+      except queue.Empty:
+        return episodes
+
+  def _drain_episodes(self):
+    self._receive_episodes(block=False)
+
+  def _add_episode(self, episode):
+    """Adds the transitions of episode to the replay memory, in order."""
+    observations, actions, rewards, terminals, legal_actions = episode
+    for transition in zip(observations, actions, rewards, terminals,
+                          legal_actions):
+      self._memory.add(*transition)
+
+  def _advance_schedules(self, num_steps):
+    """Advances agent.training_steps by num_steps played by the actors.
+
+    Args:
+      num_steps: int, number of steps played in the received episode.
+    """
+    agent = self.agent
+    previous_steps = agent.training_steps
+    agent.training_steps += num_steps
+    # DQNAgent._train_step syncs when training_steps is a multiple of
+    # target_update_period; do so once if any was passed.
+    if ((agent.training_steps - 1) // agent.target_update_period !=
+        (previous_steps - 1) // agent.target_update_period):
+      self._sess.run(agent._sync_qt_ops)  # pylint: disable=protected-access
+
+  def _train(self):
+    """Runs one gradient update, as DQNAgent._train_step does."""
+    agent = self.agent
+    # pylint: disable=protected-access
+    if not agent.batch_staged:
+      self._sess.run(agent._replay.prefetch_batch)
+      agent.batch_staged = True
+    self._sess.run([agent._train_op, agent._replay.prefetch_batch])
+    # pylint: enable=protected-access
+    self._num_updates += 1
+    if self._num_updates % self.weights_update_period == 0:
+      self.publish_weights()
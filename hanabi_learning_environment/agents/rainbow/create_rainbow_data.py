@@ -20,9 +20,16 @@ import dqn_agent
 
 from utils import parse_args
 from utils import binary_list_to_int as b2int
+from utils import bit_packing
+from utils import game_dataset
 from collections import defaultdict
 import rainbow_agent_wrapper as rainbow
 import pickle
+import random
+import shutil
+import multiprocessing
+import numpy as np
+import pyhanabi
 import rl_env
 import gin
 import tensorflow as tf # version 1.x
@@ -50,10 +57,21 @@ def one_hot_vectorized_action(agent, num_moves, obs):
     return one_hot_action_vector, action
 
 class DataCreator(object):
-    def __init__(self, args):
+    def __init__(self, args, seed=-1):
         self.num_players = args.num_players
         self.num_games = args.num_games
-        self.environment = rl_env.make('Hanabi-Full', num_players=self.num_players)
+        # Same game as rl_env.make('Hanabi-Full'), with an explicit deck seed
+        # (-1 draws one from the system random device).
+        self.game_config = {
+                'colors': 5,
+                'ranks': 5,
+                'players': self.num_players,
+                'max_information_tokens': 8,
+                'max_life_tokens': 3,
+                'observation_type':
+                    pyhanabi.AgentObservationType.CARD_KNOWLEDGE.value,
+                'seed': seed}
+        self.environment = rl_env.HanabiEnv(config=self.game_config)
         self.agent_config = {
                 'players': self.num_players,
                 'num_moves': self.environment.num_moves(),
@@ -62,6 +80,64 @@ class DataCreator(object):
         self.agent_object = rainbow.Agent(self.agent_config)
 
 
+    def play_game_steps(self):
+        '''Play one game and return (observations, actions), one entry per step:
+        the vectorized observation of the acting player and its action index.'''
+        observation_vectors = []
+        action_indices = []
+        observations = self.environment.reset()
+        game_done = False
+
+        while not game_done:
+            for agent_id in range(self.num_players):
+                observation = observations['player_observations'][agent_id]
+                action = self.agent_object.act(observation)
+                observation_vectors.append(observation['vectorized'])
+                action_indices.append(
+                        observation['legal_moves_as_int'][observation['legal_moves'].index(action)])
+
+                if observation['current_player'] == agent_id:
+                    assert action is not None
+                    current_player_action = action
+                else:
+                    assert action is None
+
+                observations, _, game_done, _ = self.environment.step(
+                        current_player_action)
+                if game_done:
+                    break
+
+        return observation_vectors, action_indices
+
+
+    def play_game(self):
+        '''Play one game and return it as [[obs_0, ..., obs_n], [act_0, ..., act_n]].'''
+        observation_vectors, action_indices = self.play_game_steps()
+        num_moves = self.environment.num_moves()
+        observation_size = self.agent_config['observation_size']
+        # Same integers as b2int.convert, packed in one NumPy call for the game.
+        game = [bit_packing.to_big_ints(bit_packing.pack(observation_vectors), observation_size), []]
+        for action_idx in action_indices:
+            one_hot_action_vector = [0]*num_moves
+            one_hot_action_vector[action_idx] = 1
+            game[1].append(one_hot_action_vector)
+        return game
+
+
+    def dataset_writer(self, path):
+        '''Open a game_dataset.GameDatasetWriter for this game at `path`.'''
+        return game_dataset.GameDatasetWriter(
+                path, self.game_config,
+                self.agent_config['observation_size'], self.agent_config['num_moves'])
+
+
+    def write_dataset(self, path):
+        '''Play `num_games` games, appending each one to the dataset at `path`.'''
+        with self.dataset_writer(path) as writer:
+            for _ in range(self.num_games):
+                writer.append_game(*self.play_game_steps())
+
+
     def create_data(self):
         '''Create and return a list of games. Each game has the following structure:
             [ [[obs_0], [obs_1], ..., [obs_n]], [[act_0], [act_1], ..., [act_n]] ]
@@ -69,38 +145,115 @@ class DataCreator(object):
         an agent took at game step i. Each game round consists of num_players game
         steps. A game can have a variable amount of rounds--you can lose early.
         '''
-        raw_data = []
-
-        for game_num in range(self.num_games):
-            raw_data.append([[],[]])
-            observations = self.environment.reset()
-            game_done = False
-
-            while not game_done:
-                for agent_id in range(self.num_players):
-                    observation = observations['player_observations'][agent_id]
-                    one_hot_action_vector, action = one_hot_vectorized_action(
-                            self.agent_object,
-                            self.environment.num_moves(),
-                            observation)
-                    # raw_data[game_num][0].append(
-                    #         observation['vectorized'])
-                    raw_data[game_num][0].append(
-                            b2int.convert(observation['vectorized']))
-                    raw_data[game_num][1].append(one_hot_action_vector)
-
-                    if observation['current_player'] == agent_id:
-                        assert action is not None
-                        current_player_action = action
-                    else:
-                        assert action is None
-
-                    observations, _, game_done, _ = self.environment.step(
-                            current_player_action)
-                    if game_done:
-                        break
-
-        return raw_data
+        return [self.play_game() for _ in range(self.num_games)]
+
+
+# HanabiGame parses its seed as a C int, so seeds must fit in 31 bits.
+MAX_SEED = 2**31 - 1
+
+
+def shard_seed(base_seed, shard_index):
+    '''Seed of a shard, reproducible from (base_seed, shard_index), in [0, MAX_SEED].'''
+    state = np.random.SeedSequence([base_seed, shard_index]).generate_state(1)
+    return int(state[0]) & MAX_SEED
+
+
+def save_path(args):
+    path = os.path.join(args.savedir, "rainbow_" + str(args.num_players) + "_" + str(args.num_games))
+    return path + ".pkl" if args.format == "pickle" else path
+
+
+def shard_path(args, shard_index):
+    path = os.path.join(args.savedir, "rainbow_" + str(args.num_players) + "_" + str(args.num_games)
+                        + ".shard-%05d" % shard_index)
+    return path + ".pkl" if args.format == "pickle" else path
+
+
+def create_shard(args, shard_index, num_games, seed, savepath):
+    '''Play `num_games` games seeded with `seed`, streaming them to `savepath`.
+
+    Games are written one after the other (as a dataset directory, or pickled
+    one by one and read back with `read_shard`), so a worker only ever holds
+    the game it is playing.
+    '''
+    random.seed(seed)
+    np.random.seed(seed)
+    shard_args = argparse.Namespace(**vars(args))
+    shard_args.num_games = num_games
+    data_creator = DataCreator(shard_args, seed=seed)
+    if args.format == "columnar":
+        data_creator.write_dataset(savepath)
+    else:
+        with open(savepath, "wb") as f:
+            for _ in range(num_games):
+                pickle.dump(data_creator.play_game(), f, protocol=pickle.HIGHEST_PROTOCOL)
+    print("Shard %d: %d games written to %s" % (shard_index, num_games, savepath))
+    return savepath
+
+
+def read_shard(path):
+    '''Yield the games of a shard file written by `create_shard`, in order.'''
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def merge_shards(shard_paths, savepath):
+    '''Concatenate shards in the given order into the single-pickle format of `main`.'''
+    rainbow_data = []
+    for path in shard_paths:
+        rainbow_data.extend(read_shard(path))
+    with open(savepath, "wb") as f:
+        pickle.dump(rainbow_data, f)
+    return len(rainbow_data)
+
+
+def merge_datasets(shard_paths, savepath):
+    '''Append shard datasets in the given order to the dataset at `savepath`.'''
+    first = game_dataset.GameDataset(shard_paths[0])
+    # Shards only differ in their deck seed, which the merged dataset leaves out.
+    game_config = dict(first.game_config)
+    game_config.pop('seed', None)
+    num_games = 0
+    with game_dataset.GameDatasetWriter(savepath, game_config,
+                                        first.observation_length, first.num_moves) as writer:
+        for path in shard_paths:
+            shard = game_dataset.GameDataset(path)
+            writer.append_dataset(shard)
+            num_games += shard.num_games
+    return num_games
+
+
+def create_data_parallel(args, savepath):
+    '''Shard `args.num_games` over `args.num_workers` processes and merge the shards.
+
+    Shard i always gets the same games and seed for a given --seed and
+    --num_shards, whatever the number of workers, and the merge follows shard
+    order, so the output only depends on those two flags.
+    '''
+    num_shards = args.num_shards or args.num_workers
+    shards = []
+    for shard_index in range(num_shards):
+        num_games = args.num_games // num_shards + (shard_index < args.num_games % num_shards)
+        shards.append((args, shard_index, num_games, shard_seed(args.seed, shard_index),
+                       shard_path(args, shard_index)))
+    # Spawn fresh interpreters so that no Tensorflow state is shared with the parent.
+    with multiprocessing.get_context("spawn").Pool(args.num_workers) as pool:
+        shard_paths = pool.starmap(create_shard, shards)
+    if args.format == "columnar":
+        num_games = merge_datasets(shard_paths, savepath)
+    else:
+        num_games = merge_shards(shard_paths, savepath)
+    if not args.keep_shards:
+        for path in shard_paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    return num_games
 
 
 def parse():
@@ -109,15 +262,34 @@ def parse():
   parser.add_argument('--num_games', '--n', type=int, default=10, help='Number of games to produce')
   parser.add_argument('--num_players', '--p', type=int, default=2, help='Number of players.')
   parser.add_argument('--savedir', '--s', type=str, default='.')
+  parser.add_argument('--num_workers', '--w', type=int, default=1,
+                      help='Number of worker processes; 1 plays every game in this process.')
+  parser.add_argument('--num_shards', type=int, default=0,
+                      help='Number of shards the games are split into (default: num_workers).')
+  parser.add_argument('--seed', type=int, default=0,
+                      help='Base seed of the shards when num_workers > 1.')
+  parser.add_argument('--format', type=str, default='pickle', choices=['columnar', 'pickle'],
+                      help='columnar: appendable, memory-mappable utils/game_dataset directory; '
+                           'pickle: one pickled list of games.')
+  parser.add_argument('--keep_shards', action='store_true',
+                      help='Keep the per-shard files after merging them.')
 
   args = parser.parse_args()
+  if not 0 <= args.seed <= MAX_SEED:
+    parser.error('--seed must be between 0 and %d.' % MAX_SEED)
   return args
 
 
 def main(args):
+    savepath = save_path(args)
+    if args.num_workers > 1 or args.num_shards > 1:
+        create_data_parallel(args, savepath)
+        return
     data_creator = DataCreator(args)
+    if args.format == "columnar":
+        data_creator.write_dataset(savepath)
+        return
     rainbow_data = data_creator.create_data()
-    savepath = os.path.join(args.savedir, "rainbow_" + str(args.num_players) + "_" + str(args.num_games) + ".pkl")
     pickle.dump(rainbow_data, open(savepath, "wb"))
 
 if __name__ == '__main__':
@@ -0,0 +1,181 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Batched greedy inference for a trained Rainbow network.
+
+A single `InferenceServer` loads a checkpoint once and answers action requests
+from any number of concurrent games. Requests are collected into micro-batches
+(bounded by `max_batch_size` and `max_wait_ms`) and evaluated with one
+`sess.run`, so throughput grows with the batch size instead of the number of
+session calls.
+
+```python
+
+server = InferenceServer(observation_size, num_actions, checkpoint_dir)
+server.start()
+# From any thread:
+action = server.act(observation_vector, legal_moves)
+...
+server.stop()
+```
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import rainbow_agent
+import tensorflow as tf
+
+
+class InferenceServer(object):
+  """Shares one Rainbow network between many games, batching their queries."""
+
+  def __init__(self,
+               observation_size,
+               num_actions,
+               checkpoint_dir,
+               checkpoint_version=None,
+               max_batch_size=64,
+               max_wait_ms=2.0,
+               num_atoms=51,
+               vmax=25.,
+               tf_device='/cpu:*'):
+    """Builds the inference graph and restores the online network weights.
+
+    Args:
+      observation_size: int, size of the (stacked) observation vector.
+      num_actions: int, number of actions the agent can take.
+      checkpoint_dir: str, directory containing the `tf_ckpt-<version>` files
+        written by `DQNAgent.bundle_and_checkpoint`.
+      checkpoint_version: int, checkpoint to restore, or None for the latest.
+      max_batch_size: int, maximum number of requests evaluated together.
+      max_wait_ms: float, longest time the first request of a batch waits for
+        others to arrive before the batch is evaluated.
+      num_atoms: int, the number of buckets of the value distribution. Must
+        match the trained network.
+      vmax: float, maximum return predicted by a value distribution. Must match
+        the trained network.
+      tf_device: str, Tensorflow device on which to run computations.
+    """
+    self.observation_size = observation_size
+    self.num_actions = num_actions
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait_ms / 1000.
+
+    self._graph = tf.Graph()
+    with self._graph.as_default(), tf.device(tf_device):
+      self._states_ph, self._legal_actions_ph, self._q_argmax = (
+          rainbow_agent.build_greedy_policy(observation_size, num_actions,
+                                            num_atoms, vmax))
+      saver = tf.train.Saver(
+          var_list=tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES,
+                                     scope='Online'))
+    self._sess = tf.Session(
+        '', graph=self._graph,
+        config=tf.ConfigProto(allow_soft_placement=True))
+    if checkpoint_version is None:
+      checkpoint_path = tf.train.latest_checkpoint(checkpoint_dir)
+    else:
+      checkpoint_path = os.path.join(
+          checkpoint_dir, 'tf_ckpt-{}'.format(checkpoint_version))
+    saver.restore(self._sess, checkpoint_path)
+
+    self._queue = queue.Queue()
+    self._thread = None
+
+  def select_actions(self, observations, legal_actions):
+    """Returns greedy legal actions for a batch, evaluated immediately.
+
+    Args:
+      observations: `np.array` [batch_size, observation_size].
+      legal_actions: `np.array` [batch_size, num_actions], 0 for legal and
+        -inf for illegal actions.
+
+    Returns:
+      `np.array` of batch_size int actions.
+    """
+    states = np.asarray(observations, dtype=np.uint8)[:, :, None]
+    return self._sess.run(self._q_argmax,
+                          {self._states_ph: states,
+                           self._legal_actions_ph: legal_actions})
+
+  def start(self):
+    """Starts the background thread that serves submitted requests."""
+    if self._thread is None:
+      self._thread = threading.Thread(target=self._serve, daemon=True)
+      self._thread.start()
+
+  def stop(self):
+    """Serves the requests already submitted, then stops the thread."""
+    if self._thread is not None:
+      self._queue.put(None)
+      self._thread.join()
+      self._thread = None
+
+  def submit(self, observation, legal_actions):
+    """Queues a request and returns a `concurrent.futures.Future` action.
+
+    Args:
+      observation: `np.array`, observation vector of one player.
+      legal_actions: `np.array`, 0 for legal and -inf for illegal actions.
+    """
+    assert self._thread is not None, 'Call start() before submitting.'
+    future = concurrent.futures.Future()
+    self._queue.put((observation, legal_actions, future))
+    return future
+
+  def act(self, observation, legal_actions):
+    """Returns the greedy legal action, blocking until it is computed."""
+    return self.submit(observation, legal_actions).result()
+
+  def _serve(self):
+    stopping = False
+    while not stopping:
+      request = self._queue.get()
+      if request is None:
+        break
+      batch = [request]
+      deadline = time.time() + self.max_wait
+      while len(batch) < self.max_batch_size:
+        try:
+          request = self._queue.get(timeout=max(deadline - time.time(), 0))
+        except queue.Empty:
+          break
+        if request is None:
+          stopping = True
+          break
+        batch.append(request)
+      self._run_batch(batch)
+
+  def _run_batch(self, batch):
+    observations = np.empty((len(batch), self.observation_size), np.uint8)
+    legal_actions = np.empty((len(batch), self.num_actions), np.float32)
+    for index, (observation, legal, _) in enumerate(batch):
+      observations[index] = observation
+      legal_actions[index] = legal
+    try:
+      actions = self.select_actions(observations, legal_actions)
+    except Exception as e:  # pylint: disable=broad-except
+      for _, _, future in batch:
+        future.set_exception(e)
+      return
+    for (_, _, future), action in zip(batch, actions):
+      future.set_result(int(action))
@@ -45,7 +45,7 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
   """
 
   def __init__(self, num_actions, observation_size, stack_size, replay_capacity,
-               batch_size, update_horizon=1, gamma=1.0):
+               batch_size, update_horizon=1, gamma=1.0, packed=False):
     """This data structure does the heavy lifting in the replay memory.
 
     Args:
@@ -56,12 +56,14 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
       batch_size: int, batch size.
       update_horizon: int, length of update ('n' in n-step update).
       gamma: int, the discount factor.
+      packed: bool, whether to store observations and legal actions
+        bit-packed.
     """
     super(OutOfGraphPrioritizedReplayMemory, self).__init__(
         num_actions=num_actions,
         observation_size=observation_size, stack_size=stack_size,
         replay_capacity=replay_capacity, batch_size=batch_size,
-        update_horizon=update_horizon, gamma=gamma)
+        update_horizon=update_horizon, gamma=gamma, packed=packed)
 
     self.sum_tree = sum_tree.SumTree(replay_capacity)
 
@@ -109,21 +111,19 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
       batch_size: int, number of indices returned.
 
     Returns:
-      List of size batch_size containing valid indices.
+      `np.array` of batch_size valid indices.
 
     Raises:
       Exception: If the batch was not constructed after maximum number of tries.
     """
-    indices = []
+    indices = np.empty((0), dtype=np.int32)
     allowed_attempts = replay_memory.MAX_SAMPLE_ATTEMPTS
 
     while len(indices) < batch_size and allowed_attempts > 0:
-      index = self.sum_tree.sample()
-
-      if self.is_valid_transition(index):
-        indices.append(index)
-      else:
-        allowed_attempts -= 1
+      candidates = self.sum_tree.stratified_sample(batch_size - len(indices))
+      valid = self.valid_transitions(candidates)
+      indices = np.concatenate([indices, candidates[valid]])
+      allowed_attempts -= np.count_nonzero(~valid)
 
     if len(indices) != batch_size:
       raise Exception('Could only sample {} valid transitions'.format(
@@ -140,8 +140,7 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
     """
     assert indices.dtype == np.int32, ('Indices must be integers, '
                                        'given: {}'.format(indices.dtype))
-    for i, memory_index in enumerate(indices):
-      self.sum_tree.set(memory_index, priorities[i])
+    self.sum_tree.set(indices, priorities)
 
   def get_priority(self, indices, batch_size=None):
     """Fetches the priorities correspond to a batch of memory indices.
@@ -163,8 +162,7 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
 
     assert indices.dtype == np.int32, ('Indices must be integers, '
                                        'given: {}'.format(indices.dtype))
-    for i, memory_index in enumerate(indices):
-      priority_batch[i] = self.sum_tree.get(memory_index)
+    priority_batch[:] = self.sum_tree.get(indices)
 
     return priority_batch
 
@@ -211,7 +209,8 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
                replay_capacity=1000000,
                batch_size=32,
                update_horizon=1,
-               gamma=1.0):
+               gamma=1.0,
+               packed=False):
     """Initializes a graph wrapper for the python Replay Memory.
 
     Args:
@@ -224,6 +223,8 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
       batch_size: int.
       update_horizon: int, length of update ('n' in n-step update).
       gamma: int, the discount factor.
+      packed: bool, whether to store observations and legal actions
+        bit-packed.
 
     Raises:
       ValueError: If update_horizon is not positive.
@@ -232,7 +233,7 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
     memory = OutOfGraphPrioritizedReplayMemory(num_actions, observation_size,
                                                stack_size, replay_capacity,
                                                batch_size, update_horizon,
-                                               gamma)
+                                               gamma, packed)
     super(WrappedPrioritizedReplayMemory, self).__init__(
         num_actions,
         observation_size, stack_size, use_staging, replay_capacity, batch_size,
@@ -71,6 +71,42 @@ def rainbow_template(state,
   return net
 
 
+def build_greedy_policy(observation_size, num_actions, num_atoms=51, vmax=25.,
+                        batch_size=None):
+  """Builds an online network selecting greedy legal actions, for acting.
+
+  The network is built under the 'Online' scope, like a RainbowAgent's, so its
+  variables can be restored or assigned from the agent's by name.
+
+  Args:
+    observation_size: int, size of the (stacked) observation vector.
+    num_actions: int, number of actions the agent can take.
+    num_atoms: int, the number of buckets of the value distribution. Must match
+      the trained network.
+    vmax: float, maximum return predicted by a value distribution. Must match
+      the trained network.
+    batch_size: int, number of states evaluated together, or None for any.
+
+  Returns:
+    states_ph: uint8 `tf.placeholder` [batch_size, observation_size, 1].
+    legal_actions_ph: float32 `tf.placeholder` [batch_size, num_actions], 0
+      for legal and -inf for illegal actions.
+    q_argmax: int64 `tf.Tensor` [batch_size], the greedy legal actions.
+  """
+  online_convnet = tf.make_template(
+      'Online', functools.partial(rainbow_template, num_atoms=num_atoms))
+  states_ph = tf.placeholder(
+      tf.uint8, [batch_size, observation_size, 1], name='states_ph')
+  legal_actions_ph = tf.placeholder(
+      tf.float32, [batch_size, num_actions], name='legal_actions_ph')
+  logits = online_convnet(state=states_ph, num_actions=num_actions)
+  support = tf.linspace(-float(vmax), float(vmax), num_atoms)
+  q_values = tf.reduce_sum(support * tf.contrib.layers.softmax(logits), axis=2)
+  # Ignore illegal actions.
+  q_argmax = tf.argmax(q_values + legal_actions_ph, axis=1)
+  return states_ph, legal_actions_ph, q_argmax
+
+
 @gin.configurable
 class RainbowAgent(dqn_agent.DQNAgent):
   """A compact implementation of the multiplayer Rainbow agent."""
@@ -117,6 +153,7 @@ class RainbowAgent(dqn_agent.DQNAgent):
     # We need this because some tools convert round floats into ints.
     vmax = float(vmax)
     self.num_atoms = num_atoms
+    self.vmax = vmax
     # Using -vmax as the minimum return is is wasteful, because all rewards are
     # positive -- but does not unduly affect performance.
     self.support = tf.linspace(-vmax, vmax, num_atoms)
@@ -13,45 +13,150 @@
 # limitations under the License.
 """Rainbow Agent."""
 
+import asyncio
+import collections
+import concurrent.futures
 import numpy as np
 from rl_env import Agent as _Agent
 from rainbow_agent import RainbowAgent as _RainbowAgent
-from run_experiment import format_legal_moves
 from third_party.dopamine import checkpointer
 import os
+import tensorflow as tf
+import threading
 
-def checkpoint_stuff():
+# Maximum number of pretrained models kept loaded by `load_pretrained_agent`.
+MAX_CACHED_MODELS = 4
+
+# Maps (checkpoint_dir, checkpoint_version, players) to a future
+# `PretrainedModel`, in least recently used order.
+_model_cache = collections.OrderedDict()
+_model_cache_lock = threading.Lock()
+
+
+class PretrainedModel(object):
+  """A loaded agent, shared by the callers using the same checkpoint."""
+
+  def __init__(self, agent):
+    self.agent = agent
+    self.lock = threading.Lock()
+    self.closed = False
+
+  def close(self):
+    """Closes the agent's session once the current user releases the lock."""
+    with self.lock:
+      if not self.closed:
+        self.closed = True
+        self.agent._sess.close()
+
+
+def default_checkpoint_dir():
   base_dir = os.path.dirname(os.path.abspath(__file__))
-  checkpoint_dir = os.path.join(base_dir, 'pretrained_model')
-  exp_checkpointer = checkpointer.Checkpointer(checkpoint_dir, 'ckpt')
+  return os.path.join(base_dir, 'pretrained_model')
+
+
+def latest_checkpoint(checkpoint_dir=None):
+  """Returns (checkpoint_dir, latest version) without loading the checkpoint."""
+  if checkpoint_dir is None:
+    checkpoint_dir = default_checkpoint_dir()
   checkpoint_version = checkpointer.get_latest_checkpoint_number(checkpoint_dir)
-  
-  assert checkpoint_version >=0
+  assert checkpoint_version >= 0
+  return checkpoint_dir, checkpoint_version
+
+
+def load_pretrained_agent(config, checkpoint_dir=None, checkpoint_version=None):
+  """Returns a `PretrainedModel` shared by every caller with the same key.
+
+  Models are keyed by (checkpoint_dir, checkpoint_version, players). Each one
+  is built in its own graph and session, so several versions can be loaded at
+  once. A model is loaded outside the cache lock, so only callers asking for
+  the same key wait for it. Past `MAX_CACHED_MODELS` the least recently used
+  model is dropped from the cache and closed. Callers must hold `model.lock`
+  while using `model.agent`, whose action selection is stateful, and load the
+  model again if they find it closed.
+
+  Args:
+    config: dict, with keys 'players', 'num_moves' and 'observation_size'.
+    checkpoint_dir: str, directory of the checkpoint, or None for the bundled
+      pretrained model.
+    checkpoint_version: int, version to load, or None for the latest one.
+
+  Returns:
+    A `PretrainedModel`.
+  """
+  if checkpoint_dir is None or checkpoint_version is None:
+    checkpoint_dir, latest_version = latest_checkpoint(checkpoint_dir)
+    if checkpoint_version is None:
+      checkpoint_version = latest_version
+  key = (checkpoint_dir, checkpoint_version, config['players'])
+  evicted = []
+  with _model_cache_lock:
+    future = _model_cache.get(key)
+    load = future is None
+    if not load:
+      _model_cache.move_to_end(key)
+    else:
+      future = concurrent.futures.Future()
+      _model_cache[key] = future
+      while len(_model_cache) > MAX_CACHED_MODELS:
+        evicted.append(_model_cache.popitem(last=False)[1])
+  for evicted_future in evicted:
+    evicted_future.add_done_callback(_close_model)
+
+  if load:
+    try:
+      future.set_result(_load_model(config, checkpoint_dir, checkpoint_version))
+    except BaseException as e:
+      with _model_cache_lock:
+        if _model_cache.get(key) is future:
+          del _model_cache[key]
+      future.set_exception(e)
+  return future.result()
+
+
+def _load_model(config, checkpoint_dir, checkpoint_version):
+  print("loading from the path:", checkpoint_dir, checkpoint_version)
+  exp_checkpointer = checkpointer.Checkpointer(checkpoint_dir, 'ckpt')
   dqn_dictionary = exp_checkpointer.load_checkpoint(checkpoint_version)
-  return checkpoint_dir, checkpoint_version, dqn_dictionary
+  with tf.Graph().as_default():
+    agent = _RainbowAgent(
+        observation_size=config['observation_size'],
+        num_actions=config['num_moves'],
+        num_players=config['players'])
+  agent.eval_mode = True
+  assert agent.unbundle(checkpoint_dir, checkpoint_version, dqn_dictionary),\
+        'agent was unable to unbundle'
+  assert 'logs' in dqn_dictionary # FIXME: necessary?
+  assert 'current_iteration' in dqn_dictionary # FIXME: necessary?
+  return PretrainedModel(agent)
+
+
+def _close_model(future):
+  if future.exception() is None:
+    future.result().close()
+
 
 class Agent(_Agent):
   """Agent that loads and applies a pretrained rainbow model."""
   def __init__(self, config, *args, **kwargs):
-    """Initialize the agent."""
+    """Initialize the agent.
+
+    The model is shared with the other agents using the same checkpoint and
+    number of players; pass `checkpoint_dir` and `checkpoint_version` keyword
+    arguments to select another checkpoint than the latest bundled one.
+    """
     self.config = config
-    self.agent = _RainbowAgent(
-        observation_size=self.config['observation_size'],
-        num_actions=self.config['num_moves'],
-        num_players=self.config['players'])
-    
-    self.agent.eval_mode = True
-    
-    checkpoint_dir, checkpoint_version, dqn_dictionary = checkpoint_stuff()
-    print("loading from the path:",checkpoint_dir, checkpoint_version)
-    assert self.agent.unbundle(checkpoint_dir, checkpoint_version, dqn_dictionary),\
-          'agent was unable to unbundle'
-    assert 'logs' in dqn_dictionary # FIXME: necessary?
-    assert 'current_iteration' in dqn_dictionary # FIXME: necessary?
+    self.checkpoint_dir = kwargs.get('checkpoint_dir')
+    self.checkpoint_version = kwargs.get('checkpoint_version')
+    self._load_model()
+
+  def _load_model(self):
+    self.model = load_pretrained_agent(
+        self.config, self.checkpoint_dir, self.checkpoint_version)
+    self.agent = self.model.agent
 
   def _parse_observation(self, current_player_observation):
-    legal_moves = current_player_observation['legal_moves_as_int']
-    legal_moves = format_legal_moves(legal_moves, self.config['num_moves'])
+    legal_moves = current_player_observation['pyhanabi'].legal_moves_mask(
+        additive=True)
     observation_vector = np.array(current_player_observation['vectorized']) #FIXME: this may need to be cast as np.float64
 
     return legal_moves, observation_vector
@@ -61,9 +166,49 @@ class Agent(_Agent):
     #import pdb; pdb.set_trace()
     
     legal_moves, observation_vector = self._parse_observation(observation)
-    action = self.agent._select_action(observation_vector, legal_moves)
+    while True:
+      with self.model.lock:
+        if not self.model.closed:
+          action = self.agent._select_action(observation_vector, legal_moves)
+          break
+      # The model was evicted from the cache and closed.
+      self._load_model()
     action = observation['legal_moves'][observation['legal_moves_as_int'].index(action)]
     
     return action
 
+
+class BatchedAgent(Agent):
+  """Agent that asks a shared `InferenceServer` for its actions.
+
+  Many games can hold a `BatchedAgent` on the same server: the network is
+  loaded once and concurrent `act` calls are evaluated in micro-batches.
+  """
+  def __init__(self, config, server, *args, **kwargs):
+    """Initialize the agent.
+
+    Args:
+      config: dict, with the same keys as for `Agent`.
+      server: a started `inference_server.InferenceServer`.
+    """
+    self.config = config
+    self.server = server
+
+  def act(self, observation):
+    """Act based on the observation of the current player."""
+    legal_moves, observation_vector = self._parse_observation(observation)
+    action = self.server.act(observation_vector, legal_moves)
+    action = observation['legal_moves'][observation['legal_moves_as_int'].index(action)]
+
+    return action
+
+  async def act_async(self, observation):
+    """Like `act`, awaiting the server instead of blocking the thread."""
+    legal_moves, observation_vector = self._parse_observation(observation)
+    action = await asyncio.wrap_future(
+        self.server.submit(observation_vector, legal_moves))
+    action = observation['legal_moves'][observation['legal_moves_as_int'].index(action)]
+
+    return action
+
     
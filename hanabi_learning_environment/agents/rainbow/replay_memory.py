@@ -39,6 +39,7 @@ import pickle
 import gin.tf
 import numpy as np
 import tensorflow as tf
+from utils import bit_packing
 
 
 # This constant determines how many iterations a checkpoint is kept for.
@@ -60,8 +61,7 @@ def invalid_range(cursor, replay_capacity, stack_size):
     `np.array` of size stack_size with the invalid indices.
   """
   assert cursor < replay_capacity
-  return np.array(
-      [(cursor - 1 + i) % replay_capacity for i in range(stack_size)])
+  return (cursor - 1 + np.arange(stack_size)) % replay_capacity
 
 
 class OutOfGraphReplayMemory(object):
@@ -71,18 +71,26 @@ class OutOfGraphReplayMemory(object):
   efficiently when the states consist of stacks. The writing behaves like
   a FIFO buffer and the sampling is uniformly random.
 
+  In packed mode, observations are stored 8 features per byte and legal
+  actions as a bitmask of the legal (0-valued) entries, as in
+  bit_packing.pack. Only sampled batches are unpacked, with illegal actions
+  restored as -inf, so the memory uses about 8 times less space for
+  observations and 32 times less for legal actions.
+
   Attributes:
     add_count:  counter of how many transitions have been added.
-    observations: `np.array`, circular buffer of observations.
+    observations: `np.array`, circular buffer of observations, packed in
+      packed mode.
     actions: `np.array`, circular buffer of actions.
     rewards: `np.array`, circular buffer of rewards.
     terminals: `np.array`, circular buffer of terminals.
-    legal_actions: `np.array`, circular buffer of legal actions for hanabi.
+    legal_actions: `np.array`, circular buffer of legal actions for hanabi,
+      packed in packed mode.
     invalid_range: `np.array`, currently invalid indices.
   """
 
   def __init__(self, num_actions, observation_size, stack_size, replay_capacity,
-               batch_size, update_horizon=1, gamma=1.0):
+               batch_size, update_horizon=1, gamma=1.0, packed=False):
     """Data structure doing the heavy lifting.
 
     Args:
@@ -93,7 +101,10 @@ class OutOfGraphReplayMemory(object):
       batch_size: int, batch size.
       update_horizon: int, length of update ('n' in n-step update).
       gamma: float, the discount factor.
+      packed: bool, whether to store observations and legal actions
+        bit-packed.
     """
+    self._packed = packed
     self._observation_size = observation_size
     self._num_actions = num_actions
     self._replay_capacity = replay_capacity
@@ -109,18 +120,34 @@ class OutOfGraphReplayMemory(object):
         dtype=np.float32)
 
     # Create numpy arrays used to store sampled transitions.
-    self.observations = np.empty(
-        (replay_capacity, observation_size), dtype=np.uint8)
+    if packed:
+      self.observations = np.empty(
+          (replay_capacity, bit_packing.packed_length(observation_size)),
+          dtype=np.uint8)
+      self.legal_actions = np.empty(
+          (replay_capacity, bit_packing.packed_length(num_actions)),
+          dtype=np.uint8)
+    else:
+      self.observations = np.empty(
+          (replay_capacity, observation_size), dtype=np.uint8)
+      self.legal_actions = np.empty((replay_capacity, num_actions),
+                                    dtype=np.float32)
     self.actions = np.empty((replay_capacity), dtype=np.int32)
     self.rewards = np.empty((replay_capacity), dtype=np.float32)
     self.terminals = np.empty((replay_capacity), dtype=np.uint8)
-    self.legal_actions = np.empty((replay_capacity, num_actions),
-                                  dtype=np.float32)
     self.reset_state_batch_arrays(batch_size)
     self.add_count = np.array(0)
 
     self.invalid_range = np.zeros((self._stack_size))
 
+    # Offsets, relative to a transition's index, of the frames in its state
+    # stack and of the steps in its n-step trajectory.
+    self._stack_offsets = np.arange(1 - stack_size, 1)
+    self._trajectory_offsets = np.arange(update_horizon)
+    # _terminal_free[i] is True if no frame of the stack ending at i, other
+    # than the last, is terminal. Maintained by _add for sampling.
+    self._terminal_free = np.ones((replay_capacity), dtype=np.bool_)
+
   def add(self, observation, action, reward, terminal, legal_actions):
     """Adds a transition to the replay memory.
 
@@ -146,14 +173,29 @@ class OutOfGraphReplayMemory(object):
 
   def _add(self, observation, action, reward, terminal, legal_actions):
     cursor = self.cursor()
-    self.observations[cursor] = observation
+    if self._packed:
+      self.observations[cursor] = bit_packing.pack(observation)
+      self.legal_actions[cursor] = bit_packing.pack(
+          np.asarray(legal_actions) == 0)
+    else:
+      self.observations[cursor] = observation
+      self.legal_actions[cursor] = legal_actions
     self.actions[cursor] = action
     self.rewards[cursor] = reward
     self.terminals[cursor] = terminal
-    self.legal_actions[cursor] = legal_actions
     self.add_count += 1
     self.invalid_range = invalid_range(self.cursor(), self._replay_capacity,
                                        self._stack_size)
+    # The terminal written at cursor is a non-last frame of the stacks ending
+    # after it.
+    self._update_terminal_free(cursor + 1 + np.arange(self._stack_size - 1))
+
+  def _update_terminal_free(self, indices):
+    """Recomputes _terminal_free at indices."""
+    indices = indices % self._replay_capacity
+    stacks = (indices[:, None] + self._stack_offsets[:-1]) % (
+        self._replay_capacity)
+    self._terminal_free[indices] = ~self.terminals[stacks].any(axis=1)
 
   def is_empty(self):
     """Is the replay memory empty?"""
@@ -194,8 +236,38 @@ class OutOfGraphReplayMemory(object):
 
   def get_observation_stack(self, index):
     state = self.get_stack(self.observations, index)
+    if self._packed:
+      state = bit_packing.unpack(state, self._observation_size)
     return np.transpose(state, [1, 0])
 
+  def get_observation_stacks(self, indices):
+    """Returns the observation stacks at indices.
+
+    Args:
+      indices: `np.array` of ints, indices to the last frame of each stack.
+    Returns:
+      `np.array` with shape (len(indices), observation_size, stack_size)
+    """
+    stack_indices = (indices[:, None] + self._stack_offsets) % (
+        self._replay_capacity)
+    stacks = self.observations[stack_indices]
+    if self._packed:
+      stacks = bit_packing.unpack(stacks, self._observation_size)
+    return np.transpose(stacks, [0, 2, 1])
+
+  def get_legal_actions(self, indices):
+    """Returns the legal actions at indices, 0 if legal and -inf otherwise.
+
+    Args:
+      indices: `np.array` of ints.
+    Returns:
+      `np.array` float32 with shape (len(indices), num_actions)
+    """
+    if not self._packed:
+      return self.legal_actions[indices]
+    legal = bit_packing.unpack(self.legal_actions[indices], self._num_actions)
+    return np.where(legal, 0, -np.inf).astype(np.float32)
+
   def get_terminal_stack(self, index):
     return self.get_stack(self.terminals, index)
 
@@ -213,27 +285,37 @@ class OutOfGraphReplayMemory(object):
       bool, True if transition is valid.
 
     """
+    return bool(self.valid_transitions(np.array([index]))[0])
+
+  def valid_transitions(self, indices):
+    """Checks which of the indices contain a valid transition.
+
+    Vectorized is_valid_transition.
+
+    Args:
+      indices: `np.array` of ints, indices to the states in the transitions.
+
+    Returns:
+      `np.array` of bools, True where the transition is valid.
+    """
+    indices = np.asarray(indices)
+    cursor = self.cursor()
     # Range checks
-    if index < 0 or index >= self._replay_capacity:
-      return False
+    valid = (indices >= 0) & (indices < self._replay_capacity)
     if not self.is_full():
       # The indices and next_indices must be smaller than the cursor.
-      if index >= self.cursor() - self._update_horizon:
-        return False
+      valid &= indices < cursor - self._update_horizon
       # The first few indices contain the padding states of the first episode.
-      if index < self._stack_size - 1:
-        return False
+      valid &= indices >= self._stack_size - 1
 
-    # Skip transitions that straddle the cursor.
-    if index in set(self.invalid_range):
-      return False
+    # Skip transitions that straddle the cursor, i.e. those in invalid_range.
+    valid &= (indices - cursor + 1) % self._replay_capacity >= self._stack_size
 
     # If there are terminal flags in any other frame other than the last one
     # the stack is not valid, so don't sample it.
-    if self.get_terminal_stack(index)[:-1].any():
-      return False
-
-    return True
+    valid &= self._terminal_free[np.clip(indices, 0,
+                                         self._replay_capacity - 1)]
+    return valid
 
   def reset_state_batch_arrays(self, batch_size):
     self._next_state_batch = np.empty(
@@ -248,23 +330,30 @@ class OutOfGraphReplayMemory(object):
       batch_size: int, number of indices returned.
 
     Returns:
-      list of batch_size, containing valid indices.
+      `np.array` of batch_size valid indices.
 
     Raises:
       Exception: If the batch was not constructed after maximum number of tries.
     """
-    indices = []
+    indices = np.empty((0), dtype=np.int32)
     attempt_count = 0
     while len(indices) < batch_size and attempt_count < MAX_SAMPLE_ATTEMPTS:
-      attempt_count += 1
+      # Draw twice the missing number of candidates, so that a single round
+      # is almost always enough.
+      num_candidates = min(2 * (batch_size - len(indices)),
+                           MAX_SAMPLE_ATTEMPTS - attempt_count)
+      attempt_count += num_candidates
       # index references the state and index + 1 points to next_state
       if self.is_full():
-        index = np.random.randint(0, self._replay_capacity)
+        candidates = np.random.randint(0, self._replay_capacity,
+                                       size=num_candidates)
       else:
         # Can't start at 0 because the buffer is not yet circular
-        index = np.random.randint(self._stack_size - 1, self.cursor() - 1)
-      if self.is_valid_transition(index):
-        indices.append(index)
+        candidates = np.random.randint(self._stack_size - 1,
+                                       self.cursor() - 1, size=num_candidates)
+      candidates = candidates[self.valid_transitions(candidates)]
+      indices = np.concatenate(
+          [indices, candidates[:batch_size - len(indices)]])
     if len(indices) != batch_size:
       raise Exception('I tried %i times but only sampled %i valid transitions' %
                       (MAX_SAMPLE_ATTEMPTS, len(indices)))
@@ -300,48 +389,34 @@ class OutOfGraphReplayMemory(object):
       indices = self.sample_index_batch(batch_size)
     assert len(indices) == batch_size
 
+    indices = np.asarray(indices)
+    indices_batch = indices.astype(np.int32)
     action_batch = self.actions[indices]
-    reward_batch = np.empty((batch_size), dtype=np.float32)
-    terminal_batch = np.empty((batch_size), dtype=np.uint8)
-    indices_batch = np.empty((batch_size), dtype=np.int32)
-    next_legal_actions_batch = np.empty((batch_size, self._num_actions),
-                                        dtype=np.float32)
-
-    for batch_element, memory_index in enumerate(indices):
-      indices_batch[batch_element] = memory_index
-
-      self._state_batch[batch_element] = self.get_observation_stack(
-          memory_index)
-
-      # Compute indices in the replay memory up to n steps ahead.
-      trajectory_indices = [(memory_index + j) % self._replay_capacity for
-                            j in range(self._update_horizon)]
-
-      # Determine if this trajectory segment contains a terminal state.
-      terminals_in_trajectory = np.nonzero(self.terminals[trajectory_indices])
-      if terminals_in_trajectory[0].size == 0:
-        # If not, sum rewards along the trajectory, property discounted.
-        terminal_batch[batch_element] = 0
-        reward_batch[batch_element] = self._cumulative_discount_vector.dot(
-            self.rewards[trajectory_indices])
-      else:
-        # Updates leading to a terminal state require a little more care, in
-        # particular to avoid summing rewards past the end of the episode.
-        terminal_batch[batch_element] = 1
-        # Fetch smallest index corresponding to a terminal state.
-        terminal_index = np.min(terminals_in_trajectory)
-
-        truncated_discount_vector = (
-            self._cumulative_discount_vector[0:terminal_index + 1])
-        reward_batch[batch_element] = truncated_discount_vector.dot(
-            self.rewards[trajectory_indices[0:terminal_index + 1]])
-
-      bootstrap_state_index = (
-          (memory_index + self._update_horizon) % self._replay_capacity)
-      self._next_state_batch[batch_element] = (
-          self.get_observation_stack(bootstrap_state_index))
-      next_legal_actions_batch[batch_element] = (
-          self.legal_actions[bootstrap_state_index])
+
+    self._state_batch[...] = self.get_observation_stacks(indices)
+
+    # Compute indices in the replay memory up to n steps ahead.
+    trajectory_indices = (indices[:, None] + self._trajectory_offsets) % (
+        self._replay_capacity)
+
+    # Determine if each trajectory segment contains a terminal state, and sum
+    # the rewards up to and including the first one, properly discounted, to
+    # avoid summing rewards past the end of the episode.
+    terminals_in_trajectory = self.terminals[trajectory_indices] != 0
+    terminal_batch = terminals_in_trajectory.any(axis=1).astype(np.uint8)
+    first_terminal = np.where(terminal_batch,
+                              terminals_in_trajectory.argmax(axis=1),
+                              self._update_horizon - 1)
+    in_episode = self._trajectory_offsets <= first_terminal[:, None]
+    reward_batch = np.where(in_episode, self.rewards[trajectory_indices],
+                            0).dot(self._cumulative_discount_vector).astype(
+                                np.float32)
+
+    bootstrap_state_indices = (
+        (indices + self._update_horizon) % self._replay_capacity)
+    self._next_state_batch[...] = self.get_observation_stacks(
+        bootstrap_state_indices)
+    next_legal_actions_batch = self.get_legal_actions(bootstrap_state_indices)
 
     return (self._state_batch, action_batch, reward_batch,
             self._next_state_batch, terminal_batch, indices_batch,
@@ -422,6 +497,7 @@ class OutOfGraphReplayMemory(object):
             self.__dict__[attr] = np.load(infile, allow_pickle=False)
           else:
             self.__dict__[attr] = pickle.load(infile)
+    self._update_terminal_free(np.arange(self._replay_capacity))
 
 
 @gin.configurable(denylist=['observation_size', 'stack_size'])
@@ -459,7 +535,8 @@ class WrappedReplayMemory(object):
                batch_size=32,
                update_horizon=1,
                gamma=1.0,
-               wrapped_memory=None):
+               wrapped_memory=None,
+               packed=False):
     """Initializes a graph wrapper for the python replay memory.
 
     Args:
@@ -474,6 +551,8 @@ class WrappedReplayMemory(object):
       gamma: int, the discount factor.
       wrapped_memory: The 'inner' memory data structure. Defaults to None, which
         creates the standard DQN replay memory.
+      packed: bool, whether the standard DQN replay memory stores observations
+        and legal actions bit-packed.
 
     Raises:
       ValueError: If update_horizon is not positive.
@@ -494,7 +573,7 @@ class WrappedReplayMemory(object):
     else:
       self.memory = OutOfGraphReplayMemory(
           num_actions, observation_size, stack_size,
-          replay_capacity, batch_size, update_horizon, gamma)
+          replay_capacity, batch_size, update_horizon, gamma, packed)
 
     with tf.name_scope('replay'):
       with tf.name_scope('add_placeholders'):
@@ -27,10 +27,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import functools
+import queue
 import time
 
 from third_party.dopamine import checkpointer
 from third_party.dopamine import iteration_statistics
+import actor_learner
 import dqn_agent
 import gin.tf
 from hanabi_learning_environment import rl_env
@@ -42,23 +45,36 @@ LENIENT_SCORE = False
 
 
 class ObservationStacker(object):
-  """Class for stacking agent observations."""
+  """Class for stacking agent observations.
 
-  def __init__(self, history_size, observation_size, num_players):
+  Each player's last history_size observations are kept in a circular buffer
+  with a write cursor, so adding an observation copies only that observation.
+  Stacks, oldest observation first, are assembled when requested.
+
+  The stacker can hold num_envs independent games. The single-game methods
+  use game 0; the batched ones update or read every game in one call.
+  """
+
+  def __init__(self, history_size, observation_size, num_players, num_envs=1):
     """Initializer for observation stacker.
 
     Args:
       history_size: int, number of time steps to stack.
       observation_size: int, size of observation vector on one time step.
       num_players: int, number of players.
+      num_envs: int, number of games to keep stacks for.
     """
     self._history_size = history_size
     self._observation_size = observation_size
     self._num_players = num_players
-    self._obs_stacks = list()
-    for _ in range(0, self._num_players):
-      self._obs_stacks.append(np.zeros(self._observation_size *
-                                       self._history_size))
+    self._num_envs = num_envs
+    self._obs_buffers = np.zeros(
+        (num_envs, num_players, history_size, observation_size))
+    # Slot of each buffer that the next observation overwrites, which holds
+    # the oldest observation.
+    self._cursors = np.zeros((num_envs, num_players), dtype=np.int64)
+    self._envs = np.arange(num_envs)
+    self._history_offsets = np.arange(history_size)
 
   def add_observation(self, observation, current_player):
     """Adds observation for the current player.
@@ -67,25 +83,68 @@ class ObservationStacker(object):
       observation: observation vector for current player.
       current_player: int, current player id.
     """
-    self._obs_stacks[current_player] = np.roll(self._obs_stacks[current_player],
-                                               -self._observation_size)
-    self._obs_stacks[current_player][(self._history_size - 1) *
-                                     self._observation_size:] = observation
+    cursor = self._cursors[0, current_player]
+    self._obs_buffers[0, current_player, cursor] = observation
+    self._cursors[0, current_player] = (cursor + 1) % self._history_size
+
+  def add_observations(self, observations, current_players):
+    """Adds one observation for the current player of every game.
+
+    Args:
+      observations: `np.array` [num_envs, observation_size], observation of
+        each game's current player.
+      current_players: `np.array` [num_envs] of ints, current player ids.
+    """
+    cursors = self._cursors[self._envs, current_players]
+    self._obs_buffers[self._envs, current_players, cursors] = observations
+    self._cursors[self._envs, current_players] = (
+        (cursors + 1) % self._history_size)
 
-  def get_observation_stack(self, current_player):
+  def get_observation_stack(self, current_player, out=None):
     """Returns the stacked observation for current player.
 
     Args:
       current_player: int, current player id.
+      out: optional `np.array` of observation_size() elements to write the
+        stack into, e.g. a slice of the agent's input.
     """
+    if out is None:
+      out = np.empty(self.observation_size())
+    buffer = self._obs_buffers[0, current_player]
+    split = (self._history_size -
+             self._cursors[0, current_player]) * self._observation_size
+    out[:split] = buffer[self._cursors[0, current_player]:].ravel()
+    out[split:] = buffer[:self._cursors[0, current_player]].ravel()
+    return out
+
+  def get_observation_stacks(self, current_players, out=None):
+    """Returns the stacked observation for the current player of every game.
 
-    return self._obs_stacks[current_player]
-
-  def reset_stack(self):
-    """Resets the observation stacks to all zero."""
+    Args:
+      current_players: `np.array` [num_envs] of ints, current player ids.
+      out: optional `np.array` [num_envs, observation_size()] to write the
+        stacks into.
+    """
+    slots = (self._cursors[self._envs, current_players][:, None] +
+             self._history_offsets) % self._history_size
+    stacks = self._obs_buffers[self._envs[:, None],
+                               current_players[:, None], slots]
+    if out is None:
+      return stacks.reshape(self._num_envs, self.observation_size())
+    out[...] = stacks.reshape(self._num_envs, self.observation_size())
+    return out
+
+  def reset_stack(self, envs=None):
+    """Resets the observation stacks to all zero.
 
-    for i in range(0, self._num_players):
-      self._obs_stacks[i].fill(0.0)
+    Args:
+      envs: optional `np.array` of game indices to reset. All games are reset
+        if None.
+    """
+    if envs is None:
+      envs = self._envs
+    self._obs_buffers[envs] = 0.0
+    self._cursors[envs] = 0
 
   @property
   def history_size(self):
@@ -226,28 +285,6 @@ def initialize_checkpointing(agent, experiment_logger, checkpoint_dir,
   return start_iteration, experiment_checkpointer
 
 
-def format_legal_moves(legal_moves, action_dim):
-  """Returns formatted legal moves.
-
-  This function takes a list of actions and converts it into a fixed size vector
-  of size action_dim. If an action is legal, its position is set to 0 and -Inf
-  otherwise.
-  Ex: legal_moves = [0, 1, 3], action_dim = 5
-      returns [0, 0, -Inf, 0, -Inf]
-
-  Args:
-    legal_moves: list of legal actions.
-    action_dim: int, number of actions.
-
-  Returns:
-    a vector of size action_dim.
-  """
-  new_legal_moves = np.full(action_dim, -float('inf'))
-  if legal_moves:
-    new_legal_moves[legal_moves] = 0
-  return new_legal_moves
-
-
 def parse_observations(observations, num_actions, obs_stacker):
   """Deconstructs the rich observation data into relevant components.
 
@@ -267,8 +304,8 @@ def parse_observations(observations, num_actions, obs_stacker):
   current_player_observation = (
       observations['player_observations'][current_player])
 
-  legal_moves = current_player_observation['legal_moves_as_int']
-  legal_moves = format_legal_moves(legal_moves, num_actions)
+  legal_moves = current_player_observation['pyhanabi'].legal_moves_mask(
+      additive=True)
 
   observation_vector = current_player_observation['vectorized']
   obs_stacker.add_observation(observation_vector, current_player)
@@ -372,11 +409,54 @@ def run_one_phase(agent, environment, obs_stacker, min_steps, statistics,
   return step_count, sum_returns, num_episodes
 
 
+def run_actor(actor_index, shared_weights, episode_queue, stop_event,
+              num_atoms, vmax, config_str):
+  """Plays training games in an actor process until stop_event is set.
+
+  The target of the actor processes started by `actor_learner.Learner`.
+
+  Args:
+    actor_index: int, index of this actor.
+    shared_weights: `actor_learner.SharedWeights` published by the learner.
+    episode_queue: queue receiving (episode, episode_length, episode_return)
+      for each game played.
+    stop_event: event set when the actor should return.
+    num_atoms: int, number of atoms of the learner's value distribution.
+    vmax: float, maximum return of the learner's value distribution.
+    config_str: str, gin configuration of the learner process.
+  """
+  gin.parse_config(config_str)
+  environment = create_environment()
+  obs_stacker = create_obs_stacker(environment)
+  network = actor_learner.ActorNetwork(obs_stacker.observation_size(),
+                                       environment.num_moves(), num_atoms,
+                                       vmax)
+  agent = actor_learner.ActorAgent(network, environment.players)
+  tf.logging.info('Actor %d started.', actor_index)
+
+  version = 0
+  while not stop_event.is_set():
+    update = shared_weights.read(version)
+    if update is not None:
+      version, weights, agent.epsilon = update
+      network.set_weights(weights)
+    episode_length, episode_return = run_one_episode(agent, environment,
+                                                     obs_stacker)
+    message = (agent.episodes.pop(), episode_length, episode_return)
+    while not stop_event.is_set():
+      try:
+        episode_queue.put(message, timeout=0.1)
+        break
+      except queue.Full:
+        pass
+
+
 @gin.configurable
 def run_one_iteration(agent, environment, obs_stacker,
                       iteration, training_steps,
                       evaluate_every_n=100,
-                      num_evaluation_games=100):
+                      num_evaluation_games=100,
+                      learner=None):
   """Runs one iteration of agent/environment interaction.
 
   An iteration involves running several episodes until a certain number of
@@ -390,6 +470,8 @@ def run_one_iteration(agent, environment, obs_stacker,
     training_steps: int, the number of training steps to perform.
     evaluate_every_n: int, frequency of evaluation.
     num_evaluation_games: int, number of games per evaluation.
+    learner: `actor_learner.Learner` training agent on the games of actor
+      processes, or None to play the training games here.
 
   Returns:
     A dict containing summary statistics for this iteration.
@@ -400,9 +482,13 @@ def run_one_iteration(agent, environment, obs_stacker,
 
   # First perform the training phase, during which the agent learns.
   agent.eval_mode = False
-  number_steps, sum_returns, num_episodes = (
-      run_one_phase(agent, environment, obs_stacker, training_steps, statistics,
-                    'train'))
+  if learner is None:
+    number_steps, sum_returns, num_episodes = (
+        run_one_phase(agent, environment, obs_stacker, training_steps,
+                      statistics, 'train'))
+  else:
+    number_steps, sum_returns, num_episodes = (
+        learner.run_phase(training_steps, statistics, 'train'))
   time_delta = time.time() - start_time
   tf.logging.info('Average training steps per second: %.2f',
                   number_steps / time_delta)
@@ -484,27 +570,43 @@ def run_experiment(agent,
                    training_steps=5000,
                    logging_file_prefix='log',
                    log_every_n=1,
-                   checkpoint_every_n=1):
-  """Runs a full experiment, spread over multiple iterations."""
+                   checkpoint_every_n=1,
+                   num_actors=0):
+  """Runs a full experiment, spread over multiple iterations.
+
+  If num_actors is positive, training games are played by that many actor
+  processes while this process only trains agent; see actor_learner.
+  """
   tf.logging.info('Beginning training...')
   if num_iterations <= start_iteration:
     tf.logging.warning('num_iterations (%d) < start_iteration(%d)',
                        num_iterations, start_iteration)
     return
 
-  for iteration in range(start_iteration, num_iterations):
-    start_time = time.time()
-    statistics = run_one_iteration(agent, environment, obs_stacker, iteration,
-                                   training_steps)
-    tf.logging.info('Iteration %d took %d seconds', iteration,
-                    time.time() - start_time)
-    start_time = time.time()
-    log_experiment(experiment_logger, iteration, statistics,
-                   logging_file_prefix, log_every_n)
-    tf.logging.info('Logging iteration %d took %d seconds', iteration,
-                    time.time() - start_time)
-    start_time = time.time()
-    checkpoint_experiment(experiment_checkpointer, agent, experiment_logger,
-                          iteration, checkpoint_dir, checkpoint_every_n)
-    tf.logging.info('Checkpointing iteration %d took %d seconds', iteration,
-                    time.time() - start_time)
+  learner = None
+  if num_actors > 0:
+    learner = actor_learner.Learner(
+        agent, num_actors,
+        functools.partial(run_actor, config_str=gin.config_str()))
+    learner.start()
+  try:
+    for iteration in range(start_iteration, num_iterations):
+      start_time = time.time()
+      statistics = run_one_iteration(agent, environment, obs_stacker, iteration,
+                                     training_steps, learner=learner)
+      tf.logging.info('Iteration %d took %d seconds', iteration,
+                      time.time() - start_time)
+      start_time = time.time()
+      log_experiment(experiment_logger, iteration, statistics,
+                     logging_file_prefix, log_every_n)
+      tf.logging.info('Logging iteration %d took %d seconds', iteration,
+                      time.time() - start_time)
+      start_time = time.time()
+      checkpoint_experiment(experiment_checkpointer, agent, experiment_logger,
+                            iteration, checkpoint_dir, checkpoint_every_n)
+      tf.logging.info('Checkpointing iteration %d took %d seconds', iteration,
+                      time.time() - start_time)
+  finally:
+    if learner is not None:
+      learner.stop()
+
@@ -22,7 +22,6 @@ from __future__ import division
 from __future__ import print_function
 
 import math
-import random
 
 import numpy as np
 
@@ -52,14 +51,15 @@ class SumTree(object):
   |0.5|     |1.0|  |0.5|     |0.5|
   +---+     +---+  +---+     +---+
 
-  This is stored in a list of numpy arrays:
-  self.nodes = [ [2.5], [1.5, 1], [0.5, 1, 0.5, 0.5] ]
+  This is stored in a single numpy array, level by level from the root:
+  self.nodes = [2.5, 1.5, 1, 0.5, 1, 0.5, 0.5]
 
-  For conciseness, we allocate arrays as powers of two, and pad the excess
-  elements with zero values.
+  so the children of node i are nodes 2i + 1 and 2i + 2, and leaf j is node
+  leaf_offset + j. For conciseness, we allocate a power of two leaves, and pad
+  the excess elements with zero values.
 
-  This is similar to the usual array-based representation of a complete binary
-  tree, but is a little more user-friendly.
+  Sampling, get and set accept arrays of queries or indices and process them
+  together, one numpy operation per tree level.
   """
 
   def __init__(self, capacity):
@@ -77,24 +77,51 @@ class SumTree(object):
       raise ValueError('Sum tree capacity should be positive. Got: {}'.
                        format(capacity))
 
-    self.nodes = []
-    tree_depth = int(math.ceil(np.log2(capacity)))
-    level_size = 1
-    for _ in range(tree_depth + 1):
-      nodes_at_this_depth = np.zeros(level_size)
-      self.nodes.append(nodes_at_this_depth)
-
-      level_size *= 2
+    self.tree_depth = int(math.ceil(np.log2(capacity)))
+    self.leaf_offset = 2**self.tree_depth - 1
+    self.nodes = np.zeros(2 * self.leaf_offset + 1)
 
     self.max_recorded_priority = 1.0
 
+  def __setstate__(self, state):
+    """Restores pickled sum trees, including those stored as lists of levels."""
+    if isinstance(state['nodes'], list):
+      levels = state.pop('nodes')
+      state['tree_depth'] = len(levels) - 1
+      state['leaf_offset'] = 2**state['tree_depth'] - 1
+      state['nodes'] = np.concatenate(levels)
+    self.__dict__.update(state)
+
   def _total_priority(self):
     """Returns the sum of all priorities stored in this sum tree.
 
     Returns:
       float, sum of priorities stored in this sum tree.
     """
-    return self.nodes[0][0]
+    return self.nodes[0]
+
+  def _find(self, query_values):
+    """Returns the elements whose cumulative priority ranges hold the queries.
+
+    Args:
+      query_values: `np.array` of floats in [0, R), where R is the total
+        priority.
+
+    Returns:
+      `np.array` of ints, the element selected by each query.
+    """
+    query_values = np.array(query_values, dtype=np.float64)
+    node_indices = np.zeros(query_values.shape, dtype=np.int64)
+    for _ in range(self.tree_depth):
+      left_children = 2 * node_indices + 1
+      left_sums = self.nodes[left_children]
+      # Each subtree describes a range [0, a), where a is its value. Recurse
+      # into the right subtree where the query is past the left one, and make
+      # the query relative to it.
+      go_right = query_values >= left_sums
+      query_values -= np.where(go_right, left_sums, 0.)
+      node_indices = left_children + go_right
+    return node_indices - self.leaf_offset
 
   def sample(self, query_value=None):
     """Samples an element from the sum tree.
@@ -120,25 +147,8 @@ class SumTree(object):
       raise ValueError('query_value must be in [0, 1].')
 
     # Sample a value in range [0, R), where R is the value stored at the root.
-    query_value = random.random() if query_value is None else query_value
-    query_value *= self._total_priority()
-
-    # Now traverse the sum tree.
-    node_index = 0
-    for nodes_at_this_depth in self.nodes[1:]:
-      # Compute children of previous depth's node.
-      left_child = node_index * 2
-
-      left_sum = nodes_at_this_depth[left_child]
-      # Each subtree describes a range [0, a), where a is its value.
-      if query_value < left_sum:  # Recurse into left subtree.
-        node_index = left_child
-      else:  # Recurse into right subtree.
-        node_index = left_child + 1
-        # Adjust query to be relative to right subtree.
-        query_value -= left_sum
-
-    return node_index
+    query_value = np.random.random() if query_value is None else query_value
+    return int(self._find([query_value * self._total_priority()])[0])
 
   def stratified_sample(self, batch_size):
     """Performs stratified sampling using the sum tree.
@@ -151,7 +161,7 @@ class SumTree(object):
     Args:
       batch_size: int, the number of strata to use.
     Returns:
-      list of batch_size elements sampled from the sum tree.
+      `np.array` of batch_size elements sampled from the sum tree.
 
     Raises:
       Exception: If the sum tree is empty (i.e. its node values sum to 0).
@@ -161,45 +171,70 @@ class SumTree(object):
 
     bounds = np.linspace(0., 1., batch_size + 1)
     assert len(bounds) == batch_size + 1
-    segments = [(bounds[i], bounds[i+1]) for i in range(batch_size)]
-    query_values = [random.uniform(x[0], x[1]) for x in segments]
-    return [self.sample(query_value=x) for x in query_values]
+    query_values = np.random.uniform(bounds[:-1], bounds[1:])
+    return self._find(query_values * self._total_priority())
 
   def get(self, node_index):
     """Returns the value of the leaf node corresponding to the index.
 
     Args:
-      node_index: The index of the leaf node.
+      node_index: int or `np.array` of ints, the index of the leaf node.
     Returns:
-      The value of the leaf node.
+      The value of the leaf node, or an `np.array` of values.
     """
-    return self.nodes[-1][node_index]
+    return self.nodes[self.leaf_offset + np.asarray(node_index)]
 
   def set(self, node_index, value):
-    """Sets the value of a leaf node and updates internal nodes accordingly.
+    """Sets the value of leaf nodes and updates internal nodes accordingly.
 
-    This operation takes O(log(capacity)).
+    This operation takes O(log(capacity)) numpy operations, however many
+    leaves are set. If an index is repeated, the last of its values is kept.
     Args:
-      node_index: int, the index of the leaf node to be updated.
-      value: float, the value which we assign to the node. This value must be
-        nonnegative. Setting value = 0 will cause the element to never be
-        sampled.
+      node_index: int or `np.array` of ints, the index of the leaf node to be
+        updated.
+      value: float or `np.array` of floats, the value which we assign to the
+        node. This value must be nonnegative. Setting value = 0 will cause the
+        element to never be sampled.
 
     Raises:
       ValueError: If the given value is negative.
     """
+    if np.ndim(node_index) == 0:
+      self._set_one(node_index, value)
+      return
+    node_index = np.asarray(node_index)
+    value = np.broadcast_to(np.asarray(value, dtype=np.float64),
+                            node_index.shape)
+    if node_index.size == 0:
+      return
+    if np.any(value < 0.0):
+      raise ValueError('Sum tree values should be nonnegative. Got {}'.
+                       format(value[value < 0.0][0]))
+    self.max_recorded_priority = max(value.max(), self.max_recorded_priority)
+
+    # Keep the last value of each index, as sequential sets would.
+    _, last = np.unique(node_index[::-1], return_index=True)
+    node_index = node_index[::-1][last]
+    nodes = self.leaf_offset + node_index
+    self.nodes[nodes] = value[::-1][last]
+
+    # Now traverse back the tree, recomputing the sums along the way. Siblings
+    # share a parent, which is then written twice with the same sum.
+    for _ in range(self.tree_depth):
+      nodes = (nodes - 1) // 2
+      self.nodes[nodes] = (self.nodes[2 * nodes + 1] +
+                           self.nodes[2 * nodes + 2])
+
+  def _set_one(self, node_index, value):
+    """Sets the value of a single leaf node; see set."""
     if value < 0.0:
       raise ValueError('Sum tree values should be nonnegative. Got {}'.
                        format(value))
     self.max_recorded_priority = max(value, self.max_recorded_priority)
 
-    delta_value = value - self.nodes[-1][node_index]
-
-    # Now traverse back the tree, adjusting all sums along the way.
-    for nodes_at_this_depth in reversed(self.nodes):
-      # Note: Adding a delta leads to some tolerable numerical inaccuracies.
-      nodes_at_this_depth[node_index] += delta_value
-      node_index //= 2
-
-    assert node_index == 0, ('Sum tree traversal failed, final node index '
-                             'is not 0.')
+    node = self.leaf_offset + node_index
+    self.nodes[node] = value
+    # Now traverse back the tree, recomputing the sums along the way.
+    while node > 0:
+      node = (node - 1) // 2
+      self.nodes[node] = self.nodes[2 * node + 1] + self.nodes[2 * node + 2]
@@ -1,3 +1,6 @@
+from utils import bit_packing
+
+
 def convert(bin_list):
     """ Convert a binary list into an integer.
     Arguments:
@@ -6,7 +9,9 @@ def convert(bin_list):
     Returns:
         - Converted integer.
     """
-    return sum(x << i for i, x in enumerate(reversed(bin_list)))
+    if len(bin_list) == 0:
+        return 0
+    return bit_packing.to_big_ints(bit_packing.pack(bin_list), len(bin_list))[0]
 
 def revert(x, length):
     """ Revert an integer back to a binary list.
@@ -17,4 +22,7 @@ def revert(x, length):
             Total length of the binary list that will be returned.
             If x >= (2^length), there will be no padding.
     """
-    return [int(i) for i in list(format(x, '0%db' % length))]
\ No newline at end of file
+    # Like format(x, '0%db' % length), always returns at least one digit.
+    length = max(length, x.bit_length(), 1)
+    return bit_packing.unpack(bit_packing.from_big_ints([x], length)[0],
+                              length).tolist()
@@ -0,0 +1,63 @@
+""" Batched conversion between 0/1 observation vectors and packed bytes.
+
+Packed rows follow np.packbits: the first element of a vector is the most
+significant bit of the first byte, and the last byte is padded with zeros.
+The big-int representation of binary_list_to_int.convert (first element is the
+most significant bit of the integer) is the same bit string without the
+padding, so both convert into each other one C-level call per row.
+"""
+import numpy as np
+
+
+def packed_length(length):
+    """ Number of bytes of a packed row of `length` bits."""
+    return (length + 7) // 8
+
+
+def pack(bits):
+    """ Pack 0/1 vectors into bytes.
+    Arguments:
+        - bits: array-like [N, length] (or [length])
+            Values in {0, 1}.
+    Returns:
+        - uint8 array [N, packed_length(length)] (or [packed_length(length)]).
+    """
+    return np.packbits(np.asarray(bits, dtype=np.uint8), axis=-1)
+
+
+def unpack(packed, length):
+    """ Inverse of pack.
+    Arguments:
+        - packed: uint8 array [N, packed_length(length)] (or 1-D).
+        - length: int
+            Number of bits of each unpacked vector.
+    Returns:
+        - uint8 array [N, length] (or [length]) of 0s and 1s.
+    """
+    return np.unpackbits(np.asarray(packed, dtype=np.uint8), axis=-1,
+                         count=length)
+
+
+def from_big_ints(values, length):
+    """ Pack integers written by binary_list_to_int.convert.
+    Arguments:
+        - values: iterable of int
+            Each the big-int form of a `length`-bit vector.
+        - length: int
+            Number of bits of the original vectors.
+    Returns:
+        - uint8 array [N, packed_length(length)], as returned by pack.
+    """
+    num_bytes = packed_length(length)
+    padding = 8 * num_bytes - length
+    buffer = b''.join((value << padding).to_bytes(num_bytes, 'big')
+                      for value in values)
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(-1, num_bytes)
+
+
+def to_big_ints(packed, length):
+    """ Inverse of from_big_ints: packed rows to binary_list_to_int integers."""
+    packed = np.ascontiguousarray(packed, dtype=np.uint8).reshape(
+        -1, packed_length(length))
+    padding = 8 * packed.shape[1] - length
+    return [int.from_bytes(row.tobytes(), 'big') >> padding for row in packed]
@@ -0,0 +1,242 @@
+""" Columnar on-disk storage for generated games.
+
+A dataset is a directory holding:
+    - metadata.json: format version, game config, observation length and
+      number of moves.
+    - observations.bin: every observation of every game, one bit-packed row
+      (np.packbits order) of ceil(observation_length / 8) bytes per step.
+    - actions.bin: int32 action index of every step.
+    - game_offsets.bin: int64 index of the first step of every game, followed
+      by the total number of steps, so game i spans steps
+      [offsets[i], offsets[i + 1]).
+
+The binary files are raw little-endian arrays, so games can be appended to an
+existing dataset and the whole dataset read back as memory-mapped NumPy arrays
+without decoding anything.
+"""
+import json
+import os
+import pickle
+
+import numpy as np
+
+from utils import bit_packing
+
+FORMAT_VERSION = 1
+
+METADATA_FILE = 'metadata.json'
+OBSERVATIONS_FILE = 'observations.bin'
+ACTIONS_FILE = 'actions.bin'
+GAME_OFFSETS_FILE = 'game_offsets.bin'
+
+ACTION_DTYPE = np.dtype('<i4')
+OFFSET_DTYPE = np.dtype('<i8')
+
+
+def _read_metadata(path):
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    if metadata['format_version'] != FORMAT_VERSION:
+        raise ValueError('Unsupported dataset format version %s in %s'
+                         % (metadata['format_version'], path))
+    return metadata
+
+
+class GameDatasetWriter(object):
+    """ Appends games to a dataset directory, creating it if needed.
+
+    Arguments:
+        - path: str
+            Dataset directory.
+        - game_config: dict
+            Config of the game the data comes from, stored in the metadata.
+        - observation_length: int
+            Length of the unpacked observation vectors.
+        - num_moves: int
+            Number of distinct actions.
+    """
+    def __init__(self, path, game_config, observation_length, num_moves):
+        self.path = path
+        metadata = {
+            'format_version': FORMAT_VERSION,
+            'game_config': game_config,
+            'observation_length': observation_length,
+            'num_moves': num_moves,
+        }
+        if os.path.exists(os.path.join(path, METADATA_FILE)):
+            existing = _read_metadata(path)
+            if existing != json.loads(json.dumps(metadata)):
+                raise ValueError('Dataset %s was written with metadata %s, not %s'
+                                 % (path, existing, metadata))
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, GAME_OFFSETS_FILE), 'wb') as f:
+                f.write(np.zeros(1, OFFSET_DTYPE).tobytes())
+            for name in (OBSERVATIONS_FILE, ACTIONS_FILE):
+                open(os.path.join(path, name), 'wb').close()
+            # Written last: a directory without metadata is not a dataset yet.
+            with open(os.path.join(path, METADATA_FILE), 'w') as f:
+                json.dump(metadata, f, indent=2, sort_keys=True)
+
+        self.observation_length = observation_length
+        self._num_steps = self._truncate_partial_game()
+        self._observations = open(os.path.join(path, OBSERVATIONS_FILE), 'ab')
+        self._actions = open(os.path.join(path, ACTIONS_FILE), 'ab')
+        self._game_offsets = open(os.path.join(path, GAME_OFFSETS_FILE), 'ab')
+
+    def _truncate_partial_game(self):
+        """ Drop what an interrupted writer left past the last complete game.
+
+        Returns:
+            - Number of steps in the complete games.
+        """
+        offsets_path = os.path.join(self.path, GAME_OFFSETS_FILE)
+        offsets_size = os.path.getsize(offsets_path)
+        offsets_size -= offsets_size % OFFSET_DTYPE.itemsize
+        os.truncate(offsets_path, offsets_size)
+        offsets = np.fromfile(offsets_path, OFFSET_DTYPE)
+        num_steps = int(offsets[-1])
+        file_sizes = {
+            os.path.join(self.path, OBSERVATIONS_FILE):
+                num_steps * bit_packing.packed_length(self.observation_length),
+            os.path.join(self.path, ACTIONS_FILE):
+                num_steps * ACTION_DTYPE.itemsize,
+        }
+        for file_path, size in file_sizes.items():
+            if os.path.getsize(file_path) < size:
+                raise ValueError('%s holds fewer than the %d steps listed in %s'
+                                 % (file_path, num_steps, offsets_path))
+        for file_path, size in file_sizes.items():
+            os.truncate(file_path, size)
+        return num_steps
+
+    def append_game(self, observations, actions):
+        """ Append one game.
+        Arguments:
+            - observations: array-like [num_steps, observation_length]
+                Unpacked 0/1 observation vectors.
+            - actions: array-like [num_steps]
+                Action index taken at each step.
+        """
+        observations = np.asarray(observations, dtype=np.uint8)
+        assert observations.ndim == 2
+        assert observations.shape[1] == self.observation_length
+        self.append_packed_game(bit_packing.pack(observations), actions)
+
+    def append_packed_game(self, packed_observations, actions):
+        """ Append one game whose observations are already packed with bit_packing.pack."""
+        packed_observations = np.ascontiguousarray(packed_observations, dtype=np.uint8)
+        actions = np.asarray(actions, dtype=ACTION_DTYPE)
+        assert packed_observations.shape == (
+            len(actions), bit_packing.packed_length(self.observation_length))
+        self._observations.write(packed_observations.tobytes())
+        self._actions.write(actions.tobytes())
+        self._num_steps += len(actions)
+        self._game_offsets.write(
+            np.array([self._num_steps], OFFSET_DTYPE).tobytes())
+
+    def append_dataset(self, dataset, chunk_steps=1 << 16):
+        """ Append every game of another GameDataset, copying packed rows as is."""
+        assert dataset.observation_length == self.observation_length
+        for start in range(0, dataset.num_steps, chunk_steps):
+            stop = min(start + chunk_steps, dataset.num_steps)
+            self._observations.write(
+                np.ascontiguousarray(dataset.observations[start:stop]).tobytes())
+            self._actions.write(
+                np.ascontiguousarray(dataset.actions[start:stop]).tobytes())
+        offsets = np.asarray(dataset.game_offsets[1:], OFFSET_DTYPE) + self._num_steps
+        self._game_offsets.write(offsets.tobytes())
+        self._num_steps += dataset.num_steps
+
+    def flush(self):
+        # The offsets go last so that a reader never sees a game whose
+        # observations or actions are not on disk yet.
+        self._observations.flush()
+        self._actions.flush()
+        self._game_offsets.flush()
+
+    def close(self):
+        self.flush()
+        for f in (self._observations, self._actions, self._game_offsets):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_exc_info):
+        self.close()
+
+
+def _memmap(path, dtype, shape):
+    if shape[0] == 0:
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+
+class GameDataset(object):
+    """ Read-only, memory-mapped view of a dataset directory.
+
+    Arguments:
+        - path: str
+            Dataset directory written by GameDatasetWriter.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.metadata = _read_metadata(path)
+        self.observation_length = self.metadata['observation_length']
+        self.num_moves = self.metadata['num_moves']
+        self.game_config = self.metadata['game_config']
+
+        offsets_path = os.path.join(path, GAME_OFFSETS_FILE)
+        num_offsets = os.path.getsize(offsets_path) // OFFSET_DTYPE.itemsize
+        # Only complete games: steps past the last offset are still being written.
+        self.game_offsets = _memmap(offsets_path, OFFSET_DTYPE, (num_offsets,))
+        num_steps = int(self.game_offsets[-1])
+        self.observations = _memmap(
+            os.path.join(path, OBSERVATIONS_FILE), np.uint8,
+            (num_steps, bit_packing.packed_length(self.observation_length)))
+        self.actions = _memmap(
+            os.path.join(path, ACTIONS_FILE), ACTION_DTYPE, (num_steps,))
+
+    @property
+    def num_games(self):
+        return len(self.game_offsets) - 1
+
+    @property
+    def num_steps(self):
+        return len(self.actions)
+
+    def unpack_observations(self, start=0, stop=None):
+        """ Return steps [start, stop) as an unpacked uint8 [n, observation_length] array."""
+        return bit_packing.unpack(self.observations[start:stop],
+                                  self.observation_length)
+
+    def game(self, index):
+        """ Return the (packed observations, actions) of game `index` as views."""
+        start, stop = self.game_offsets[index], self.game_offsets[index + 1]
+        return self.observations[start:stop], self.actions[start:stop]
+
+
+def convert_pickle(pickle_path, path, game_config, observation_length, num_moves):
+    """ Append the games of an old create_rainbow_data pickle to a dataset.
+
+    The pickle holds [[obs_0, ..., obs_n], [act_0, ..., act_n]] per game, with
+    binary_list_to_int observations and one-hot actions.
+    Arguments:
+        - pickle_path: str
+            Pickle written with --format pickle.
+        - path: str
+            Dataset directory, created if needed.
+        - game_config, observation_length, num_moves:
+            As for GameDatasetWriter.
+    Returns:
+        - Number of games converted.
+    """
+    with open(pickle_path, 'rb') as f:
+        games = pickle.load(f)
+    with GameDatasetWriter(path, game_config, observation_length, num_moves) as writer:
+        for observations, actions in games:
+            writer.append_packed_game(
+                bit_packing.from_big_ints(observations, observation_length),
+                np.argmax(np.asarray(actions).reshape(len(actions), num_moves), axis=1))
+    return len(games)
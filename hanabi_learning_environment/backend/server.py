@@ -6,7 +6,9 @@ sys.path.append(root_path)
 sys.path.append(root_path+"/agents/rainbow")
 
 from agents.human import HumanAgent, HumanWebAgent
-from agents.rainbow.rainbow_agent_wrapper import Agent as RainbowAgent
+from agents.rainbow.rainbow_agent_wrapper import BatchedAgent as RainbowAgent
+from agents.rainbow.rainbow_agent_wrapper import latest_checkpoint
+from agents.rainbow.inference_server import InferenceServer
 import rl_env
 
 from fastapi import FastAPI, WebSocket
@@ -20,6 +22,35 @@ import time
 
 rooms = {}
 
+# One Rainbow network shared by every room, keyed by (players, num_moves, observation_size).
+inference_servers = {}
+inference_servers_lock = threading.Lock()
+
+
+def rainbow_agent_config(environment, num_players):
+    return {
+        'players': num_players,
+        'num_moves': environment.num_moves(),
+        'observation_size': environment.vectorized_observation_shape()[0]
+    }
+
+
+def get_inference_server(agent_config):
+    key = (agent_config['players'], agent_config['num_moves'], agent_config['observation_size'])
+    with inference_servers_lock:
+        if key not in inference_servers:
+            checkpoint_dir, checkpoint_version = latest_checkpoint()
+            print("loading from the path:", checkpoint_dir, checkpoint_version)
+            server = InferenceServer(
+                observation_size=agent_config['observation_size'],
+                num_actions=agent_config['num_moves'],
+                checkpoint_dir=checkpoint_dir,
+                checkpoint_version=checkpoint_version)
+            server.start()
+            inference_servers[key] = server
+        return inference_servers[key]
+
+
 class Runner:
     def __init__(self, flags, agents):
         self.flags = flags
@@ -29,26 +60,29 @@ class Runner:
         self.agents = []
         for i, agent in enumerate(agents):
             if agent is None:
-                agent_config = {
-                    'players': self.num_players,
-                    'num_moves': self.environment.num_moves(),
-                    'observation_size': self.environment.vectorized_observation_shape()[0]
-                }
+                agent_config = rainbow_agent_config(self.environment, self.num_players)
                 print(f"Creating RainbowAgent for player {i}, config:", agent_config)
-                agent_instance = RainbowAgent(agent_config)
+                agent_instance = RainbowAgent(agent_config, get_inference_server(agent_config))
                 self.agents.append(agent_instance)
             else:
                 self.agents.append(agent)
         print("Game starting with agents:", self.agents)
 
-    def run(self):
+    async def run(self, executor=None):
+        """Plays one game on the running event loop.
+
+        Agents with coroutine methods (`act_async`, `update_observation_async`,
+        `act_end_async`) are awaited directly; the blocking `act` of other
+        agents runs in `executor`.
+        """
+        loop = asyncio.get_running_loop()
         observations = self.environment.reset()
         done = False
         episode_reward = 0
         last_action = {"player_id": -1}  # Track last action for animation display on frontend
         
-        if hasattr(self.agents[1], "update_observation"):
-            self.agents[1].update_observation(observations, "Waiting for opponent to play")
+        if hasattr(self.agents[1], "update_observation_async"):
+            await self.agents[1].update_observation_async(observations, "Waiting for opponent to play")
 
         while not done:
             # Determine which agent should act based on the current player ID
@@ -58,7 +92,10 @@ class Runner:
                     continue
                 player_obs = observations['player_observations'][curr_player_id]
                 player_obs['last_action'] = last_action
-                action = agent.act(player_obs)
+                if hasattr(agent, "act_async"):
+                    action = await agent.act_async(player_obs)
+                else:
+                    action = await loop.run_in_executor(executor, agent.act, player_obs)
                 assert action is not None
                 print(f'Player {curr_player_id} action: {action}')
                 last_action = {"player_id": curr_player_id, "action": action}
@@ -69,30 +106,57 @@ class Runner:
                 # Determine the new current player after the step
                 new_current_player = observations['player_observations'][0]['current_player']
                 # Update observation for all human agents with a waiting message.
-                if hasattr(agent, "update_observation"):
+                if hasattr(agent, "update_observation_async"):
                     if agent_id == new_current_player:
                         waiting_message = "Your turn to play"
                     else:
                         waiting_message = "Waiting for opponent to play"
-                    agent.update_observation(observations, waiting_message)
+                    await agent.update_observation_async(observations, waiting_message)
         print('Total episode reward: %.3f' % episode_reward)
 
         # Notify agents when the game ends (useful for human players' UI updates)
         for agent in self.agents:
-            if hasattr(agent, "act_end"):
-                agent.act_end(episode_reward)
+            if hasattr(agent, "act_end_async"):
+                await agent.act_end_async(episode_reward)
         return episode_reward
 
 
-def start_game(room_id, players, mode):
+# Running games, referenced until they finish so that their tasks are not garbage collected.
+games = set()
+
+
+async def run_game(room_id, players, mode):
     print(f"Starting game for room {room_id}, mode: {mode}")
     flags = {'players': 2, 'num_episodes': 1}
-    runner = Runner(flags, agents=players)
-    result = runner.run()
+    loop = asyncio.get_running_loop()
+    # Building the Rainbow agent may load the network; keep it off the event loop.
+    runner = await loop.run_in_executor(None, Runner, flags, players)
+    result = await runner.run()
     print(f"Game in room {room_id} finished with result: {result}")
 
+
+def start_game(room_id, players, mode):
+    """Schedules the game of a room as a task on the running event loop."""
+    task = asyncio.get_running_loop().create_task(run_game(room_id, players, mode))
+    games.add(task)
+    task.add_done_callback(games.discard)
+    task.add_done_callback(report_game_error)
+    return task
+
+
+def report_game_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Game failed: {task.exception()!r}")
+
 app = FastAPI()
 
+@app.on_event("startup")
+def warm_up_rainbow_agent():
+    # Load the network before the first room is created, so that creating a room does not wait for it.
+    num_players = 2
+    environment = rl_env.make('Hanabi-Full', num_players=num_players)
+    get_inference_server(rainbow_agent_config(environment, num_players))
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -133,8 +197,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         "status": "game_starting",
                         "mode": mode
                     }))
-                    thread = threading.Thread(target=start_game, args=(room_id, players, mode), daemon=True)
-                    thread.start()
+                    start_game(room_id, players, mode)
                 else:
                     await websocket.send_text(json.dumps({"status": "error", "message": "Invalid mode"}))
             elif command == "join_room":
@@ -154,8 +217,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         # Start the game when there are two human players
                         players = room['players']
                         del rooms[room_id]  # Remove room record before starting the game
-                        thread = threading.Thread(target=start_game, args=(room_id, players, "human"), daemon=True)
-                        thread.start()
+                        start_game(room_id, players, "human")
                     else:
                         await websocket.send_text(json.dumps({"status": "error", "message": "Room mode mismatch"}))
                 else:
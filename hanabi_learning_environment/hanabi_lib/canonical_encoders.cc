@@ -19,6 +19,7 @@
 #include <vector>
 
 #include "canonical_encoders.h"
+#include "util.h"
 
 namespace hanabi_learning_env {
 
@@ -40,6 +41,90 @@ const HanabiHistoryItem* GetLastNonDealMove(
   return it == past_moves.end() ? nullptr : &(*it);
 }
 
+// The section encoders below read one player's view of the game through an
+// Input, either an ObservationInput or a StateInput:
+//   Hand(offset): hand of the player offset seats after the observer.
+//   DeckSize(), Fireworks(), InformationTokens(), LifeTokens(),
+//   DiscardPile(): as in HanabiObservation.
+//   LastMove(): most recent non-deal move, with an observer-relative
+//   player, or nullptr if there is none.
+class ObservationInput {
+ public:
+  explicit ObservationInput(const HanabiObservation& obs)
+      : obs_(obs), last_move_(GetLastNonDealMove(obs.LastMoves())) {}
+
+  const HanabiHand& Hand(int offset) const { return obs_.Hands()[offset]; }
+  int DeckSize() const { return obs_.DeckSize(); }
+  const HanabiState::FireworkVector& Fireworks() const {
+    return obs_.Fireworks();
+  }
+  int InformationTokens() const { return obs_.InformationTokens(); }
+  int LifeTokens() const { return obs_.LifeTokens(); }
+  const HanabiCardPile& DiscardPile() const { return obs_.DiscardPile(); }
+  const HanabiHistoryItem* LastMove() const { return last_move_; }
+
+ private:
+  const HanabiObservation& obs_;
+  const HanabiHistoryItem* last_move_;
+};
+
+// Reads observer's view straight from the state. Only what the canonical
+// encoding uses is exposed, and none of it depends on the observation type:
+// the encoding never includes the observer's own cards, and the card
+// knowledge stored in the state is what observations copy.
+class StateInput {
+ public:
+  // last_move is the most recent non-deal move in state's history, with
+  // its absolute player index, or nullptr.
+  StateInput(const HanabiState& state, int observer,
+             const HanabiHistoryItem* last_move)
+      : state_(state),
+        observer_(observer),
+        num_players_(state.ParentGame()->NumPlayers()),
+        last_move_(last_move != nullptr
+                       ? *last_move
+                       : HanabiHistoryItem(HanabiMove(
+                             HanabiMove::kInvalid, /*card_index=*/-1,
+                             /*target_offset=*/-1, /*color=*/-1,
+                             /*rank=*/-1))),
+        has_last_move_(last_move != nullptr) {
+    if (has_last_move_) {
+      last_move_.player =
+          (last_move_.player - observer_ + num_players_) % num_players_;
+    }
+  }
+
+  const HanabiHand& Hand(int offset) const {
+    return state_.Hands()[(observer_ + offset) % num_players_];
+  }
+  int DeckSize() const { return state_.Deck().Size(); }
+  const HanabiState::FireworkVector& Fireworks() const {
+    return state_.Fireworks();
+  }
+  int InformationTokens() const { return state_.InformationTokens(); }
+  int LifeTokens() const { return state_.LifeTokens(); }
+  const HanabiCardPile& DiscardPile() const { return state_.DiscardPile(); }
+  const HanabiHistoryItem* LastMove() const {
+    return has_last_move_ ? &last_move_ : nullptr;
+  }
+
+ private:
+  const HanabiState& state_;
+  int observer_;
+  int num_players_;
+  HanabiHistoryItem last_move_;
+  bool has_last_move_;
+};
+
+// Most recent non-chance move of state, or nullptr.
+const HanabiHistoryItem* GetLastNonChanceMove(const HanabiState& state) {
+  int index = -1;
+  for (int player = 0; player < state.ParentGame()->NumPlayers(); ++player) {
+    index = std::max(index, state.LastMoveIndex(player));
+  }
+  return index < 0 ? nullptr : &state.History().At(index);
+}
+
 int BitsPerCard(const HanabiGame& game) {
   return game.NumColors() * game.NumRanks();
 }
@@ -54,48 +139,46 @@ int HandsSectionLength(const HanabiGame& game) {
          game.NumPlayers();
 }
 
+// Encodes the cards of hand as <hand_size> blocks of <num_colors> *
+// <num_ranks> bits, one-hot for each card, leaving blocks of absent cards
+// empty.
+template <typename T>
+void EncodeHandCards(const HanabiGame& game, const HanabiHand& hand,
+                     int offset, T* encoding) {
+  int bits_per_card = BitsPerCard(game);
+  int num_ranks = game.NumRanks();
+  for (const HanabiCard& card : hand.Cards()) {
+    // Only a player's own cards can be invalid/unobserved.
+    assert(card.IsValid());
+    assert(card.Color() < game.NumColors());
+    assert(card.Rank() < num_ranks);
+    encoding[offset + CardIndex(card.Color(), card.Rank(), num_ranks)] = 1;
+    offset += bits_per_card;
+  }
+}
+
 // Enocdes cards in all other player's hands (excluding our unknown hand),
 // and whether the hand is missing a card for all players (when deck is empty.)
 // Each card in a hand is encoded with a one-hot representation using
 // <num_colors> * <num_ranks> bits (25 bits in a standard game) per card.
 // Returns the number of entries written to the encoding.
-int EncodeHands(const HanabiGame& game, const HanabiObservation& obs,
-                int start_offset, std::vector<int>* encoding) {
+template <typename Input, typename T>
+int EncodeHands(const HanabiGame& game, const Input& obs, int start_offset,
+                T* encoding) {
   int bits_per_card = BitsPerCard(game);
-  int num_ranks = game.NumRanks();
   int num_players = game.NumPlayers();
   int hand_size = game.HandSize();
 
   int offset = start_offset;
-  const std::vector<HanabiHand>& hands = obs.Hands();
-  assert(hands.size() == num_players);
   for (int player = 1; player < num_players; ++player) {
-    const std::vector<HanabiCard>& cards = hands[player].Cards();
-    int num_cards = 0;
-
-    for (const HanabiCard& card : cards) {
-      // Only a player's own cards can be invalid/unobserved.
-      assert(card.IsValid());
-      assert(card.Color() < game.NumColors());
-      assert(card.Rank() < num_ranks);
-      (*encoding)[offset + CardIndex(card.Color(), card.Rank(), num_ranks)] = 1;
-
-      ++num_cards;
-      offset += bits_per_card;
-    }
-
-    // A player's hand can have fewer cards than the initial hand size.
-    // Leave the bits for the absent cards empty (adjust the offset to skip
-    // bits for the missing cards).
-    if (num_cards < hand_size) {
-      offset += (hand_size - num_cards) * bits_per_card;
-    }
+    EncodeHandCards(game, obs.Hand(player), offset, encoding);
+    offset += hand_size * bits_per_card;
   }
 
   // For each player, set a bit if their hand is missing a card.
   for (int player = 0; player < num_players; ++player) {
-    if (hands[player].Cards().size() < game.HandSize()) {
-      (*encoding)[offset + player] = 1;
+    if (obs.Hand(player).Cards().size() < game.HandSize()) {
+      encoding[offset + player] = 1;
     }
   }
   offset += num_players;
@@ -120,8 +203,9 @@ int BoardSectionLength(const HanabiGame& game) {
 // We note several features use a thermometer representation instead of one-hot.
 // For example, life tokens could be: 000 (0), 100 (1), 110 (2), 111 (3).
 // Returns the number of entries written to the encoding.
-int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
-                int start_offset, std::vector<int>* encoding) {
+template <typename Input, typename T>
+int EncodeBoard(const HanabiGame& game, const Input& obs, int start_offset,
+                T* encoding) {
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
   int num_players = game.NumPlayers();
@@ -131,17 +215,17 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
   int offset = start_offset;
   // Encode the deck size
   for (int i = 0; i < obs.DeckSize(); ++i) {
-    (*encoding)[offset + i] = 1;
+    encoding[offset + i] = 1;
   }
   offset += (max_deck_size - hand_size * num_players);  // 40 in normal 2P game
 
   // fireworks
-  const std::vector<int>& fireworks = obs.Fireworks();
+  const auto& fireworks = obs.Fireworks();
   for (int c = 0; c < num_colors; ++c) {
     // fireworks[color] is the number of successfully played <color> cards.
     // If some were played, one-hot encode the highest (0-indexed) rank played
     if (fireworks[c] > 0) {
-      (*encoding)[offset + fireworks[c] - 1] = 1;
+      encoding[offset + fireworks[c] - 1] = 1;
     }
     offset += num_ranks;
   }
@@ -150,7 +234,7 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
   assert(obs.InformationTokens() >= 0);
   assert(obs.InformationTokens() <= game.MaxInformationTokens());
   for (int i = 0; i < obs.InformationTokens(); ++i) {
-    (*encoding)[offset + i] = 1;
+    encoding[offset + i] = 1;
   }
   offset += game.MaxInformationTokens();
 
@@ -158,7 +242,7 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
   assert(obs.LifeTokens() >= 0);
   assert(obs.LifeTokens() <= game.MaxLifeTokens());
   for (int i = 0; i < obs.LifeTokens(); ++i) {
-    (*encoding)[offset + i] = 1;
+    encoding[offset + i] = 1;
   }
   offset += game.MaxLifeTokens();
 
@@ -185,8 +269,9 @@ int DiscardSectionLength(const HanabiGame& game) { return game.MaxDeckSize(); }
 //   - one of the second highest rank have been discarded
 //   - the highest rank card has been discarded
 // Returns the number of entries written to the encoding.
-int EncodeDiscards(const HanabiGame& game, const HanabiObservation& obs,
-                   int start_offset, std::vector<int>* encoding) {
+template <typename Input, typename T>
+int EncodeDiscards(const HanabiGame& game, const Input& obs, int start_offset,
+                   T* encoding) {
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
 
@@ -200,7 +285,7 @@ int EncodeDiscards(const HanabiGame& game, const HanabiObservation& obs,
     for (int r = 0; r < num_ranks; ++r) {
       int num_discarded = discard_counts[c * num_ranks + r];
       for (int i = 0; i < num_discarded; ++i) {
-        (*encoding)[offset + i] = 1;
+        encoding[offset + i] = 1;
       }
       offset += game.NumberCardInstances(c, r);
     }
@@ -233,15 +318,16 @@ int LastActionSectionLength(const HanabiGame& game) {
 //  - Position played/discarded (<hand_size> bits; one-hot)
 //  - Card played/discarded (<num_colors> * <num_ranks> bits; one-hot)
 // Returns the number of entries written to the encoding.
-int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
-                     int start_offset, std::vector<int>* encoding) {
+template <typename Input, typename T>
+int EncodeLastAction(const HanabiGame& game, const Input& obs,
+                     int start_offset, T* encoding) {
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
   int num_players = game.NumPlayers();
   int hand_size = game.HandSize();
 
   int offset = start_offset;
-  const HanabiHistoryItem* last_move = GetLastNonDealMove(obs.LastMoves());
+  const HanabiHistoryItem* last_move = obs.LastMove();
   if (last_move == nullptr) {
     offset += LastActionSectionLength(game);
   } else {
@@ -250,22 +336,22 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
     // player_id
     // Note: no assertion here. At a terminal state, the last player could have
     // been me (player id 0).
-    (*encoding)[offset + last_move->player] = 1;
+    encoding[offset + last_move->player] = 1;
     offset += num_players;
 
     // move type
     switch (last_move_type) {
       case HanabiMove::Type::kPlay:
-        (*encoding)[offset] = 1;
+        encoding[offset] = 1;
         break;
       case HanabiMove::Type::kDiscard:
-        (*encoding)[offset + 1] = 1;
+        encoding[offset + 1] = 1;
         break;
       case HanabiMove::Type::kRevealColor:
-        (*encoding)[offset + 2] = 1;
+        encoding[offset + 2] = 1;
         break;
       case HanabiMove::Type::kRevealRank:
-        (*encoding)[offset + 3] = 1;
+        encoding[offset + 3] = 1;
         break;
       default:
         std::abort();
@@ -277,19 +363,19 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
         last_move_type == HanabiMove::Type::kRevealRank) {
       int8_t observer_relative_target =
           (last_move->player + last_move->move.TargetOffset()) % num_players;
-      (*encoding)[offset + observer_relative_target] = 1;
+      encoding[offset + observer_relative_target] = 1;
     }
     offset += num_players;
 
     // color (if hint action)
     if (last_move_type == HanabiMove::Type::kRevealColor) {
-      (*encoding)[offset + last_move->move.Color()] = 1;
+      encoding[offset + last_move->move.Color()] = 1;
     }
     offset += num_colors;
 
     // rank (if hint action)
     if (last_move_type == HanabiMove::Type::kRevealRank) {
-      (*encoding)[offset + last_move->move.Rank()] = 1;
+      encoding[offset + last_move->move.Rank()] = 1;
     }
     offset += num_ranks;
 
@@ -298,7 +384,7 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
         last_move_type == HanabiMove::Type::kRevealRank) {
       for (int i = 0, mask = 1; i < hand_size; ++i, mask <<= 1) {
         if ((last_move->reveal_bitmask & mask) > 0) {
-          (*encoding)[offset + i] = 1;
+          encoding[offset + i] = 1;
         }
       }
     }
@@ -307,7 +393,7 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
     // position (if play or discard action)
     if (last_move_type == HanabiMove::Type::kPlay ||
         last_move_type == HanabiMove::Type::kDiscard) {
-      (*encoding)[offset + last_move->move.CardIndex()] = 1;
+      encoding[offset + last_move->move.CardIndex()] = 1;
     }
     offset += hand_size;
 
@@ -316,7 +402,7 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
         last_move_type == HanabiMove::Type::kDiscard) {
       assert(last_move->color >= 0);
       assert(last_move->rank >= 0);
-      (*encoding)[offset +
+      encoding[offset +
                   CardIndex(last_move->color, last_move->rank, num_ranks)] = 1;
     }
     offset += BitsPerCard(game);
@@ -324,10 +410,10 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
     // was successful and/or added information token (if play action)
     if (last_move_type == HanabiMove::Type::kPlay) {
       if (last_move->scored) {
-        (*encoding)[offset] = 1;
+        encoding[offset] = 1;
       }
       if (last_move->information_token) {
-        (*encoding)[offset + 1] = 1;
+        encoding[offset + 1] = 1;
       }
     }
     offset += 2;
@@ -342,6 +428,40 @@ int CardKnowledgeSectionLength(const HanabiGame& game) {
          (BitsPerCard(game) + game.NumColors() + game.NumRanks());
 }
 
+// Encodes the knowledge of each card in hand as <num_colors> * <num_ranks>
+// plausible-card bits, then <num_colors> + <num_ranks> revealed color and
+// rank bits, leaving the bits of absent cards empty.
+template <typename T>
+void EncodeHandKnowledge(const HanabiGame& game, const HanabiHand& hand,
+                         int offset, T* encoding) {
+  int bits_per_card = BitsPerCard(game);
+  int num_colors = game.NumColors();
+  int num_ranks = game.NumRanks();
+  for (const HanabiHand::CardKnowledge& card_knowledge : hand.Knowledge()) {
+    // Add bits for plausible card.
+    for (int color = 0; color < num_colors; ++color) {
+      if (card_knowledge.ColorPlausible(color)) {
+        for (int rank = 0; rank < num_ranks; ++rank) {
+          if (card_knowledge.RankPlausible(rank)) {
+            encoding[offset + CardIndex(color, rank, num_ranks)] = 1;
+          }
+        }
+      }
+    }
+    offset += bits_per_card;
+
+    // Add bits for explicitly revealed colors and ranks.
+    if (card_knowledge.ColorHinted()) {
+      encoding[offset + card_knowledge.Color()] = 1;
+    }
+    offset += num_colors;
+    if (card_knowledge.RankHinted()) {
+      encoding[offset + card_knowledge.Rank()] = 1;
+    }
+    offset += num_ranks;
+  }
+}
+
 // Encode the common card knowledge.
 // For each card/position in each player's hand, including the observing player,
 // encode the possible cards that could be in that position and whether the
@@ -363,8 +483,9 @@ int CardKnowledgeSectionLength(const HanabiGame& game) {
 // Uses <num_players> * <hand_size> *
 // (<num_colors> * <num_ranks> + <num_colors> + <num_ranks>) bits.
 // Returns the number of entries written to the encoding.
-int EncodeCardKnowledge(const HanabiGame& game, const HanabiObservation& obs,
-                        int start_offset, std::vector<int>* encoding) {
+template <typename Input, typename T>
+int EncodeCardKnowledge(const HanabiGame& game, const Input& obs,
+                        int start_offset, T* encoding) {
   int bits_per_card = BitsPerCard(game);
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
@@ -372,52 +493,32 @@ int EncodeCardKnowledge(const HanabiGame& game, const HanabiObservation& obs,
   int hand_size = game.HandSize();
 
   int offset = start_offset;
-  const std::vector<HanabiHand>& hands = obs.Hands();
-  assert(hands.size() == num_players);
   for (int player = 0; player < num_players; ++player) {
-    const std::vector<HanabiHand::CardKnowledge>& knowledge =
-        hands[player].Knowledge();
-    int num_cards = 0;
-
-    for (const HanabiHand::CardKnowledge& card_knowledge : knowledge) {
-      // Add bits for plausible card.
-      for (int color = 0; color < num_colors; ++color) {
-        if (card_knowledge.ColorPlausible(color)) {
-          for (int rank = 0; rank < num_ranks; ++rank) {
-            if (card_knowledge.RankPlausible(rank)) {
-              (*encoding)[offset + CardIndex(color, rank, num_ranks)] = 1;
-            }
-          }
-        }
-      }
-      offset += bits_per_card;
-
-      // Add bits for explicitly revealed colors and ranks.
-      if (card_knowledge.ColorHinted()) {
-        (*encoding)[offset + card_knowledge.Color()] = 1;
-      }
-      offset += num_colors;
-      if (card_knowledge.RankHinted()) {
-        (*encoding)[offset + card_knowledge.Rank()] = 1;
-      }
-      offset += num_ranks;
-
-      ++num_cards;
-    }
-
-    // A player's hand can have fewer cards than the initial hand size.
-    // Leave the bits for the absent cards empty (adjust the offset to skip
-    // bits for the missing cards).
-    if (num_cards < hand_size) {
-      offset +=
-          (hand_size - num_cards) * (bits_per_card + num_colors + num_ranks);
-    }
+    EncodeHandKnowledge(game, obs.Hand(player), offset, encoding);
+    offset += hand_size * (bits_per_card + num_colors + num_ranks);
   }
 
   assert(offset - start_offset == CardKnowledgeSectionLength(game));
   return offset - start_offset;
 }
 
+// Writes the whole encoding, section by section, into a zeroed encoding.
+template <typename Input, typename T>
+void EncodeSections(const HanabiGame& game, const Input& obs, T* encoding) {
+  // This offset is an index to the start of each section of the bit vector.
+  // It is incremented at the end of each section.
+  int offset = 0;
+  offset += EncodeHands(game, obs, offset, encoding);
+  offset += EncodeBoard(game, obs, offset, encoding);
+  offset += EncodeDiscards(game, obs, offset, encoding);
+  offset += EncodeLastAction(game, obs, offset, encoding);
+  if (game.ObservationType() != HanabiGame::kMinimal) {
+    offset += EncodeCardKnowledge(game, obs, offset, encoding);
+  }
+  assert(offset == FlatLength(
+                       CanonicalObservationEncoder(&game).Shape()));
+}
+
 }  // namespace
 
 std::vector<int> CanonicalObservationEncoder::Shape() const {
@@ -434,20 +535,166 @@ std::vector<int> CanonicalObservationEncoder::Encode(
     const HanabiObservation& obs) const {
   // Make an empty bit string of the proper size.
   std::vector<int> encoding(FlatLength(Shape()), 0);
+  EncodeSections(*parent_game_, ObservationInput(obs), encoding.data());
+  return encoding;
+}
 
-  // This offset is an index to the start of each section of the bit vector.
-  // It is incremented at the end of each section.
-  int offset = 0;
-  offset += EncodeHands(*parent_game_, obs, offset, &encoding);
-  offset += EncodeBoard(*parent_game_, obs, offset, &encoding);
-  offset += EncodeDiscards(*parent_game_, obs, offset, &encoding);
-  offset += EncodeLastAction(*parent_game_, obs, offset, &encoding);
-  if (parent_game_->ObservationType() != HanabiGame::kMinimal) {
-    offset += EncodeCardKnowledge(*parent_game_, obs, offset, &encoding);
+void CanonicalObservationEncoder::Encode(const HanabiObservation& obs,
+                                         uint8_t* encoding) const {
+  std::fill(encoding, encoding + FlatLength(Shape()), 0);
+  EncodeSections(*parent_game_, ObservationInput(obs), encoding);
+}
+
+void CanonicalObservationEncoder::EncodeAllPlayers(const HanabiState& state,
+                                                   uint8_t* encodings) const {
+  REQUIRE(state.ParentGame() == parent_game_);
+  int num_players = parent_game_->NumPlayers();
+  int length = FlatLength(Shape());
+  std::fill(encodings, encodings + num_players * length, 0);
+  const HanabiHistoryItem* last_move = GetLastNonChanceMove(state);
+  for (int player = 0; player < num_players; ++player) {
+    EncodeSections(*parent_game_, StateInput(state, player, last_move),
+                   encodings + player * length);
   }
+}
 
-  assert(offset == encoding.size());
-  return encoding;
+IncrementalCanonicalEncoder::IncrementalCanonicalEncoder(
+    const HanabiGame* parent_game, bool verify)
+    : parent_game_(parent_game), encoder_(parent_game), verify_(verify) {
+  REQUIRE(parent_game != nullptr);
+  observation_length_ = FlatLength(encoder_.Shape());
+  encodings_.resize(parent_game->NumPlayers() * observation_length_);
+  discard_counts_.resize(BitsPerCard(*parent_game));
+}
+
+void IncrementalCanonicalEncoder::Reset(const HanabiState& state) {
+  encoder_.EncodeAllPlayers(state, encodings_.data());
+  history_size_ = state.History().Size();
+  discard_pile_size_ = state.DiscardPile().size();
+  std::fill(discard_counts_.begin(), discard_counts_.end(), 0);
+  for (const HanabiCard& card : state.DiscardPile()) {
+    ++discard_counts_[CardIndex(card.Color(), card.Rank(),
+                                parent_game_->NumRanks())];
+  }
+}
+
+void IncrementalCanonicalEncoder::Update(const HanabiState& state) {
+  REQUIRE(state.ParentGame() == parent_game_);
+  const HanabiGame& game = *parent_game_;
+  int num_players = game.NumPlayers();
+  int num_ranks = game.NumRanks();
+  int hand_size = game.HandSize();
+  int bits_per_card = BitsPerCard(game);
+  int bits_per_knowledge = bits_per_card + game.NumColors() + num_ranks;
+
+  // Find whose hand and knowledge the new history items changed.
+  int history_size = state.History().Size();
+  REQUIRE(history_size >= history_size_);
+  std::vector<bool> hand_changed(num_players, false);
+  std::vector<bool> knowledge_changed(num_players, false);
+  bool action_made = false;
+  for (const HanabiHistoryItem& item :
+       state.History().LastItems(history_size - history_size_)) {
+    switch (item.move.MoveType()) {
+      case HanabiMove::kDeal:
+        hand_changed[item.deal_to_player] = true;
+        knowledge_changed[item.deal_to_player] = true;
+        break;
+      case HanabiMove::kPlay:
+      case HanabiMove::kDiscard:
+        hand_changed[item.player] = true;
+        knowledge_changed[item.player] = true;
+        action_made = true;
+        break;
+      case HanabiMove::kRevealColor:
+      case HanabiMove::kRevealRank:
+        knowledge_changed[(item.player + item.move.TargetOffset()) %
+                          num_players] = true;
+        action_made = true;
+        break;
+      default:
+        std::abort();
+    }
+  }
+  history_size_ = history_size;
+
+  int board_offset = HandsSectionLength(game);
+  int discards_offset = board_offset + BoardSectionLength(game);
+  int last_action_offset = discards_offset + DiscardSectionLength(game);
+  int knowledge_offset = last_action_offset + LastActionSectionLength(game);
+  int missing_card_offset = (num_players - 1) * hand_size * bits_per_card;
+  const HanabiHistoryItem* last_move = GetLastNonChanceMove(state);
+
+  // Discard thermometer offsets of the cards discarded since the last update.
+  std::vector<int> new_discard_bits;
+  const HanabiCardPile& discard_pile = state.DiscardPile();
+  for (; discard_pile_size_ < static_cast<int>(discard_pile.size());
+       ++discard_pile_size_) {
+    const HanabiCard& card = discard_pile[discard_pile_size_];
+    int bit = discards_offset;
+    for (int c = 0; c < card.Color(); ++c) {
+      for (int r = 0; r < num_ranks; ++r) {
+        bit += game.NumberCardInstances(c, r);
+      }
+    }
+    for (int r = 0; r < card.Rank(); ++r) {
+      bit += game.NumberCardInstances(card.Color(), r);
+    }
+    new_discard_bits.push_back(
+        bit + discard_counts_[CardIndex(card.Color(), card.Rank(),
+                                        num_ranks)]++);
+  }
+
+  for (int observer = 0; observer < num_players; ++observer) {
+    uint8_t* encoding = encodings_.data() + observer * observation_length_;
+
+    for (int player = 0; player < num_players; ++player) {
+      int relative_player = (player - observer + num_players) % num_players;
+      const HanabiHand& hand = state.Hands()[player];
+      if (hand_changed[player]) {
+        if (relative_player != 0) {
+          int offset = (relative_player - 1) * hand_size * bits_per_card;
+          std::fill_n(encoding + offset, hand_size * bits_per_card, 0);
+          EncodeHandCards(game, hand, offset, encoding);
+        }
+        encoding[missing_card_offset + relative_player] =
+            hand.Cards().size() < hand_size ? 1 : 0;
+      }
+      if (knowledge_changed[player] &&
+          game.ObservationType() != HanabiGame::kMinimal) {
+        int offset =
+            knowledge_offset + relative_player * hand_size * bits_per_knowledge;
+        std::fill_n(encoding + offset, hand_size * bits_per_knowledge, 0);
+        EncodeHandKnowledge(game, hand, offset, encoding);
+      }
+    }
+
+    // The board and discards look the same to every player.
+    if (observer == 0) {
+      std::fill_n(encoding + board_offset, BoardSectionLength(game), 0);
+      EncodeBoard(game, StateInput(state, observer, last_move), board_offset,
+                  encoding);
+    } else {
+      std::copy_n(encodings_.data() + board_offset, BoardSectionLength(game),
+                  encoding + board_offset);
+    }
+    for (int bit : new_discard_bits) {
+      encoding[bit] = 1;
+    }
+
+    if (action_made) {
+      std::fill_n(encoding + last_action_offset,
+                  LastActionSectionLength(game), 0);
+      EncodeLastAction(game, StateInput(state, observer, last_move),
+                       last_action_offset, encoding);
+    }
+  }
+
+  if (verify_) {
+    std::vector<uint8_t> expected(encodings_.size());
+    encoder_.EncodeAllPlayers(state, expected.data());
+    REQUIRE(encodings_ == expected);
+  }
 }
 
 }  // namespace hanabi_learning_env
@@ -18,10 +18,12 @@
 #ifndef __CANONICAL_ENCODERS_H__
 #define __CANONICAL_ENCODERS_H__
 
+#include <cstdint>
 #include <vector>
 
 #include "hanabi_game.h"
 #include "hanabi_observation.h"
+#include "hanabi_state.h"
 #include "observation_encoder.h"
 
 namespace hanabi_learning_env {
@@ -34,6 +36,13 @@ class CanonicalObservationEncoder : public ObservationEncoder {
 
   std::vector<int> Shape() const override;
   std::vector<int> Encode(const HanabiObservation& obs) const override;
+  // Same encoding, written as one byte per bit to encoding, which must hold
+  // FlatLength(Shape()) bytes.
+  void Encode(const HanabiObservation& obs, uint8_t* encoding) const;
+  // Writes Encode(HanabiObservation(state, player)) for every player, as
+  // rows of an [NumPlayers(), FlatLength(Shape())] byte array, reading the
+  // state directly instead of building observations.
+  void EncodeAllPlayers(const HanabiState& state, uint8_t* encodings) const;
 
   ObservationEncoder::Type type() const override {
     return ObservationEncoder::Type::kCanonical;
@@ -43,6 +52,44 @@ class CanonicalObservationEncoder : public ObservationEncoder {
   const HanabiGame* parent_game_ = nullptr;
 };
 
+// Keeps the canonical encodings of every player's observation of one game,
+// and brings them up to date by rewriting only the parts touched by the
+// history items added since the last update: the hand and card knowledge of
+// players who were dealt, played, discarded or hinted to, newly discarded
+// cards, the board and the last action.
+class IncrementalCanonicalEncoder {
+ public:
+  // If verify is true, every update is checked against a full encoding from
+  // CanonicalObservationEncoder::EncodeAllPlayers, and any difference is a
+  // fatal error.
+  explicit IncrementalCanonicalEncoder(const HanabiGame* parent_game,
+                                       bool verify = false);
+
+  // Encode state from scratch.
+  void Reset(const HanabiState& state);
+  // Bring the encodings up to date with state, which must be the state last
+  // passed to Reset() or Update() with zero or more moves applied since.
+  void Update(const HanabiState& state);
+
+  // Encodings of the last state as rows of a [NumPlayers(),
+  // FlatLength(Shape())] byte array, row p being player p's observation.
+  const std::vector<uint8_t>& Encodings() const { return encodings_; }
+  const CanonicalObservationEncoder& Encoder() const { return encoder_; }
+  bool Verify() const { return verify_; }
+
+ private:
+  const HanabiGame* parent_game_ = nullptr;
+  CanonicalObservationEncoder encoder_;
+  bool verify_ = false;
+  int observation_length_ = -1;
+  std::vector<uint8_t> encodings_;
+  // Number of history items and discarded cards already encoded.
+  int history_size_ = 0;
+  int discard_pile_size_ = 0;
+  // Number of discarded cards of each color and rank, indexed by CardIndex.
+  std::vector<int> discard_counts_;
+};
+
 }  // namespace hanabi_learning_env
 
 #endif
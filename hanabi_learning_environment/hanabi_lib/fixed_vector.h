@@ -0,0 +1,102 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#ifndef __FIXED_VECTOR_H__
+#define __FIXED_VECTOR_H__
+
+#include <algorithm>
+#include <array>
+#include <cstdio>
+#include <vector>
+
+#include "util.h"
+
+namespace hanabi_learning_env {
+
+// Vector-like container with inline storage for at most N elements.
+// Unlike std::vector it never allocates, so objects built from FixedVectors
+// of trivially copyable elements are themselves trivially copyable and copy
+// with a single memcpy. Supports the subset of the std::vector interface the
+// library uses; slots past size() hold default-constructed elements.
+template <typename T, int N>
+class FixedVector {
+ public:
+  using value_type = T;
+  using iterator = T*;
+  using const_iterator = const T*;
+
+  FixedVector() = default;
+  FixedVector(int size, const T& value) { resize(size, value); }
+  FixedVector(const std::vector<T>& values) {
+    REQUIRE(values.size() <= N);
+    std::copy(values.begin(), values.end(), data_.begin());
+    size_ = values.size();
+  }
+
+  static constexpr int capacity() { return N; }
+  int size() const { return size_; }
+  bool empty() const { return size_ == 0; }
+
+  T& operator[](int index) { return data_[index]; }
+  const T& operator[](int index) const { return data_[index]; }
+  T& at(int index) {
+    REQUIRE(index >= 0 && index < size_);
+    return data_[index];
+  }
+  const T& at(int index) const {
+    REQUIRE(index >= 0 && index < size_);
+    return data_[index];
+  }
+  T& front() { return data_[0]; }
+  const T& front() const { return data_[0]; }
+  T& back() { return data_[size_ - 1]; }
+  const T& back() const { return data_[size_ - 1]; }
+
+  iterator begin() { return data_.data(); }
+  iterator end() { return data_.data() + size_; }
+  const_iterator begin() const { return data_.data(); }
+  const_iterator end() const { return data_.data() + size_; }
+
+  void push_back(const T& value) {
+    REQUIRE(size_ < N);
+    data_[size_++] = value;
+  }
+  void pop_back() { data_[--size_] = T(); }
+  void clear() { resize(0); }
+  void resize(int size, const T& value = T()) {
+    REQUIRE(size >= 0 && size <= N);
+    for (int i = size_; i < size; ++i) {
+      data_[i] = value;
+    }
+    for (int i = size; i < size_; ++i) {
+      data_[i] = T();
+    }
+    size_ = size;
+  }
+  iterator erase(iterator position) {
+    std::move(position + 1, end(), position);
+    pop_back();
+    return position;
+  }
+
+  std::vector<T> ToVector() const { return std::vector<T>(begin(), end()); }
+
+ private:
+  std::array<T, N> data_{};
+  int size_ = 0;
+};
+
+}  // namespace hanabi_learning_env
+
+#endif
@@ -15,6 +15,7 @@
 #ifndef __HANABI_CARD_H__
 #define __HANABI_CARD_H__
 
+#include <cstdint>
 #include <string>
 
 namespace hanabi_learning_env {
@@ -30,8 +31,8 @@ class HanabiCard {
   int Rank() const { return rank_; }
 
  private:
-  int color_ = -1;  // 0 indexed card color.
-  int rank_ = -1;   // 0 indexed card rank.
+  int8_t color_ = -1;  // 0 indexed card color.
+  int8_t rank_ = -1;   // 0 indexed card rank.
 };
 
 }  // namespace hanabi_learning_env
@@ -36,6 +36,7 @@ HanabiGame::HanabiGame(
   num_ranks_ = ParameterValue<int>(params_, "ranks", kMaxNumRanks);
   REQUIRE(num_ranks_ > 0 && num_ranks_ <= kMaxNumRanks);
   hand_size_ = ParameterValue<int>(params_, "hand_size", HandSizeFromRules());
+  REQUIRE(hand_size_ > 0 && hand_size_ <= kMaxHandSize);
   max_information_tokens_ = ParameterValue<int>(
       params_, "max_information_tokens", kInformationTokens);
   max_life_tokens_ =
@@ -108,6 +109,7 @@ HanabiMove HanabiGame::PickRandomChance(
         chance_outcomes) const {
   std::discrete_distribution<std::mt19937::result_type> dist(
       chance_outcomes.second.begin(), chance_outcomes.second.end());
+  std::lock_guard<std::mutex> lock(rng_mutex_);
   return chance_outcomes.first[dist(rng_)];
 }
 
@@ -135,11 +137,10 @@ int HanabiGame::NumberCardInstances(int color, int rank) const {
   return 2;
 }
 
-int HanabiGame::GetSampledStartPlayer() const {
+int HanabiGame::GetSampledStartPlayer(HanabiRng* rng) const {
   if (random_start_player_) {
-    std::uniform_int_distribution<std::mt19937::result_type> dist(
-        0, num_players_ - 1);
-    return dist(rng_);
+    std::uniform_int_distribution<int> dist(0, num_players_ - 1);
+    return dist(*rng);
   }
   return 0;
 }
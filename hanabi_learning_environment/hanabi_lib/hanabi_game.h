@@ -15,6 +15,9 @@
 #ifndef __HANABI_GAME_H__
 #define __HANABI_GAME_H__
 
+#include <atomic>
+#include <cstdint>
+#include <mutex>
 #include <random>
 #include <string>
 #include <unordered_map>
@@ -22,9 +25,14 @@
 
 #include "hanabi_card.h"
 #include "hanabi_move.h"
+#include "hanabi_rng.h"
+#include "util.h"
 
 namespace hanabi_learning_env {
 
+// A HanabiGame is immutable once constructed, apart from PickRandomChance
+// and NextEpisode, which are internally synchronized, so one game can be
+// shared by states and observations used on any number of threads.
 class HanabiGame {
  public:
   // An agent's observation of a state does include all state knowledge.
@@ -47,6 +55,7 @@ class HanabiGame {
   // "ranks": The number of ranks. (default 5)
   //     Value must be in [1, kMaxNumRanks].
   // "hand_size": The number of cards in each player's hand. (default 5 or 4)
+  //     Value must be in [1, kMaxHandSize].
   // "max_information_tokens": Maximum number of information tokens. (default 8)
   // "max_life_tokens": Maximum number of life tokens. (default 3)
   // "seed": Pseudo-random number generator seed. (default -1)
@@ -73,13 +82,14 @@ class HanabiGame {
   int GetChanceOutcomeUid(HanabiMove move) const;
   // Randomly sample a random chance-outcome move from list of moves and
   // associated probability distribution.
+  // HanabiState::ApplyRandomChance deals directly from the deck instead.
   HanabiMove PickRandomChance(
       const std::pair<std::vector<HanabiMove>, std::vector<double>>&
           chance_outcomes) const;
 
   std::unordered_map<std::string, std::string> Parameters() const;
   int MinPlayers() const { return 2; }
-  int MaxPlayers() const { return 5; }
+  int MaxPlayers() const { return kMaxNumPlayers; }
   int MinScore() const { return 0; }
   int MaxScore() const { return num_ranks_ * num_colors_; }
   std::string Name() const { return "Hanabi"; }
@@ -98,8 +108,13 @@ class HanabiGame {
   }
   AgentObservationType ObservationType() const { return observation_type_; }
 
-  // Get the first player to act. Might be randomly generated at each call.
-  int GetSampledStartPlayer() const;
+  // Get the first player to act, drawn from rng if random_start_player.
+  int GetSampledStartPlayer(HanabiRng* rng) const;
+  int Seed() const { return seed_; }
+  // Returns a new episode number, counting from 0. Each HanabiState draws its
+  // own generator from (Seed(), episode), so states of one game never share
+  // random numbers. Thread-safe.
+  uint64_t NextEpisode() const { return next_episode_++; }
 
  private:
   // Calculating max moves by move type.
@@ -127,7 +142,9 @@ class HanabiGame {
   int seed_ = -1;
   bool random_start_player_ = false;
   AgentObservationType observation_type_ = kCardKnowledge;
-  mutable std::mt19937 rng_;
+  mutable std::mt19937 rng_;  // Only used by PickRandomChance.
+  mutable std::mutex rng_mutex_;  // Guards rng_.
+  mutable std::atomic<uint64_t> next_episode_{0};
 };
 
 }  // namespace hanabi_learning_env
@@ -21,24 +21,28 @@
 
 namespace hanabi_learning_env {
 
+static_assert(kMaxNumColors <= 8 && kMaxNumRanks <= 8,
+              "ValueKnowledge keeps plausible values in an 8-bit mask.");
+
 HanabiHand::ValueKnowledge::ValueKnowledge(int value_range)
-    : value_(-1), value_plausible_(std::max(value_range, 0), true) {
-  assert(value_range > 0);
+    : value_(-1),
+      range_(std::max(value_range, 0)),
+      plausible_((1u << range_) - 1) {
+  assert(value_range > 0 && value_range <= 8);
 }
 
 void HanabiHand::ValueKnowledge::ApplyIsValueHint(int value) {
-  assert(value >= 0 && value < value_plausible_.size());
+  assert(value >= 0 && value < range_);
   assert(value_ < 0 || value_ == value);
-  assert(value_plausible_[value] == true);
+  assert(IsPlausible(value));
   value_ = value;
-  std::fill(value_plausible_.begin(), value_plausible_.end(), false);
-  value_plausible_[value] = true;
+  plausible_ = 1u << value;
 }
 
 void HanabiHand::ValueKnowledge::ApplyIsNotValueHint(int value) {
-  assert(value >= 0 && value < value_plausible_.size());
+  assert(value >= 0 && value < range_);
   assert(value_ < 0 || value_ != value);
-  value_plausible_[value] = false;
+  plausible_ &= ~(1u << value);
 }
 
 HanabiHand::CardKnowledge::CardKnowledge(int num_colors, int num_ranks)
@@ -84,8 +88,7 @@ void HanabiHand::AddCard(HanabiCard card,
   card_knowledge_.push_back(initial_knowledge);
 }
 
-void HanabiHand::RemoveFromHand(int card_index,
-                                std::vector<HanabiCard>* discard_pile) {
+void HanabiHand::RemoveFromHand(int card_index, HanabiCardPile* discard_pile) {
   if (discard_pile != nullptr) {
     discard_pile->push_back(cards_[card_index]);
   }
@@ -17,12 +17,16 @@
 
 #include <cstdint>
 #include <string>
-#include <vector>
 
+#include "fixed_vector.h"
 #include "hanabi_card.h"
+#include "util.h"
 
 namespace hanabi_learning_env {
 
+// Discard pile of a state or observation, oldest card first.
+using HanabiCardPile = FixedVector<HanabiCard, kMaxDeckSize>;
+
 class HanabiHand {
  public:
   class ValueKnowledge {
@@ -37,14 +41,17 @@ class HanabiHand {
     // After recording that the value is 0, we have
     // ValueHinted()=true, value()=0, and ValueCouldBe(v)=false for v=1, and 2.
    public:
+    ValueKnowledge() = default;  // Tracks no values; placeholder only.
     explicit ValueKnowledge(int value_range);
-    int Range() const { return value_plausible_.size(); }
+    int Range() const { return range_; }
     // Returns true if and only if the exact value was revealed.
     // Does not perform inference to get a known value from not-value hints.
     bool ValueHinted() const { return value_ >= 0; }
     int Value() const { return value_; }  // -1 if value was not hinted.
     // Returns true if we have no hint saying variable is not the given value.
-    bool IsPlausible(int value) const { return value_plausible_[value]; }
+    bool IsPlausible(int value) const { return (plausible_ >> value) & 1; }
+    // Bit v is set iff IsPlausible(v).
+    int PlausibleBitmask() const { return plausible_; }
     // Record a hint that gives the value of the variable.
     void ApplyIsValueHint(int value);
     // Record a hint that the variable does not have the given value.
@@ -52,13 +59,16 @@ class HanabiHand {
 
    private:
     // Value if hint directly provided the value, or -1 with no direct hint.
-    int value_ = -1;
-    std::vector<bool> value_plausible_;  // Knowledge from not-value hints.
+    int8_t value_ = -1;
+    int8_t range_ = 0;
+    // Knowledge from not-value hints: bit v is cleared once v is ruled out.
+    uint8_t plausible_ = 0;
   };
 
   class CardKnowledge {
     // Hinted knowledge about color and rank of an initially unknown card.
    public:
+    CardKnowledge() = default;  // Tracks nothing; placeholder only.
     CardKnowledge(int num_colors, int num_ranks);
     // Returns number of possible colors being tracked.
     int NumColors() const { return color_.Range(); }
@@ -69,6 +79,7 @@ class HanabiHand {
     int Color() const { return color_.Value(); }
     // Returns true if we have no hint saying card is not the given color.
     bool ColorPlausible(int color) const { return color_.IsPlausible(color); }
+    int ColorPlausibleBitmask() const { return color_.PlausibleBitmask(); }
     void ApplyIsColorHint(int color) { color_.ApplyIsValueHint(color); }
     void ApplyIsNotColorHint(int color) { color_.ApplyIsNotValueHint(color); }
     // Returns number of possible ranks being tracked.
@@ -80,6 +91,7 @@ class HanabiHand {
     int Rank() const { return rank_.Value(); }
     // Returns true if we have no hint saying card is not the given rank.
     bool RankPlausible(int rank) const { return rank_.IsPlausible(rank); }
+    int RankPlausibleBitmask() const { return rank_.PlausibleBitmask(); }
     void ApplyIsRankHint(int rank) { rank_.ApplyIsValueHint(rank); }
     void ApplyIsNotRankHint(int rank) { rank_.ApplyIsNotValueHint(rank); }
     std::string ToString() const;
@@ -89,22 +101,23 @@ class HanabiHand {
     ValueKnowledge rank_;
   };
 
-  HanabiHand() {}
-  HanabiHand(const HanabiHand& hand)
-      : cards_(hand.cards_), card_knowledge_(hand.card_knowledge_) {}
+  using CardVector = FixedVector<HanabiCard, kMaxHandSize>;
+  using KnowledgeVector = FixedVector<CardKnowledge, kMaxHandSize>;
+
+  HanabiHand() = default;
+  HanabiHand(const HanabiHand& hand) = default;
+  HanabiHand& operator=(const HanabiHand& hand) = default;
   // Copy hand. Hide cards (set to invalid) if hide_cards is true.
   // Hide card knowledge (set to unknown) if hide_knowledge is true.
   HanabiHand(const HanabiHand& hand, bool hide_cards, bool hide_knowledge);
   // Cards and corresponding card knowledge are always arranged from oldest to
   // newest, with the oldest card or knowledge at index 0.
-  const std::vector<HanabiCard>& Cards() const { return cards_; }
-  const std::vector<CardKnowledge>& Knowledge() const {
-    return card_knowledge_;
-  }
+  const CardVector& Cards() const { return cards_; }
+  const KnowledgeVector& Knowledge() const { return card_knowledge_; }
   void AddCard(HanabiCard card, const CardKnowledge& initial_knowledge);
   // Remove card_index card from hand. Put in discard_pile if not nullptr
   // (pushes the card to the back of the discard_pile vector).
-  void RemoveFromHand(int card_index, std::vector<HanabiCard>* discard_pile);
+  void RemoveFromHand(int card_index, HanabiCardPile* discard_pile);
   // Make cards with the given rank visible.
   // Returns new information bitmask, bit_i set if card_i color was revealed
   // and was previously unknown.
@@ -116,9 +129,10 @@ class HanabiHand {
   std::string ToString() const;
 
  private:
-  // A set of cards and knowledge about them.
-  std::vector<HanabiCard> cards_;
-  std::vector<CardKnowledge> card_knowledge_;
+  // A set of cards and knowledge about them, stored inline so that hands
+  // copy without allocating.
+  CardVector cards_;
+  KnowledgeVector card_knowledge_;
 };
 
 }  // namespace hanabi_learning_env
@@ -0,0 +1,91 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#ifndef __HANABI_HISTORY_H__
+#define __HANABI_HISTORY_H__
+
+#include <algorithm>
+#include <memory>
+#include <utility>
+#include <vector>
+
+#include "hanabi_history_item.h"
+#include "util.h"
+
+namespace hanabi_learning_env {
+
+// Append-only sequence of HanabiHistoryItems that copies share.
+// Each item lives in an immutable node pointing to the item before it, so a
+// copy only copies a pointer, and appending to a copy never affects the
+// history it was copied from. Nodes are never modified after construction,
+// so histories sharing nodes can be used on different threads.
+class HanabiHistory {
+ public:
+  int Size() const { return size_; }
+  bool Empty() const { return size_ == 0; }
+
+  void PushBack(const HanabiHistoryItem& item) {
+    last_ = std::make_shared<const Node>(Node{item, std::move(last_)});
+    ++size_;
+  }
+
+  // Most recent item.
+  const HanabiHistoryItem& Back() const {
+    REQUIRE(!Empty());
+    return last_->item;
+  }
+
+  // Item number index, counting from the oldest. O(Size() - index), so
+  // recent items are cheap to reach.
+  const HanabiHistoryItem& At(int index) const {
+    REQUIRE(index >= 0 && index < size_);
+    const Node* node = last_.get();
+    for (int i = size_ - 1; i > index; --i) {
+      node = node->previous.get();
+    }
+    return node->item;
+  }
+
+  // The last count items, most recent first.
+  std::vector<HanabiHistoryItem> LastItems(int count) const {
+    REQUIRE(count >= 0 && count <= size_);
+    std::vector<HanabiHistoryItem> items;
+    items.reserve(count);
+    for (const Node* node = last_.get(); static_cast<int>(items.size()) < count;
+         node = node->previous.get()) {
+      items.push_back(node->item);
+    }
+    return items;
+  }
+
+  // All items, oldest first.
+  std::vector<HanabiHistoryItem> ToVector() const {
+    std::vector<HanabiHistoryItem> items = LastItems(size_);
+    std::reverse(items.begin(), items.end());
+    return items;
+  }
+
+ private:
+  struct Node {
+    HanabiHistoryItem item;
+    std::shared_ptr<const Node> previous;
+  };
+
+  std::shared_ptr<const Node> last_;
+  int size_ = 0;
+};
+
+}  // namespace hanabi_learning_env
+
+#endif
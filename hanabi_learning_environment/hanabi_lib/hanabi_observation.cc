@@ -59,10 +59,12 @@ HanabiObservation::HanabiObservation(const HanabiState& state,
       information_tokens_(state.InformationTokens()),
       life_tokens_(state.LifeTokens()),
       legal_moves_(state.LegalMoves(observing_player)),
+      legal_moves_mask_(observing_player == state.CurPlayer()
+                            ? state.LegalMovesMask()
+                            : 0),
       parent_game_(state.ParentGame()) {
   REQUIRE(observing_player >= 0 &&
           observing_player < state.ParentGame()->NumPlayers());
-  hands_.reserve(state.Hands().size());
   const bool hide_knowledge =
       state.ParentGame()->ObservationType() == HanabiGame::kMinimal;
   const bool show_cards = state.ParentGame()->ObservationType() == HanabiGame::kSeer;
@@ -74,21 +76,18 @@ HanabiObservation::HanabiObservation(const HanabiState& state,
                                 false, hide_knowledge));
   }
 
-  const auto& history = state.MoveHistory();
-  auto start = std::find_if(history.begin(), history.end(),
-                            [](const HanabiHistoryItem& item) {
-                              return item.player != kChancePlayerId;
-                            });
-  std::reverse_iterator<decltype(start)> rend(start);
-  for (auto it = history.rbegin(); it != rend; ++it) {
-    last_moves_.push_back(*it);
+  // Moves since observing_player last moved, that move included, or since
+  // the first non-chance move if observing_player has not moved.
+  int start = state.LastMoveIndex(observing_player);
+  if (start < 0) {
+    start = state.FirstMoveIndex();
+  }
+  const HanabiHistory& history = state.History();
+  last_moves_ = history.LastItems(start < 0 ? 0 : history.Size() - start);
+  for (auto& item : last_moves_) {
     ChangeHistoryItemToObserverRelative(observing_player,
                                         state.ParentGame()->NumPlayers(),
-                                        show_cards,
-                                        &last_moves_.back());
-    if (it->player == observing_player) {
-      break;
-    }
+                                        show_cards, &item);
   }
 }
 
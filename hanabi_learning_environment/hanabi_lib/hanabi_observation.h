@@ -15,6 +15,7 @@
 #ifndef __HANABI_OBSERVATION_H__
 #define __HANABI_OBSERVATION_H__
 
+#include <cstdint>
 #include <string>
 #include <vector>
 
@@ -39,10 +40,10 @@ class HanabiObservation {
   // observed hands are in relative order, with index 1 being the
   // first player clock-wise from observing_player. hands[0][] has
   // invalid cards as players don't see their own cards.
-  const std::vector<HanabiHand>& Hands() const { return hands_; }
+  const HanabiState::HandVector& Hands() const { return hands_; }
   // The element at the back is the most recent discard.
-  const std::vector<HanabiCard>& DiscardPile() const { return discard_pile_; }
-  const std::vector<int>& Fireworks() const { return fireworks_; }
+  const HanabiCardPile& DiscardPile() const { return discard_pile_; }
+  const HanabiState::FireworkVector& Fireworks() const { return fireworks_; }
   int DeckSize() const { return deck_size_; }  // number of remaining cards
   const HanabiGame* ParentGame() const { return parent_game_; }
   // Moves made since observing_player's last action, most recent to oldest
@@ -55,6 +56,8 @@ class HanabiObservation {
   int InformationTokens() const { return information_tokens_; }
   int LifeTokens() const { return life_tokens_; }
   const std::vector<HanabiMove>& LegalMoves() const { return legal_moves_; }
+  // LegalMoves() as a bitmask over move uids, see HanabiState::LegalMovesMask.
+  uint64_t LegalMovesMask() const { return legal_moves_mask_; }
 
   // returns true if card with color and rank can be played on fireworks pile
   bool CardPlayableOnFireworks(int color, int rank) const;
@@ -64,14 +67,15 @@ class HanabiObservation {
 
  private:
   int cur_player_offset_;  // offset of current_player from observing_player
-  std::vector<HanabiHand> hands_;         // observing player is element 0
-  std::vector<HanabiCard> discard_pile_;  // back is most recent discard
-  std::vector<int> fireworks_;
+  HanabiState::HandVector hands_;  // observing player is element 0
+  HanabiCardPile discard_pile_;    // back is most recent discard
+  HanabiState::FireworkVector fireworks_;
   int deck_size_;
   std::vector<HanabiHistoryItem> last_moves_;
   int information_tokens_;
   int life_tokens_;
   std::vector<HanabiMove> legal_moves_;  // list of legal moves
+  uint64_t legal_moves_mask_;
   const HanabiGame* parent_game_ = nullptr;
 };
 
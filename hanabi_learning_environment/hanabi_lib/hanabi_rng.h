@@ -0,0 +1,67 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#ifndef __HANABI_RNG_H__
+#define __HANABI_RNG_H__
+
+#include <cstdint>
+#include <limits>
+
+namespace hanabi_learning_env {
+
+// SplitMix64 pseudo-random generator. Its whole state is one 64-bit word, so
+// every HanabiState can carry its own generator, copy it for free, and expose
+// it for saving and restoring. Satisfies UniformRandomBitGenerator, so it
+// works with the <random> distributions.
+class HanabiRng {
+ public:
+  using result_type = uint64_t;
+
+  HanabiRng() = default;
+  explicit HanabiRng(uint64_t state) : state_(state) {}
+
+  // Generator for episode number `episode` of a game seeded with `seed`.
+  // Different (seed, episode) pairs start far apart in the sequence.
+  static HanabiRng ForEpisode(uint64_t seed, uint64_t episode) {
+    return HanabiRng(Mix(Mix(seed) + episode));
+  }
+
+  static constexpr result_type min() { return 0; }
+  static constexpr result_type max() {
+    return std::numeric_limits<result_type>::max();
+  }
+
+  result_type operator()() {
+    state_ += kIncrement;
+    return Mix(state_);
+  }
+
+  uint64_t State() const { return state_; }
+  void SetState(uint64_t state) { state_ = state; }
+
+ private:
+  static constexpr uint64_t kIncrement = 0x9e3779b97f4a7c15ULL;
+
+  static uint64_t Mix(uint64_t z) {
+    z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+    return z ^ (z >> 31);
+  }
+
+  uint64_t state_ = 0;
+};
+
+}  // namespace hanabi_learning_env
+
+#endif
@@ -17,11 +17,22 @@
 #include <algorithm>
 #include <cassert>
 #include <numeric>
+#include <random>
+#include <type_traits>
 
 #include "util.h"
 
 namespace hanabi_learning_env {
 
+static_assert(std::is_trivially_copyable<HanabiHand>::value,
+              "Hands must copy with a memcpy.");
+static_assert(std::is_trivially_copyable<HanabiState::HanabiDeck>::value,
+              "The deck must copy with a memcpy.");
+static_assert(2 * kMaxHandSize +
+                      (kMaxNumPlayers - 1) * (kMaxNumColors + kMaxNumRanks) <=
+                  64,
+              "Every move uid must fit in the 64-bit legal moves mask.");
+
 namespace {
 // Returns bitmask of card indices which match color.
 uint8_t HandColorBitmask(const HanabiHand& hand, int color) {
@@ -51,55 +62,73 @@ uint8_t HandRankBitmask(const HanabiHand& hand, int rank) {
 }  // namespace
 
 HanabiState::HanabiDeck::HanabiDeck(const HanabiGame& game)
-    : card_count_(game.NumColors() * game.NumRanks(), 0),
-      total_count_(0),
+    : total_count_(0),
       num_ranks_(game.NumRanks()) {
   for (int color = 0; color < game.NumColors(); ++color) {
     for (int rank = 0; rank < game.NumRanks(); ++rank) {
       auto count = game.NumberCardInstances(color, rank);
       card_count_[CardToIndex(color, rank)] = count;
-      total_count_ += count;
+      for (int i = 0; i < count; ++i) {
+        cards_[total_count_++] = CardToIndex(color, rank);
+      }
     }
   }
 }
 
-HanabiCard HanabiState::HanabiDeck::DealCard(std::mt19937* rng) {
-  if (Empty()) {
-    return HanabiCard();
-  }
-  std::discrete_distribution<std::mt19937::result_type> dist(
-      card_count_.begin(), card_count_.end());
-  int index = dist(*rng);
+HanabiCard HanabiState::HanabiDeck::RemoveCard(int position) {
+  assert(position >= 0 && position < total_count_);
+  int index = cards_[position];
+  cards_[position] = cards_[--total_count_];
   assert(card_count_[index] > 0);
   --card_count_[index];
-  --total_count_;
   return HanabiCard(IndexToColor(index), IndexToRank(index));
 }
 
+HanabiCard HanabiState::HanabiDeck::DealCard(HanabiRng* rng) {
+  if (Empty()) {
+    return HanabiCard();
+  }
+  std::uniform_int_distribution<int> dist(0, total_count_ - 1);
+  return RemoveCard(dist(*rng));
+}
+
 HanabiCard HanabiState::HanabiDeck::DealCard(int color, int rank) {
   int index = CardToIndex(color, rank);
   if (card_count_[index] <= 0) {
     return HanabiCard();
   }
-  assert(card_count_[index] > 0);
-  --card_count_[index];
-  --total_count_;
-  return HanabiCard(IndexToColor(index), IndexToRank(index));
+  auto end = cards_.begin() + total_count_;
+  auto it = std::find(cards_.begin(), end, index);
+  assert(it != end);
+  return RemoveCard(it - cards_.begin());
 }
 
 HanabiState::HanabiState(HanabiGame* parent_game, int start_player)
+    : HanabiState(parent_game, start_player, parent_game->NextEpisode()) {}
+
+HanabiState::HanabiState(HanabiGame* parent_game, int start_player,
+                         uint64_t episode)
     : parent_game_(parent_game),
       deck_(*parent_game),
-      hands_(parent_game->NumPlayers()),
+      hands_(parent_game->NumPlayers(), HanabiHand()),
       cur_player_(kChancePlayerId),
-      next_non_chance_player_(start_player >= 0 &&
-                                      start_player < parent_game->NumPlayers()
-                                  ? start_player
-                                  : parent_game->GetSampledStartPlayer()),
       information_tokens_(parent_game->MaxInformationTokens()),
       life_tokens_(parent_game->MaxLifeTokens()),
       fireworks_(parent_game->NumColors(), 0),
-      turns_to_play_(parent_game->NumPlayers()) {}
+      turns_to_play_(parent_game->NumPlayers()),
+      episode_(episode),
+      rng_(HanabiRng::ForEpisode(parent_game->Seed(), episode)) {
+  last_move_index_.fill(-1);
+  next_non_chance_player_ =
+      start_player >= 0 && start_player < parent_game->NumPlayers()
+          ? start_player
+          : parent_game->GetSampledStartPlayer(&rng_);
+}
+
+void HanabiState::Reseed(uint64_t episode) {
+  episode_ = episode;
+  rng_ = HanabiRng::ForEpisode(parent_game_->Seed(), episode);
+}
 
 void HanabiState::AdvanceToNextPlayer() {
   if (!deck_.Empty() && PlayerToDeal() >= 0) {
@@ -108,6 +137,39 @@ void HanabiState::AdvanceToNextPlayer() {
     cur_player_ = next_non_chance_player_;
     next_non_chance_player_ = (cur_player_ + 1) % hands_.size();
   }
+  legal_moves_mask_ = ComputeLegalMovesMask();
+}
+
+// Uses the move uid layout of HanabiGame::GetMoveUid: discards, plays, then
+// color and rank hints ordered by target offset.
+uint64_t HanabiState::ComputeLegalMovesMask() const {
+  if (cur_player_ == kChancePlayerId) {
+    return 0;
+  }
+  const HanabiGame& game = *ParentGame();
+  const int hand_size = game.HandSize();
+  const uint64_t cards_in_hand =
+      (static_cast<uint64_t>(1) << hands_[cur_player_].Cards().size()) - 1;
+  uint64_t mask = cards_in_hand << hand_size;  // Plays.
+  if (information_tokens_ < game.MaxInformationTokens()) {
+    mask |= cards_in_hand;  // Discards.
+  }
+  if (information_tokens_ > 0) {
+    const int color_hints = 2 * hand_size;
+    const int rank_hints =
+        color_hints + (game.NumPlayers() - 1) * game.NumColors();
+    for (int offset = 1; offset < game.NumPlayers(); ++offset) {
+      uint64_t colors = 0;
+      uint64_t ranks = 0;
+      for (const HanabiCard& card : HandByOffset(offset).Cards()) {
+        colors |= static_cast<uint64_t>(1) << card.Color();
+        ranks |= static_cast<uint64_t>(1) << card.Rank();
+      }
+      mask |= colors << (color_hints + (offset - 1) * game.NumColors());
+      mask |= ranks << (rank_hints + (offset - 1) * game.NumRanks());
+    }
+  }
+  return mask;
 }
 
 bool HanabiState::IncrementInformationTokens() {
@@ -218,27 +280,53 @@ bool HanabiState::MoveIsLegal(HanabiMove move) const {
   return true;
 }
 
+void HanabiState::ApplyDeal(HanabiCard card) {
+  assert(cur_player_ == kChancePlayerId && card.IsValid());
+  HanabiHistoryItem history(HanabiMove(HanabiMove::kDeal, /*card_index=*/-1,
+                                       /*target_offset=*/-1, card.Color(),
+                                       card.Rank()));
+  history.player = cur_player_;
+  history.deal_to_player = PlayerToDeal();
+  HanabiHand::CardKnowledge card_knowledge(ParentGame()->NumColors(),
+                                           ParentGame()->NumRanks());
+  if (parent_game_->ObservationType() == HanabiGame::kSeer) {
+    card_knowledge.ApplyIsColorHint(card.Color());
+    card_knowledge.ApplyIsRankHint(card.Rank());
+  }
+  hands_[history.deal_to_player].AddCard(card, card_knowledge);
+  move_history_.PushBack(history);
+  AdvanceToNextPlayer();
+}
+
+int HanabiState::LegalMoveUid(HanabiMove move) const {
+  int uid = ParentGame()->GetMoveUid(move);
+  // Out of range card indices or offsets can map onto the uid of another
+  // move, so the move at uid must also be move itself.
+  if (uid < 0 || uid >= ParentGame()->MaxMoves() ||
+      !((legal_moves_mask_ >> uid) & 1) ||
+      !(ParentGame()->GetMove(uid) == move)) {
+    return -1;
+  }
+  return uid;
+}
+
 void HanabiState::ApplyMove(HanabiMove move) {
   REQUIRE(MoveIsLegal(move));
+  ApplyMoveUnchecked(move);
+}
+
+void HanabiState::ApplyMoveUnchecked(HanabiMove move) {
+  if (move.MoveType() == HanabiMove::kDeal) {
+    // Legal deals leave cards in the deck, so turns_to_play_ is unchanged.
+    ApplyDeal(deck_.DealCard(move.Color(), move.Rank()));
+    return;
+  }
   if (deck_.Empty()) {
     --turns_to_play_;
   }
   HanabiHistoryItem history(move);
   history.player = cur_player_;
   switch (move.MoveType()) {
-    case HanabiMove::kDeal: {
-        history.deal_to_player = PlayerToDeal();
-        HanabiHand::CardKnowledge card_knowledge(ParentGame()->NumColors(),
-                                      ParentGame()->NumRanks());
-        if (parent_game_->ObservationType() == HanabiGame::kSeer){
-          card_knowledge.ApplyIsColorHint(move.Color());
-          card_knowledge.ApplyIsRankHint(move.Rank());
-        }
-        hands_[history.deal_to_player].AddCard(
-            deck_.DealCard(move.Color(), move.Rank()),
-            card_knowledge);
-      }
-      break;
     case HanabiMove::kDiscard:
       history.information_token = IncrementInformationTokens();
       history.color = hands_[cur_player_].Cards()[move.CardIndex()].Color();
@@ -270,7 +358,11 @@ void HanabiState::ApplyMove(HanabiMove move) {
     default:
       std::abort();  // Should not be possible.
   }
-  move_history_.push_back(history);
+  last_move_index_[cur_player_] = move_history_.Size();
+  if (first_move_index_ < 0) {
+    first_move_index_ = move_history_.Size();
+  }
+  move_history_.PushBack(history);
   AdvanceToNextPlayer();
 }
 
@@ -280,9 +372,9 @@ double HanabiState::ChanceOutcomeProb(HanabiMove move) const {
 }
 
 void HanabiState::ApplyRandomChance() {
-  auto chance_outcomes = ChanceOutcomes();
-  REQUIRE(!chance_outcomes.second.empty());
-  ApplyMove(ParentGame()->PickRandomChance(chance_outcomes));
+  // Same requirement as a non-empty ChanceOutcomes().
+  REQUIRE(cur_player_ == kChancePlayerId && !deck_.Empty());
+  ApplyDeal(deck_.DealCard(&rng_));
 }
 
 std::vector<HanabiMove> HanabiState::LegalMoves(int player) const {
@@ -293,11 +385,9 @@ std::vector<HanabiMove> HanabiState::LegalMoves(int player) const {
     // Turn-based game. Empty move list for other players.
     return movelist;
   }
-  int max_move_uid = ParentGame()->MaxMoves();
-  for (int uid = 0; uid < max_move_uid; ++uid) {
-    HanabiMove move = ParentGame()->GetMove(uid);
-    if (MoveIsLegal(move)) {
-      movelist.push_back(move);
+  for (int uid = 0; legal_moves_mask_ >> uid != 0; ++uid) {
+    if ((legal_moves_mask_ >> uid) & 1) {
+      movelist.push_back(ParentGame()->GetMove(uid));
     }
   }
   return movelist;
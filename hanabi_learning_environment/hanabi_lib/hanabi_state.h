@@ -15,28 +15,44 @@
 #ifndef __HANABI_STATE_H__
 #define __HANABI_STATE_H__
 
-#include <random>
+#include <array>
+#include <cstdint>
 #include <string>
 #include <vector>
 
+#include "fixed_vector.h"
 #include "hanabi_card.h"
 #include "hanabi_game.h"
 #include "hanabi_hand.h"
+#include "hanabi_history.h"
 #include "hanabi_history_item.h"
 #include "hanabi_move.h"
+#include "hanabi_rng.h"
 
 namespace hanabi_learning_env {
 
 constexpr int kChancePlayerId = -1;
 
+// A state never writes to its parent game or to other states, so distinct
+// states, including copies of one state, can be used on different threads
+// at the same time. A single state may be read concurrently (const methods,
+// observations, encodings) but not modified while anything else uses it.
 class HanabiState {
  public:
+  // Inline, fixed-capacity containers: apart from the move history, which
+  // copies share, a state holds no heap memory, so copying one is a flat
+  // copy whatever the length of the game.
+  using HandVector = FixedVector<HanabiHand, kMaxNumPlayers>;
+  using FireworkVector = FixedVector<int, kMaxNumColors>;
+
   class HanabiDeck {
    public:
     explicit HanabiDeck(const HanabiGame& game);
     // DealCard returns invalid card on failure.
     HanabiCard DealCard(int color, int rank);
-    HanabiCard DealCard(std::mt19937* rng);
+    // Deals a card chosen uniformly among the cards left in the deck, so
+    // that (color, rank) comes out with probability CardCount / Size. O(1).
+    HanabiCard DealCard(HanabiRng* rng);
     int Size() const { return total_count_; }
     bool Empty() const { return total_count_ == 0; }
     int CardCount(int color, int rank) const {
@@ -49,11 +65,16 @@ class HanabiState {
     }
     int IndexToColor(int index) const { return index / num_ranks_; }
     int IndexToRank(int index) const { return index % num_ranks_; }
+    // Removes the card at position in cards_ by moving the last card there.
+    HanabiCard RemoveCard(int position);
 
+    // Card indices of the cards left in the deck, in no particular order.
+    // Only the first total_count_ entries are in the deck.
+    std::array<int8_t, kMaxDeckSize> cards_{};
     // Number of instances in the deck for each card.
     // E.g., if card_count_[CardToIndex(card)] == 2, then there are two
     // instances of card remaining in the deck, available to be dealt out.
-    std::vector<int> card_count_;
+    std::array<int, kMaxNumColors * kMaxNumRanks> card_count_{};
     int total_count_ = -1;  // Total number of cards available to be dealt out.
     int num_ranks_ = -1;    // From game.NumRanks(), used to map card to index.
   };
@@ -68,14 +89,32 @@ class HanabiState {
   // Construct a HanabiState, initialised to the start of the game.
   // If start_player >= 0, the game-provided start player is overridden
   // and the first player after chance is start_player.
+  // Random events use the state's own generator, seeded from the game seed
+  // and parent_game->NextEpisode().
   explicit HanabiState(HanabiGame* parent_game, int start_player = -1);
+  // Same, for a given episode number: states built with the same game seed
+  // and episode deal the same cards, whichever thread or order they are
+  // created in.
+  HanabiState(HanabiGame* parent_game, int start_player, uint64_t episode);
   // Copy constructor for recursive game traversals using copy + apply-move.
+  // The copy has the same generator state, so it deals the same cards as the
+  // original; call Reseed() on it to diverge.
   HanabiState(const HanabiState& state) = default;
 
   bool MoveIsLegal(HanabiMove move) const;
   void ApplyMove(HanabiMove move);
+  // Same as ApplyMove, without checking that move is legal. Only for moves
+  // known to be legal, e.g. taken from LegalMoves() or LegalMovesMask();
+  // applying an illegal move leaves the state undefined.
+  void ApplyMoveUnchecked(HanabiMove move);
+  // Uid of move if it is a legal non-chance move for CurPlayer(), else -1.
+  // Constant time, unlike MoveIsLegal.
+  int LegalMoveUid(HanabiMove move) const;
   // Legal moves for state. Moves point into an unchanging list in parent_game.
   std::vector<HanabiMove> LegalMoves(int player) const;
+  // Bit uid is set iff ParentGame()->GetMove(uid) is legal for CurPlayer().
+  // Zero when chance is to act. Updated by ApplyMove, so reading it is free.
+  uint64_t LegalMovesMask() const { return legal_moves_mask_; }
   // Returns true if card with color and rank can be played on fireworks pile.
   bool CardPlayableOnFireworks(int color, int rank) const;
   bool CardPlayableOnFireworks(HanabiCard card) const {
@@ -83,7 +122,9 @@ class HanabiState {
   }
   bool ChanceOutcomeIsLegal(HanabiMove move) const { return MoveIsLegal(move); }
   double ChanceOutcomeProb(HanabiMove move) const;
+  // Deal a specific card, e.g. one picked from ChanceOutcomes().
   void ApplyChanceOutcome(HanabiMove move) { ApplyMove(move); }
+  // Deal a random card, with the probabilities given by ChanceOutcomes().
   void ApplyRandomChance();
   // Get the valid chance moves, and associated probabilities.
   // Guaranteed that moves.size() == probabilities.size().
@@ -97,16 +138,32 @@ class HanabiState {
   int CurPlayer() const { return cur_player_; }
   int LifeTokens() const { return life_tokens_; }
   int InformationTokens() const { return information_tokens_; }
-  const std::vector<HanabiHand>& Hands() const { return hands_; }
-  const std::vector<int>& Fireworks() const { return fireworks_; }
+  const HandVector& Hands() const { return hands_; }
+  const FireworkVector& Fireworks() const { return fireworks_; }
   HanabiGame* ParentGame() const { return parent_game_; }
   const HanabiDeck& Deck() const { return deck_; }
+  uint64_t Episode() const { return episode_; }
+  // State of the generator used for random deals. Restoring a saved value
+  // replays the same deals.
+  uint64_t RngState() const { return rng_.State(); }
+  void SetRngState(uint64_t rng_state) { rng_.SetState(rng_state); }
+  // Restarts the generator as for a new state of the given episode, which
+  // Episode() then returns. The cards already dealt are unchanged.
+  void Reseed(uint64_t episode);
   // Get the discard pile (the element at the back is the most recent discard.)
-  const std::vector<HanabiCard>& DiscardPile() const { return discard_pile_; }
+  const HanabiCardPile& DiscardPile() const { return discard_pile_; }
   // Sequence of moves from beginning of game. Stored as <move, actor>.
-  const std::vector<HanabiHistoryItem>& MoveHistory() const {
-    return move_history_;
+  // Builds a vector of the whole history; History() gives direct access.
+  std::vector<HanabiHistoryItem> MoveHistory() const {
+    return move_history_.ToVector();
   }
+  const HanabiHistory& History() const { return move_history_; }
+  // Index in the history of the most recent move of player, or -1 if the
+  // player has not moved yet.
+  int LastMoveIndex(int player) const { return last_move_index_[player]; }
+  // Index in the history of the first non-chance move, or -1 if there is
+  // none yet.
+  int FirstMoveIndex() const { return first_move_index_; }
 
  private:
   // Add card to table if possible, if not lose a life token.
@@ -122,7 +179,12 @@ class HanabiState {
     return &hands_[(cur_player_ + offset) % hands_.size()];
   }
   void AdvanceToNextPlayer();  // Set cur_player to next player to act.
+  // Give card, already taken from the deck, to the player missing a card.
+  void ApplyDeal(HanabiCard card);
   bool HintingIsLegal(HanabiMove move) const;
+  // Legal moves of cur_player_ as a bitmask, computed from the hands and
+  // tokens rather than by testing every move.
+  uint64_t ComputeLegalMovesMask() const;
   int PlayerToDeal() const;  // -1 if no player needs a card.
   bool IncrementInformationTokens();
   void DecrementInformationTokens();
@@ -131,15 +193,20 @@ class HanabiState {
   HanabiGame* parent_game_ = nullptr;
   HanabiDeck deck_;
   // Back element of discard_pile_ is most recently discarded card.
-  std::vector<HanabiCard> discard_pile_;
-  std::vector<HanabiHand> hands_;
-  std::vector<HanabiHistoryItem> move_history_;
+  HanabiCardPile discard_pile_;
+  HandVector hands_;
+  HanabiHistory move_history_;
+  std::array<int, kMaxNumPlayers> last_move_index_;  // See LastMoveIndex().
+  int first_move_index_ = -1;
   int cur_player_ = -1;
   int next_non_chance_player_ = -1;  // Next non-chance player to act.
   int information_tokens_ = -1;
   int life_tokens_ = -1;
-  std::vector<int> fireworks_;
+  FireworkVector fireworks_;
   int turns_to_play_ = -1;  // Number of turns to play once deck is empty.
+  uint64_t legal_moves_mask_ = 0;  // See LegalMovesMask().
+  uint64_t episode_ = 0;
+  HanabiRng rng_;
 };
 
 }  // namespace hanabi_learning_env
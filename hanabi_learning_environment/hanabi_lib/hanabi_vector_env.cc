@@ -0,0 +1,114 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "hanabi_vector_env.h"
+
+#include <algorithm>
+#include <cstring>
+
+#include "util.h"
+
+namespace hanabi_learning_env {
+
+HanabiVectorEnv::HanabiVectorEnv(HanabiGame* parent_game, int num_envs,
+                                 bool verify_encoding)
+    : parent_game_(parent_game) {
+  REQUIRE(parent_game != nullptr);
+  REQUIRE(num_envs > 0);
+  states_.reserve(num_envs);
+  encoders_.reserve(num_envs);
+  for (int i = 0; i < num_envs; ++i) {
+    states_.emplace_back(parent_game_);
+    encoders_.emplace_back(parent_game_, verify_encoding);
+    DealChance(i);
+    encoders_[i].Reset(states_[i]);
+  }
+  observation_length_ = encoders_[0].Encoder().Shape()[0];
+}
+
+void HanabiVectorEnv::DealChance(int index) {
+  HanabiState& state = states_[index];
+  while (state.CurPlayer() == kChancePlayerId) {
+    state.ApplyRandomChance();
+  }
+}
+
+void HanabiVectorEnv::ResetState(int index) {
+  states_[index] = HanabiState(parent_game_);
+  DealChance(index);
+  encoders_[index].Reset(states_[index]);
+}
+
+void HanabiVectorEnv::WriteOutputs(int index, uint8_t* observations,
+                                   uint8_t* legal_moves,
+                                   int* current_players) const {
+  const HanabiState& state = states_[index];
+  if (observations != nullptr) {
+    const std::vector<uint8_t>& encodings = encoders_[index].Encodings();
+    std::copy(encodings.begin(), encodings.end(),
+              observations + index * NumPlayers() * observation_length_);
+  }
+  if (legal_moves != nullptr) {
+    int num_moves = NumMoves();
+    uint8_t* out = legal_moves + index * num_moves;
+    std::memset(out, 0, num_moves);
+    if (!state.IsTerminal()) {
+      uint64_t mask = state.LegalMovesMask();
+      for (int uid = 0; uid < num_moves; ++uid) {
+        out[uid] = (mask >> uid) & 1;
+      }
+    }
+  }
+  if (current_players != nullptr) {
+    current_players[index] = state.CurPlayer();
+  }
+}
+
+void HanabiVectorEnv::ResetAll(uint8_t* observations, uint8_t* legal_moves,
+                               int* current_players) {
+  for (int i = 0; i < NumEnvs(); ++i) {
+    ResetState(i);
+    WriteOutputs(i, observations, legal_moves, current_players);
+  }
+}
+
+void HanabiVectorEnv::Step(const int* actions, uint8_t* observations,
+                           uint8_t* legal_moves, int* current_players,
+                           float* rewards, uint8_t* dones) {
+  REQUIRE(actions != nullptr);
+  for (int i = 0; i < NumEnvs(); ++i) {
+    HanabiState& state = states_[i];
+    REQUIRE(actions[i] >= 0 && actions[i] < NumMoves());
+    REQUIRE((state.LegalMovesMask() >> actions[i]) & 1);
+    int last_score = state.Score();
+    state.ApplyMoveUnchecked(parent_game_->GetMove(actions[i]));
+    DealChance(i);
+    // Reward is score differential. May be large and negative at game end.
+    if (rewards != nullptr) {
+      rewards[i] = static_cast<float>(state.Score() - last_score);
+    }
+    bool done = state.IsTerminal();
+    if (dones != nullptr) {
+      dones[i] = done ? 1 : 0;
+    }
+    if (done) {
+      ResetState(i);
+    } else {
+      encoders_[i].Update(state);
+    }
+    WriteOutputs(i, observations, legal_moves, current_players);
+  }
+}
+
+}  // namespace hanabi_learning_env
@@ -0,0 +1,83 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// A batch of independent Hanabi games stepped together. Intended for
+// self-play, where crossing the language boundary once per batch is much
+// cheaper than once per game step.
+
+#ifndef __HANABI_VECTOR_ENV_H__
+#define __HANABI_VECTOR_ENV_H__
+
+#include <cstdint>
+#include <vector>
+
+#include "canonical_encoders.h"
+#include "hanabi_game.h"
+#include "hanabi_state.h"
+
+namespace hanabi_learning_env {
+
+// Owns its states and encoder: distinct environments can be stepped on
+// different threads, even when they share a parent game, but a single
+// environment must not be used by two threads at once.
+class HanabiVectorEnv {
+ public:
+  // Observations are encoded incrementally; if verify_encoding is true, each
+  // incremental encoding is checked against a full one.
+  HanabiVectorEnv(HanabiGame* parent_game, int num_envs,
+                  bool verify_encoding = false);
+
+  int NumEnvs() const { return states_.size(); }
+  int NumPlayers() const { return parent_game_->NumPlayers(); }
+  int NumMoves() const { return parent_game_->MaxMoves(); }
+  // Number of entries in one player's canonical observation encoding.
+  int ObservationLength() const { return observation_length_; }
+  const HanabiState& State(int index) const { return states_.at(index); }
+
+  // All output buffers are owned by the caller and laid out row-major:
+  //   observations:    [NumEnvs(), NumPlayers(), ObservationLength()] bits,
+  //                    one byte per bit.
+  //   legal_moves:     [NumEnvs(), NumMoves()], 1 for moves that are legal
+  //                    for the current player, 0 otherwise.
+  //   current_players: [NumEnvs()]
+  //   rewards:         [NumEnvs()], score differential of the step.
+  //   dones:           [NumEnvs()], 1 if the game ended on this step.
+  // Any output pointer may be nullptr, in which case it is not written.
+
+  // Start a new game in every environment.
+  void ResetAll(uint8_t* observations, uint8_t* legal_moves,
+                int* current_players);
+  // Apply actions[i] (a move uid) to environment i. Games that end are
+  // immediately reset, so the outputs for a finished game describe the first
+  // position of its replacement.
+  void Step(const int* actions, uint8_t* observations, uint8_t* legal_moves,
+            int* current_players, float* rewards, uint8_t* dones);
+
+ private:
+  // Replace state index with a new game dealt up to the first player move.
+  void ResetState(int index);
+  void DealChance(int index);
+  void WriteOutputs(int index, uint8_t* observations, uint8_t* legal_moves,
+                    int* current_players) const;
+
+  HanabiGame* parent_game_ = nullptr;
+  std::vector<HanabiState> states_;
+  // encoders_[i] holds the observations of states_[i].
+  std::vector<IncrementalCanonicalEncoder> encoders_;
+  int observation_length_ = -1;
+};
+
+}  // namespace hanabi_learning_env
+
+#endif
@@ -24,6 +24,12 @@ namespace hanabi_learning_env {
 
 constexpr int kMaxNumColors = 5;
 constexpr int kMaxNumRanks = 5;
+constexpr int kMaxNumPlayers = 5;
+// Hint bitmasks (see HanabiHistoryItem) hold one bit per card in hand.
+constexpr int kMaxHandSize = 8;
+// 3 instances of the lowest rank, 1 of the highest, 2 of the others.
+constexpr int kMaxDeckSize =
+    kMaxNumColors * (3 + 2 * (kMaxNumRanks - 2) + 1);
 
 // Returns a character representation of an integer color/rank index.
 char ColorIndexToChar(int color);
@@ -14,9 +14,13 @@
 
 #include "pyhanabi.h"
 
+#include <algorithm>
+#include <cassert>
+#include <cstdint>
 #include <cstdlib>
 #include <cstring>
 #include <iostream>
+#include <limits>
 #include <memory>
 #include <string>
 #include <unordered_map>
@@ -28,9 +32,53 @@
 #include "hanabi_lib/hanabi_move.h"
 #include "hanabi_lib/hanabi_observation.h"
 #include "hanabi_lib/hanabi_state.h"
+#include "hanabi_lib/hanabi_vector_env.h"
 #include "hanabi_lib/observation_encoder.h"
 #include "hanabi_lib/util.h"
 
+namespace {
+// Writes legal to mask[uid] for the uids set in legal_moves, illegal to the
+// other mask_length - num_moves entries.
+template <typename T>
+void WriteLegalMovesMask(uint64_t legal_moves, int num_moves, T legal,
+                         T illegal, T* mask, int mask_length) {
+  REQUIRE(mask_length >= num_moves);
+  for (int uid = 0; uid < num_moves; ++uid) {
+    mask[uid] = (legal_moves >> uid) & 1 ? legal : illegal;
+  }
+  std::fill(mask + num_moves, mask + mask_length, illegal);
+}
+
+// Sizes of the records written by ObsExport.
+constexpr int kExportMoveLength = 5;
+constexpr int kExportCardLength = 6;
+constexpr int kExportHistoryItemLength = kExportMoveLength + 8;
+constexpr int kExportLegalMoveLength = 1 + kExportMoveLength;
+
+int* ExportMove(const hanabi_learning_env::HanabiMove& move, int* out) {
+  *out++ = move.MoveType();
+  *out++ = move.CardIndex();
+  *out++ = move.TargetOffset();
+  *out++ = move.Color();
+  *out++ = move.Rank();
+  return out;
+}
+
+// The encoder of a pyhanabi encoder, which must be canonical: only canonical
+// encoders write into byte buffers.
+const hanabi_learning_env::CanonicalObservationEncoder* CanonicalEncoder(
+    const pyhanabi_observation_encoder_t* encoder) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  auto obs_enc =
+      dynamic_cast<const hanabi_learning_env::CanonicalObservationEncoder*>(
+          reinterpret_cast<const hanabi_learning_env::ObservationEncoder*>(
+              encoder->encoder));
+  REQUIRE(obs_enc != nullptr);
+  return obs_enc;
+}
+}  // namespace
+
 extern "C" {
 
 /* Helpers. */
@@ -296,6 +344,16 @@ void NewState(pyhanabi_game_t* game, pyhanabi_state_t* state) {
       static_cast<hanabi_learning_env::HanabiGame*>(game->game));
 }
 
+void NewStateForEpisode(pyhanabi_game_t* game, unsigned long long episode,
+                        pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  state->state = new hanabi_learning_env::HanabiState(
+      static_cast<hanabi_learning_env::HanabiGame*>(game->game),
+      /*start_player=*/-1, episode);
+}
+
 void CopyState(const pyhanabi_state_t* src, pyhanabi_state_t* dest) {
   REQUIRE(src != nullptr);
   REQUIRE(src->state != nullptr);
@@ -332,6 +390,58 @@ void StateApplyMove(pyhanabi_state_t* state, pyhanabi_move_t* move) {
   hanabi_state->ApplyMove(*hanabi_move);
 }
 
+void StateApplyMoveUnchecked(pyhanabi_state_t* state, pyhanabi_move_t* move) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(move != nullptr);
+  REQUIRE(move->move != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  auto hanabi_move =
+      reinterpret_cast<const hanabi_learning_env::HanabiMove*>(move->move);
+  hanabi_state->ApplyMoveUnchecked(*hanabi_move);
+}
+
+int StateLegalMoveUid(pyhanabi_state_t* state, pyhanabi_move_t* move) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(move != nullptr);
+  REQUIRE(move->move != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  auto hanabi_move =
+      reinterpret_cast<const hanabi_learning_env::HanabiMove*>(move->move);
+  return hanabi_state->LegalMoveUid(*hanabi_move);
+}
+
+unsigned long long StateEpisode(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->Episode();
+}
+
+unsigned long long StateRngState(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->RngState();
+}
+
+void StateSetRngState(pyhanabi_state_t* state, unsigned long long rng_state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->SetRngState(rng_state);
+}
+
+void StateReseed(pyhanabi_state_t* state, unsigned long long episode) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->Reseed(episode);
+}
+
 int StateCurPlayer(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
@@ -433,6 +543,33 @@ void* StateLegalMoves(pyhanabi_state_t* state) {
   return static_cast<void*>(list);
 }
 
+unsigned long long StateLegalMovesBitmask(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->LegalMovesMask();
+}
+
+void StateLegalMovesMask(pyhanabi_state_t* state, unsigned char* mask,
+                         int mask_length) {
+  REQUIRE(mask != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  WriteLegalMovesMask<unsigned char>(
+      StateLegalMovesBitmask(state), hanabi_state->ParentGame()->MaxMoves(),
+      1, 0, mask, mask_length);
+}
+
+void StateLegalMovesAdditiveMask(pyhanabi_state_t* state, float* mask,
+                                 int mask_length) {
+  REQUIRE(mask != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  WriteLegalMovesMask<float>(
+      StateLegalMovesBitmask(state), hanabi_state->ParentGame()->MaxMoves(),
+      0, -std::numeric_limits<float>::infinity(), mask, mask_length);
+}
+
 int StateLifeTokens(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
@@ -482,8 +619,8 @@ int StateLenMoveHistory(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
   return reinterpret_cast<const hanabi_learning_env::HanabiState*>(state->state)
-      ->MoveHistory()
-      .size();
+      ->History()
+      .Size();
 }
 
 void StateGetMoveHistory(pyhanabi_state_t* state, int index,
@@ -493,8 +630,8 @@ void StateGetMoveHistory(pyhanabi_state_t* state, int index,
   REQUIRE(item != nullptr);
   item->item = new hanabi_learning_env::HanabiHistoryItem(
       reinterpret_cast<const hanabi_learning_env::HanabiState*>(state->state)
-          ->MoveHistory()
-          .at(index));
+          ->History()
+          .At(index));
 }
 
 /* Wrapper definitions for HanabiGame. */
@@ -573,6 +710,18 @@ int ObservationType(pyhanabi_game_t* game) {
       ->ObservationType();
 }
 
+int GameSeed(pyhanabi_game_t* game) {
+  return reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game)
+      ->Seed();
+}
+
+unsigned long long GameNextEpisode(pyhanabi_game_t* game) {
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game)
+      ->NextEpisode();
+}
+
 int NumCards(pyhanabi_game_t* game, int color, int rank) {
   return reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game)
       ->NumberCardInstances(color, rank);
@@ -786,6 +935,36 @@ void ObsGetLegalMove(pyhanabi_observation_t* observation, int index,
            .at(index)));
 }
 
+unsigned long long ObsLegalMovesBitmask(
+    pyhanabi_observation_t* observation) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+             observation->observation)
+      ->LegalMovesMask();
+}
+
+void ObsLegalMovesMask(pyhanabi_observation_t* observation,
+                       unsigned char* mask, int mask_length) {
+  REQUIRE(mask != nullptr);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  WriteLegalMovesMask<unsigned char>(ObsLegalMovesBitmask(observation),
+                                     obs->ParentGame()->MaxMoves(), 1, 0,
+                                     mask, mask_length);
+}
+
+void ObsLegalMovesAdditiveMask(pyhanabi_observation_t* observation,
+                               float* mask, int mask_length) {
+  REQUIRE(mask != nullptr);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  WriteLegalMovesMask<float>(ObsLegalMovesBitmask(observation),
+                             obs->ParentGame()->MaxMoves(), 0,
+                             -std::numeric_limits<float>::infinity(), mask,
+                             mask_length);
+}
+
 bool ObsCardPlayableOnFireworks(const pyhanabi_observation_t* observation,
                                 int color, int rank) {
   return reinterpret_cast<const hanabi_learning_env::HanabiObservation*>(
@@ -793,6 +972,77 @@ bool ObsCardPlayableOnFireworks(const pyhanabi_observation_t* observation,
       ->CardPlayableOnFireworks(color, rank);
 }
 
+int ObsExport(pyhanabi_observation_t* observation, int* buffer,
+              int buffer_length) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  REQUIRE(buffer != nullptr || buffer_length == 0);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  const auto& hands = obs->Hands();
+  const auto& fireworks = obs->Fireworks();
+  const auto& discards = obs->DiscardPile();
+  const auto& last_moves = obs->LastMoves();
+  const auto& legal_moves = obs->LegalMoves();
+
+  int length = 6 + fireworks.size() + hands.size() + 1 +
+               2 * discards.size() + 1 +
+               kExportHistoryItemLength * last_moves.size() + 1 +
+               kExportLegalMoveLength * legal_moves.size();
+  for (const auto& hand : hands) {
+    length += kExportCardLength * hand.Cards().size();
+  }
+  if (length > buffer_length) {
+    return length;
+  }
+
+  int* out = buffer;
+  *out++ = obs->CurPlayerOffset();
+  *out++ = hands.size();
+  *out++ = obs->DeckSize();
+  *out++ = obs->InformationTokens();
+  *out++ = obs->LifeTokens();
+  *out++ = fireworks.size();
+  out = std::copy(fireworks.begin(), fireworks.end(), out);
+  for (const auto& hand : hands) {
+    const auto& cards = hand.Cards();
+    const auto& knowledge = hand.Knowledge();
+    *out++ = cards.size();
+    for (int i = 0; i < cards.size(); ++i) {
+      *out++ = cards[i].Color();
+      *out++ = cards[i].Rank();
+      *out++ = knowledge[i].Color();
+      *out++ = knowledge[i].Rank();
+      *out++ = knowledge[i].ColorPlausibleBitmask();
+      *out++ = knowledge[i].RankPlausibleBitmask();
+    }
+  }
+  *out++ = discards.size();
+  for (const auto& card : discards) {
+    *out++ = card.Color();
+    *out++ = card.Rank();
+  }
+  *out++ = last_moves.size();
+  for (const auto& item : last_moves) {
+    out = ExportMove(item.move, out);
+    *out++ = item.player;
+    *out++ = item.scored;
+    *out++ = item.information_token;
+    *out++ = item.color;
+    *out++ = item.rank;
+    *out++ = item.reveal_bitmask;
+    *out++ = item.newly_revealed_bitmask;
+    *out++ = item.deal_to_player;
+  }
+  *out++ = legal_moves.size();
+  for (const auto& move : legal_moves) {
+    *out++ = obs->ParentGame()->GetMoveUid(move);
+    out = ExportMove(move, out);
+  }
+  assert(out - buffer == length);
+  return length;
+}
+
 void NewObservationEncoder(pyhanabi_observation_encoder_t* encoder,
                            pyhanabi_game_t* game, int type) {
   REQUIRE(encoder != nullptr);
@@ -858,4 +1108,131 @@ char* EncodeObservation(pyhanabi_observation_encoder_t* encoder,
   return strdup(obs_str.c_str());
 }
 
+int ObservationLength(pyhanabi_observation_encoder_t* encoder) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  std::vector<int> shape =
+      reinterpret_cast<hanabi_learning_env::ObservationEncoder*>(
+          encoder->encoder)
+          ->Shape();
+  int length = 1;
+  for (int dim : shape) {
+    length *= dim;
+  }
+  return length;
+}
+
+void EncodeObservationToBuffer(pyhanabi_observation_encoder_t* encoder,
+                               pyhanabi_observation_t* observation,
+                               unsigned char* buffer, int buffer_length) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  REQUIRE(buffer != nullptr);
+  REQUIRE(ObservationLength(encoder) <= buffer_length);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  CanonicalEncoder(encoder)->Encode(*obs, buffer);
+}
+
+// Bits are packed most significant bit first, matching numpy.packbits.
+void EncodeObservationToPackedBuffer(pyhanabi_observation_encoder_t* encoder,
+                                     pyhanabi_observation_t* observation,
+                                     unsigned char* buffer, int buffer_length) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  REQUIRE(buffer != nullptr);
+  int num_bytes = (ObservationLength(encoder) + 7) / 8;
+  REQUIRE(num_bytes <= buffer_length);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  // One byte per bit, padded to whole bytes with zeros. Reused by later calls
+  // on the same thread, so encoding does not allocate once it has grown.
+  thread_local std::vector<uint8_t> bits;
+  bits.assign(8 * num_bytes, 0);
+  CanonicalEncoder(encoder)->Encode(*obs, bits.data());
+  for (int i = 0; i < num_bytes; ++i) {
+    const uint8_t* byte_bits = bits.data() + 8 * i;
+    unsigned char byte = 0;
+    for (int j = 0; j < 8; ++j) {
+      byte = static_cast<unsigned char>((byte << 1) | byte_bits[j]);
+    }
+    buffer[i] = byte;
+  }
+}
+
+void EncodeStateToBuffer(pyhanabi_observation_encoder_t* encoder,
+                         pyhanabi_state_t* state, unsigned char* buffer,
+                         int buffer_length) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(buffer != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  REQUIRE(hanabi_state->ParentGame()->NumPlayers() *
+              ObservationLength(encoder) <=
+          buffer_length);
+  CanonicalEncoder(encoder)->EncodeAllPlayers(*hanabi_state, buffer);
+}
+
+/* Wrapper definitions for HanabiVectorEnv. */
+void NewVectorEnv(pyhanabi_vector_env_t* env, pyhanabi_game_t* game,
+                  int num_envs, int verify_encoding) {
+  REQUIRE(env != nullptr);
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  env->env = new hanabi_learning_env::HanabiVectorEnv(
+      reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game),
+      num_envs, verify_encoding != 0);
+}
+
+void DeleteVectorEnv(pyhanabi_vector_env_t* env) {
+  REQUIRE(env != nullptr);
+  REQUIRE(env->env != nullptr);
+  delete reinterpret_cast<hanabi_learning_env::HanabiVectorEnv*>(env->env);
+  env->env = nullptr;
+}
+
+int VectorEnvNumEnvs(pyhanabi_vector_env_t* env) {
+  REQUIRE(env != nullptr);
+  REQUIRE(env->env != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiVectorEnv*>(env->env)
+      ->NumEnvs();
+}
+
+int VectorEnvObservationLength(pyhanabi_vector_env_t* env) {
+  REQUIRE(env != nullptr);
+  REQUIRE(env->env != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiVectorEnv*>(env->env)
+      ->ObservationLength();
+}
+
+void VectorEnvGetState(pyhanabi_vector_env_t* env, int index,
+                       pyhanabi_state_t* state) {
+  REQUIRE(env != nullptr);
+  REQUIRE(env->env != nullptr);
+  REQUIRE(state != nullptr);
+  // Borrowed pointer; only valid until the next reset or step.
+  state->state = const_cast<hanabi_learning_env::HanabiState*>(
+      &reinterpret_cast<hanabi_learning_env::HanabiVectorEnv*>(env->env)
+           ->State(index));
+}
+
+void VectorEnvResetAll(pyhanabi_vector_env_t* env, unsigned char* observations,
+                       unsigned char* legal_moves, int* current_players) {
+  REQUIRE(env != nullptr);
+  REQUIRE(env->env != nullptr);
+  reinterpret_cast<hanabi_learning_env::HanabiVectorEnv*>(env->env)->ResetAll(
+      observations, legal_moves, current_players);
+}
+
+void VectorEnvStep(pyhanabi_vector_env_t* env, const int* actions,
+                   unsigned char* observations, unsigned char* legal_moves,
+                   int* current_players, float* rewards, unsigned char* dones) {
+  REQUIRE(env != nullptr);
+  REQUIRE(env->env != nullptr);
+  REQUIRE(actions != nullptr);
+  reinterpret_cast<hanabi_learning_env::HanabiVectorEnv*>(env->env)->Step(
+      actions, observations, legal_moves, current_players, rewards, dones);
+}
+
 } /* extern "C" */
@@ -19,6 +19,23 @@
  * This is a pure C API to the C++ code.
  * All the declarations are loaded in pyhanabi.py.
  * The set of functions below is referred to as the 'cdef' throughout the code.
+ *
+ * Thread safety. No function keeps global state, and cffi releases the GIL
+ * for the duration of every call, so functions can run in parallel from
+ * several Python threads under these rules:
+ *  - Games are immutable once created and may be shared by any number of
+ *    threads. They must outlive every state, observation, encoder and vector
+ *    env created from them.
+ *  - States are independent of each other: each carries its own random
+ *    number generator (see NewStateForEpisode), so different states of one
+ *    game can be stepped concurrently. A single state may be read by several
+ *    threads at once, but StateApplyMove*, StateDealRandomCard,
+ *    StateSetRngState and the other mutating calls need exclusive access.
+ *  - Observations are snapshots and are read-only, as are encoders; both
+ *    can be shared freely.
+ *  - Vector envs need exclusive access for every call; use one per thread.
+ *  - Moves, move lists, history items and strings returned by the library
+ *    belong to the caller.
  */
 
 extern "C" {
@@ -63,6 +80,11 @@ typedef struct PyHanabiObservationEncoder {
   void* encoder;
 } pyhanabi_observation_encoder_t;
 
+typedef struct PyHanabiVectorEnv {
+  /* Points to a hanabi_learning_env::HanabiVectorEnv. */
+  void* env;
+} pyhanabi_vector_env_t;
+
 /* Utility Functions. */
 void DeleteString(char* str);
 
@@ -109,11 +131,23 @@ int HistoryItemDealToPlayer(pyhanabi_history_item_t* item);
 
 /* State functions. */
 void NewState(pyhanabi_game_t* game, pyhanabi_state_t* state);
+/* New state for a given episode number instead of the game's next one. */
+void NewStateForEpisode(pyhanabi_game_t* game, unsigned long long episode,
+                        pyhanabi_state_t* state);
 void CopyState(const pyhanabi_state_t* src, pyhanabi_state_t* dest);
 void DeleteState(pyhanabi_state_t* state);
 void StateParentGame(pyhanabi_state_t* state, pyhanabi_game_t*dest_game);
 void StateApplyMove(pyhanabi_state_t* state, pyhanabi_move_t* move);
+/* Skips the legality check: move must be legal. */
+void StateApplyMoveUnchecked(pyhanabi_state_t* state, pyhanabi_move_t* move);
+/* Uid of move if it is legal for the current player, else -1. */
+int StateLegalMoveUid(pyhanabi_state_t* state, pyhanabi_move_t* move);
 int StateCurPlayer(pyhanabi_state_t* state);
+unsigned long long StateEpisode(pyhanabi_state_t* state);
+unsigned long long StateRngState(pyhanabi_state_t* state);
+void StateSetRngState(pyhanabi_state_t* state, unsigned long long rng_state);
+/* Restarts the state's generator as for a new state of the given episode. */
+void StateReseed(pyhanabi_state_t* state, unsigned long long episode);
 void StateDealRandomCard(pyhanabi_state_t* state);
 int StateDeckSize(pyhanabi_state_t* state);
 int StateFireworks(pyhanabi_state_t* state, int color);
@@ -125,6 +159,12 @@ void StateGetHandCard(pyhanabi_state_t* state, int pid, int index,
 int StateEndOfGameStatus(pyhanabi_state_t* state);
 int StateInformationTokens(pyhanabi_state_t* state);
 void* StateLegalMoves(pyhanabi_state_t* state);
+/* Bit uid is set iff move uid is legal for the current player. */
+unsigned long long StateLegalMovesBitmask(pyhanabi_state_t* state);
+void StateLegalMovesMask(pyhanabi_state_t* state, unsigned char* mask,
+                         int mask_length);
+void StateLegalMovesAdditiveMask(pyhanabi_state_t* state, float* mask,
+                                 int mask_length);
 int StateLifeTokens(pyhanabi_state_t* state);
 int StateNumPlayers(pyhanabi_state_t* state);
 int StateScore(pyhanabi_state_t* state);
@@ -148,6 +188,9 @@ int HandSize(pyhanabi_game_t* game);
 int MaxInformationTokens(pyhanabi_game_t* game);
 int MaxLifeTokens(pyhanabi_game_t* game);
 int ObservationType(pyhanabi_game_t* game);
+int GameSeed(pyhanabi_game_t* game);
+/* Takes the game's next episode number, as NewState does. */
+unsigned long long GameNextEpisode(pyhanabi_game_t* game);
 int NumCards(pyhanabi_game_t* game, int color, int rank);
 int GetMoveUid(pyhanabi_game_t* game, pyhanabi_move_t* move);
 void GetMoveByUid(pyhanabi_game_t* game, int move_uid, pyhanabi_move_t* move);
@@ -178,8 +221,31 @@ int ObsLifeTokens(pyhanabi_observation_t* observation);
 int ObsNumLegalMoves(pyhanabi_observation_t* observation);
 void ObsGetLegalMove(pyhanabi_observation_t* observation, int index,
                      pyhanabi_move_t* move);
+unsigned long long ObsLegalMovesBitmask(pyhanabi_observation_t* observation);
+void ObsLegalMovesMask(pyhanabi_observation_t* observation,
+                       unsigned char* mask, int mask_length);
+void ObsLegalMovesAdditiveMask(pyhanabi_observation_t* observation,
+                               float* mask, int mask_length);
 bool ObsCardPlayableOnFireworks(const pyhanabi_observation_t* observation,
                                 int color, int rank);
+/* Writes the whole observation to buffer as a flat list of ints and returns
+ * the number of ints it takes. If that is more than buffer_length, nothing
+ * is written and the call should be repeated with a large enough buffer.
+ * Layout, where a move is the 5 ints
+ * (type, card_index, target_offset, color, rank):
+ *   cur_player_offset, num_players, deck_size, information_tokens,
+ *   life_tokens, num_colors, fireworks[num_colors],
+ *   for each of num_players hands: hand_size, then per card
+ *     (color, rank, hinted color, hinted rank, color plausible bitmask,
+ *      rank plausible bitmask),
+ *   num_discards, then per discard (color, rank),
+ *   num_last_moves, then per history item (move, player, scored,
+ *     information_token, color, rank, reveal_bitmask,
+ *     newly_revealed_bitmask, deal_to_player),
+ *   num_legal_moves, then per legal move in uid order (uid, move).
+ */
+int ObsExport(pyhanabi_observation_t* observation, int* buffer,
+              int buffer_length);
 
 /* ObservationEncoder functions. */
 void NewObservationEncoder(pyhanabi_observation_encoder_t* encoder,
@@ -188,6 +254,35 @@ void DeleteObservationEncoder(pyhanabi_observation_encoder_t* encoder);
 char* ObservationShape(pyhanabi_observation_encoder_t* encoder);
 char* EncodeObservation(pyhanabi_observation_encoder_t* encoder,
                         pyhanabi_observation_t* observation);
+int ObservationLength(pyhanabi_observation_encoder_t* encoder);
+/* Writes the encoding of observation into buffer, one byte per bit, without
+ * intermediate copies. Canonical encoders only. */
+void EncodeObservationToBuffer(pyhanabi_observation_encoder_t* encoder,
+                               pyhanabi_observation_t* observation,
+                               unsigned char* buffer, int buffer_length);
+void EncodeObservationToPackedBuffer(pyhanabi_observation_encoder_t* encoder,
+                                     pyhanabi_observation_t* observation,
+                                     unsigned char* buffer, int buffer_length);
+/* Writes the encodings of all players' observations of state, one byte per
+ * bit, as rows of a [num_players, ObservationLength] buffer. Canonical
+ * encoders only. */
+void EncodeStateToBuffer(pyhanabi_observation_encoder_t* encoder,
+                         pyhanabi_state_t* state, unsigned char* buffer,
+                         int buffer_length);
+
+/* VectorEnv functions. */
+void NewVectorEnv(pyhanabi_vector_env_t* env, pyhanabi_game_t* game,
+                  int num_envs, int verify_encoding);
+void DeleteVectorEnv(pyhanabi_vector_env_t* env);
+int VectorEnvNumEnvs(pyhanabi_vector_env_t* env);
+int VectorEnvObservationLength(pyhanabi_vector_env_t* env);
+void VectorEnvGetState(pyhanabi_vector_env_t* env, int index,
+                       pyhanabi_state_t* state);
+void VectorEnvResetAll(pyhanabi_vector_env_t* env, unsigned char* observations,
+                       unsigned char* legal_moves, int* current_players);
+void VectorEnvStep(pyhanabi_vector_env_t* env, const int* actions,
+                   unsigned char* observations, unsigned char* legal_moves,
+                   int* current_players, float* rewards, unsigned char* dones);
 
 } /* extern "C" */
 
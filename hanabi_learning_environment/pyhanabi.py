@@ -12,12 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Python interface to Hanabi code."""
+"""Python interface to Hanabi code.
+
+The library is called through cffi, which releases the GIL while C++ code
+runs, so games can be played on a pool of threads that scales across cores.
+Objects follow the thread-safety rules documented at the top of pyhanabi.h:
+a HanabiGame and ObservationEncoder can be shared by all threads, every
+HanabiState and HanabiObservation can be read from several threads, and a
+HanabiState or HanabiVectorEnv must only be modified by one thread at a
+time. Create states with new_initial_state(episode=...) to make the dealt
+cards independent of thread scheduling.
+"""
 import os
 import re
 import cffi
 import enum
 import sys
+import numpy as np
 
 DEFAULT_CDEF_PREFIXES = (None, ".", os.path.dirname(__file__), "/include")
 DEFAULT_LIB_PREFIXES = (None, ".", os.path.dirname(__file__), "/lib")
@@ -27,6 +38,8 @@ COLOR_CHAR = ["R", "Y", "G", "W", "B"]  # consistent with hanabi_lib/util.cc
 CHANCE_PLAYER_ID = -1
 
 ffi = cffi.FFI()
+# For buffers the library overwrites, where zeroing them first is wasted work.
+_new_uncleared = ffi.new_allocator(should_clear_after_alloc=False)
 lib = None
 cdef_loaded_flag = False
 lib_loaded_flag = False
@@ -153,6 +166,137 @@ def color_char_to_idx(color_char):
         color_char, COLOR_CHAR))
 
 
+def _check_dtype(name, array, *dtypes):
+  """Raises TypeError if array is a numpy array of none of dtypes.
+
+  ffi.from_buffer accepts any buffer, so without the check an array of
+  another dtype would silently be read or written as raw bytes.
+  """
+  if isinstance(array, np.ndarray) and array.dtype not in dtypes:
+    raise TypeError("Expected {} as a {} array, got {}.".format(
+        name, " or ".join(np.dtype(dtype).name for dtype in dtypes),
+        array.dtype))
+
+
+def _writable_buffer(out, c_type, dtype):
+  """Returns a cdata view of out, raising TypeError for numpy dtype mismatch."""
+  _check_dtype("out", out, dtype)
+  return ffi.from_buffer(c_type, out, require_writable=True)
+
+
+def _legal_moves_mask(c_object, max_moves, out, additive, mask_fn,
+                      additive_mask_fn):
+  """Fills out (allocated if None) using a C legal move mask function."""
+  if additive:
+    if out is None:
+      out = np.empty(max_moves, dtype=np.float32)
+    c_mask = _writable_buffer(out, "float[]", np.float32)
+    additive_mask_fn(c_object, c_mask, len(c_mask))
+  else:
+    if out is None:
+      out = np.empty(max_moves, dtype=np.uint8)
+    c_mask = _writable_buffer(out, "unsigned char[]", np.uint8)
+    mask_fn(c_object, c_mask, len(c_mask))
+  return out
+
+
+# Initial buffer size for HanabiObservation.export(). Large enough for the
+# default games; bigger observations cost a second library call.
+_EXPORT_BUFFER_LENGTH = 1024
+
+
+def _color_char(color_idx):
+  return COLOR_CHAR[color_idx] if color_idx >= 0 else None
+
+
+def _decode_move(values, i):
+  """Returns the to_dict() of the move exported at values[i:i + 5]."""
+  move_type, card_index, target_offset, color, rank = values[i:i + 5]
+  move_type = HanabiMoveType(move_type)
+  if move_type == HanabiMoveType.PLAY or move_type == HanabiMoveType.DISCARD:
+    return {"action_type": move_type.name, "card_index": card_index}
+  elif move_type == HanabiMoveType.REVEAL_COLOR:
+    return {"action_type": move_type.name, "target_offset": target_offset,
+            "color": COLOR_CHAR[color]}
+  elif move_type == HanabiMoveType.REVEAL_RANK:
+    return {"action_type": move_type.name, "target_offset": target_offset,
+            "rank": rank}
+  elif move_type == HanabiMoveType.DEAL:
+    return {"action_type": move_type.name, "color": _color_char(color),
+            "rank": rank}
+  raise ValueError("Unsupported move type: {}".format(move_type))
+
+
+def _bit_indices(bitmask):
+  return [i for i in range(8) if bitmask & (1 << i)]
+
+
+def _decode_observation(values):
+  """Builds the dict of HanabiObservation.to_dict() from its export()."""
+  (cur_player_offset, num_players, deck_size, information_tokens, life_tokens,
+   num_colors) = values[:6]
+  i = 6
+  fireworks = dict(zip(COLOR_CHAR, values[i:i + num_colors]))
+  i += num_colors
+  observed_hands = []
+  card_knowledge = []
+  for _ in range(num_players):
+    hand_size = values[i]
+    i += 1
+    hand = []
+    knowledge = []
+    for _ in range(hand_size):
+      color, rank, hinted_color, hinted_rank = values[i:i + 4]
+      hand.append({"color": _color_char(color), "rank": rank})
+      knowledge.append({"color": _color_char(hinted_color),
+                        "rank": hinted_rank if hinted_rank >= 0 else None})
+      i += 6  # Skips the plausible bitmasks.
+    observed_hands.append(hand)
+    card_knowledge.append(knowledge)
+  num_discards = values[i]
+  i += 1
+  discard_pile = [{"color": COLOR_CHAR[values[j]], "rank": values[j + 1]}
+                  for j in range(i, i + 2 * num_discards, 2)]
+  i += 2 * num_discards
+  num_last_moves = values[i]
+  i += 1
+  last_moves = []
+  for _ in range(num_last_moves):
+    (player, scored, information_token, color, rank, reveal_bitmask,
+     newly_revealed_bitmask, deal_to_player) = values[i + 5:i + 13]
+    last_moves.append({
+        "move": _decode_move(values, i),
+        "player": player,
+        "scored": bool(scored),
+        "information_token": bool(information_token),
+        "color": color,
+        "rank": rank,
+        "card_info_revealed": _bit_indices(reveal_bitmask),
+        "card_info_newly_revealed": _bit_indices(newly_revealed_bitmask),
+        "deal_to_player": deal_to_player,
+    })
+    i += 13
+  num_legal_moves = values[i]
+  i += 1
+  legal_moves_as_int = list(values[i:i + 6 * num_legal_moves:6])
+  legal_moves = [_decode_move(values, j)
+                 for j in range(i + 1, i + 6 * num_legal_moves, 6)]
+  return {
+      "current_player_offset": cur_player_offset,
+      "life_tokens": life_tokens,
+      "information_tokens": information_tokens,
+      "num_players": num_players,
+      "deck_size": deck_size,
+      "fireworks": fireworks,
+      "legal_moves": legal_moves,
+      "legal_moves_as_int": legal_moves_as_int,
+      "observed_hands": observed_hands,
+      "discard_pile": discard_pile,
+      "card_knowledge": card_knowledge,
+      "last_moves": last_moves,
+  }
+
+
 class HanabiCard(object):
   """Hanabi card, with a color and a rank.
 
@@ -329,27 +473,31 @@ class HanabiMove(object):
   @staticmethod
   def get_discard_move(card_index):
     c_move = ffi.new("pyhanabi_move_t*")
-    assert lib.GetDiscardMove(card_index, c_move)
+    success = lib.GetDiscardMove(card_index, c_move)
+    assert success
     return HanabiMove(c_move)
 
   @staticmethod
   def get_play_move(card_index):
     c_move = ffi.new("pyhanabi_move_t*")
-    assert lib.GetPlayMove(card_index, c_move)
+    success = lib.GetPlayMove(card_index, c_move)
+    assert success
     return HanabiMove(c_move)
 
   @staticmethod
   def get_reveal_color_move(target_offset, color):
     """current player is 0, next player clockwise is target_offset 1, etc."""
     c_move = ffi.new("pyhanabi_move_t*")
-    assert lib.GetRevealColorMove(target_offset, color, c_move)
+    success = lib.GetRevealColorMove(target_offset, color, c_move)
+    assert success
     return HanabiMove(c_move)
 
   @staticmethod
   def get_reveal_rank_move(target_offset, rank):
     """current player is 0, next player clockwise is target_offset 1, etc."""
     c_move = ffi.new("pyhanabi_move_t*")
-    assert lib.GetRevealRankMove(target_offset, rank, c_move)
+    success = lib.GetRevealRankMove(target_offset, rank, c_move)
+    assert success
     return HanabiMove(c_move)
 
   def __str__(self):
@@ -502,27 +650,52 @@ class HanabiState(object):
   Python wrapper of C++ HanabiState class.
   """
 
-  def __init__(self, game, c_state=None):
+  def __init__(self, game, c_state=None, episode=None):
     """Returns a new state.
 
     Args:
       game: HanabiGame describing the parameters for a game of Hanabi.
       c_state: C++ state to copy, or None for a new state.
+      episode: episode number seeding the random deals of a new state, or
+        None to take the game's next episode number. A game seed and episode
+        always give the same deals, so an episode can be replayed, or run on
+        any thread, from (seed, episode).
 
     NOTE: If c_state is supplied, game is ignored and c_state game is used.
     """
     self._state = ffi.new("pyhanabi_state_t*")
     if c_state is None:
       self._game = game.c_game
-      lib.NewState(self._game, self._state)
+      if episode is None:
+        lib.NewState(self._game, self._state)
+      else:
+        lib.NewStateForEpisode(self._game, episode, self._state)
     else:
       self._game = ffi.new("pyhanabi_game_t*")
       lib.StateParentGame(c_state, self._game)
       lib.CopyState(c_state, self._state)
 
-  def copy(self):
-    """Returns a copy of the state."""
-    return HanabiState(None, self._state)
+  def copy(self, episode=None):
+    """Returns a copy of the state.
+
+    The copy carries the same generator state, so by default it deals the
+    same cards as the original would, given the same moves. Rollouts that
+    should diverge can pass an episode number.
+
+    Args:
+      episode: int, if not None the copy's generator is restarted as for a
+        new state of this episode, e.g. game.next_episode() for a fresh one.
+        The cards already dealt are unchanged.
+    """
+    state = HanabiState(None, self._state)
+    if episode is not None:
+      lib.StateReseed(state.c_state, episode)
+    return state
+
+  @property
+  def c_state(self):
+    """Return the C++ HanabiState object."""
+    return self._state
 
   def observation(self, player):
     """Returns player's observed view of current environment state."""
@@ -532,6 +705,21 @@ class HanabiState(object):
     """Advance the environment state by making move for acting player."""
     lib.StateApplyMove(self._state, move.c_move)
 
+  def apply_move_unchecked(self, move):
+    """Same as apply_move(), without checking that move is legal.
+
+    Only for moves known to be legal, e.g. taken from legal_moves() or
+    legal_moves_mask(). Applying an illegal move corrupts the state.
+    """
+    lib.StateApplyMoveUnchecked(self._state, move.c_move)
+
+  def legal_move_uid(self, move):
+    """Returns the uid of move if it is legal for the active agent, else -1.
+
+    A constant-time alternative to move_is_legal() for non-chance moves.
+    """
+    return lib.StateLegalMoveUid(self._state, move.c_move)
+
   def cur_player(self):
     """Returns index of next player to act.
 
@@ -539,6 +727,22 @@ class HanabiState(object):
     """
     return lib.StateCurPlayer(self._state)
 
+  def episode(self):
+    """Returns the episode number the state's random deals were seeded with."""
+    return lib.StateEpisode(self._state)
+
+  def rng_state(self):
+    """Returns the state of the generator used by deal_random_card()."""
+    return lib.StateRngState(self._state)
+
+  def set_rng_state(self, rng_state):
+    """Restores a generator state returned by rng_state().
+
+    Subsequent calls to deal_random_card() deal the same cards as they did
+    after rng_state() was read, given the same moves.
+    """
+    lib.StateSetRngState(self._state, rng_state)
+
   def deck_size(self):
     """Returns number of cards left in the deck."""
     return lib.StateDeckSize(self._state)
@@ -607,6 +811,33 @@ class HanabiState(object):
     lib.DeleteMoveList(c_movelist)
     return moves
 
+  def legal_moves_mask(self, out=None, additive=False):
+    """Returns a mask over move uids of the legal moves for the active agent.
+
+    The mask is written by a single library call, without creating any
+    HanabiMove objects. All entries are illegal when a chance event is due.
+
+    Args:
+      out: optional C-contiguous array of at least max_moves() entries to
+        write into; uint8 or bool for a plain mask, float32 if additive.
+      additive: bool, if True write 0 for legal and -inf for illegal moves
+        (suitable for adding to Q-values) instead of 1 and 0.
+
+    Returns:
+      out, or a new numpy array if out is None.
+    """
+    return _legal_moves_mask(self._state, lib.MaxMoves(self._game), out,
+                             additive, lib.StateLegalMovesMask,
+                             lib.StateLegalMovesAdditiveMask)
+
+  def legal_moves_bitmask(self):
+    """Returns an int whose bit uid is set iff move uid is legal.
+
+    The bitmask is kept up to date by the state as moves are applied, so this
+    is a constant-time lookup. It is 0 when a chance event is due.
+    """
+    return lib.StateLegalMovesBitmask(self._state)
+
   def move_is_legal(self, move):
     """Returns true if and only if move is legal for active agent."""
     return lib.MoveIsLegal(self._state, move.c_move)
@@ -712,8 +943,17 @@ class HanabiGame(object):
       self._game = ffi.new("pyhanabi_game_t*")
       lib.NewGame(self._game, len(param_list), c_array)
 
-  def new_initial_state(self):
-    return HanabiState(self)
+  def new_initial_state(self, episode=None):
+    """Returns a new state; see HanabiState for the episode argument."""
+    return HanabiState(self, episode=episode)
+
+  def seed(self):
+    """Returns the seed the game's random deals are derived from."""
+    return lib.GameSeed(self._game)
+
+  def next_episode(self):
+    """Returns a new episode number, as taken by new_initial_state()."""
+    return lib.GameNextEpisode(self._game)
 
   @property
   def c_game(self):
@@ -800,6 +1040,7 @@ class HanabiObservation(object):
     """Construct using HanabiState.observation(player)."""
     self._observation = ffi.new("pyhanabi_observation_t*")
     self._game = game
+    self._export = None
     lib.NewObservation(state, player, self._observation)
 
   def __str__(self):
@@ -918,6 +1159,23 @@ class HanabiObservation(object):
       moves.append(HanabiMove(move))
     return moves
 
+  def legal_moves_mask(self, out=None, additive=False):
+    """Returns a mask over move uids of the observing player's legal moves.
+
+    Same as HanabiState.legal_moves_mask(); all entries are illegal if the
+    observer is not currently acting.
+    """
+    return _legal_moves_mask(self._observation, lib.MaxMoves(self._game), out,
+                             additive, lib.ObsLegalMovesMask,
+                             lib.ObsLegalMovesAdditiveMask)
+
+  def legal_moves_bitmask(self):
+    """Same as HanabiState.legal_moves_bitmask() for the observing player.
+
+    0 if the observer is not currently acting.
+    """
+    return lib.ObsLegalMovesBitmask(self._observation)
+
   def card_playable_on_fireworks(self, color, rank):
     """Returns true if and only if card can be successfully played.
 
@@ -927,6 +1185,39 @@ class HanabiObservation(object):
     """
     return lib.ObsCardPlayableOnFireworks(self._observation, color, rank)
 
+  def export(self):
+    """Returns the whole observation as a flat tuple of ints.
+
+    The tuple is read with a single library call, in the layout documented
+    at ObsExport in pyhanabi.h. Observations are snapshots, so it is only
+    read once and cached.
+    """
+    if self._export is None:
+      length = _EXPORT_BUFFER_LENGTH
+      while True:
+        c_buffer = _new_uncleared("int[]", length)
+        needed = lib.ObsExport(self._observation, c_buffer, length)
+        if needed <= length:
+          break
+        length = needed
+      self._export = tuple(ffi.unpack(c_buffer, needed))
+    return self._export
+
+  def to_dict(self):
+    """Returns the observation as a dict, decoded from export().
+
+    The keys are those of the rl_env player observations that describe the
+    game ('current_player_offset', 'life_tokens', 'information_tokens',
+    'num_players', 'deck_size', 'fireworks', 'legal_moves',
+    'legal_moves_as_int', 'observed_hands', 'discard_pile' and
+    'card_knowledge'), with the same values, plus 'last_moves': a list of
+    dicts mirroring HanabiHistoryItem, most recent first.
+
+    Each call decodes a new dict from the cached export(), so the caller may
+    modify it.
+    """
+    return _decode_observation(self.export())
+
 
 class ObservationEncoderType(enum.IntEnum):
   """Encoder types, consistent with observation_encoder.h."""
@@ -961,16 +1252,212 @@ class ObservationEncoder(object):
     shape = [int(x) for x in shape_string.split(",")]
     return shape
 
+  def size(self):
+    """Returns the number of entries in a flattened encoding."""
+    return lib.ObservationLength(self._encoder)
+
+  def packed_size(self):
+    """Returns the number of bytes in a bit-packed encoding."""
+    return (self.size() + 7) // 8
+
   def encode(self, observation):
     """Encode the observation as a sequence of bits."""
-    c_encoding_str = lib.EncodeObservation(self._encoder,
-                                           observation.observation())
-    encoding_string = encode_ffi_string(c_encoding_str)
-    lib.DeleteString(c_encoding_str)
-    # Canonical observations are bit strings, so it is ok to encode using a
-    # string. For float or double observations, make a custom object
-    encoding = [int(x) for x in encoding_string.split(",")]
-    return encoding
+    return self.encode_numpy(observation).tolist()
+
+  def encode_into(self, observation, out, packed=False):
+    """Encode the observation directly into a caller-supplied buffer.
+
+    No intermediate strings or Python integers are created, so this is the
+    preferred method when the encoding is fed straight into a tensor.
+
+    Args:
+      observation: HanabiObservation to encode.
+      out: writable, C-contiguous buffer (e.g. a uint8 numpy array) with at
+        least size() bytes, or packed_size() bytes if packed is True.
+      packed: bool, if True pack 8 bits per byte, most significant bit first
+        (the layout used by numpy.packbits).
+
+    Returns:
+      out, filled with the encoding.
+
+    Raises:
+      TypeError: If out is a numpy array whose dtype is not uint8.
+    """
+    c_buffer = _writable_buffer(out, "unsigned char[]", np.uint8)
+    if packed:
+      lib.EncodeObservationToPackedBuffer(self._encoder,
+                                          observation.observation(), c_buffer,
+                                          len(c_buffer))
+    else:
+      lib.EncodeObservationToBuffer(self._encoder, observation.observation(),
+                                    c_buffer, len(c_buffer))
+    return out
+
+  def encode_numpy(self, observation, packed=False):
+    """Returns the encoding as a new uint8 numpy array.
+
+    Args:
+      observation: HanabiObservation to encode.
+      packed: bool, if True return the bit-packed encoding of packed_size()
+        bytes rather than one byte per bit.
+    """
+    out = np.empty(self.packed_size() if packed else self.size(),
+                   dtype=np.uint8)
+    return self.encode_into(observation, out, packed=packed)
+
+  def encode_state(self, state, out=None):
+    """Encode every player's observation of state in one library call.
+
+    The encodings are computed from the state directly, without building a
+    HanabiObservation per player. Row p equals
+    encode_numpy(state.observation(p)). Only canonical encoders support this.
+
+    Args:
+      state: HanabiState to encode.
+      out: optional writable, C-contiguous uint8 buffer with room for
+        num_players * size() bytes. A new [num_players, size()] array is
+        allocated if None.
+
+    Returns:
+      out, filled with the encodings.
+
+    Raises:
+      TypeError: If out is a numpy array whose dtype is not uint8.
+    """
+    if out is None:
+      out = np.empty((lib.NumPlayers(self._game), self.size()),
+                     dtype=np.uint8)
+    c_buffer = _writable_buffer(out, "unsigned char[]", np.uint8)
+    lib.EncodeStateToBuffer(self._encoder, state.c_state, c_buffer,
+                            len(c_buffer))
+    return out
+
+
+class HanabiVectorEnv(object):
+  """A batch of independent games stepped together by the C++ library.
+
+  Every call crosses the library boundary once for the whole batch. Outputs
+  are written into caller-supplied, C-contiguous numpy arrays:
+
+    observations:    uint8 [num_envs, num_players, observation_length]
+    legal_moves:     uint8 [num_envs, max_moves], 1 where a move is legal.
+    current_players: int32 [num_envs]
+    rewards:         float32 [num_envs]
+    dones:           uint8 or bool [num_envs]
+
+  Any output may be None to skip writing it. Finished games are reset
+  automatically, so the outputs for them describe the start of a new game.
+
+  Python wrapper of C++ HanabiVectorEnv class.
+  """
+
+  def __init__(self, game, num_envs, verify_encoding=False):
+    """Creates num_envs games, each dealt up to the first player move.
+
+    Observations are encoded incrementally, rewriting only the parts of the
+    previous encoding that each move changed.
+
+    Args:
+      game: HanabiGame describing the parameters shared by all games.
+      num_envs: int, number of games to run.
+      verify_encoding: bool, if True check every incremental encoding
+        against a full one, aborting on any difference. Slower; meant for
+        debugging.
+    """
+    self._game = game
+    self._env = ffi.new("pyhanabi_vector_env_t*")
+    lib.NewVectorEnv(self._env, game.c_game, num_envs, verify_encoding)
+
+  def __del__(self):
+    if self._env is not None:
+      lib.DeleteVectorEnv(self._env)
+      self._env = None
+    del self
+
+  def num_envs(self):
+    """Returns the number of games in the batch."""
+    return lib.VectorEnvNumEnvs(self._env)
+
+  def observation_length(self):
+    """Returns the length of one player's canonical encoding."""
+    return lib.VectorEnvObservationLength(self._env)
+
+  def state(self, index):
+    """Returns a copy of the state of game index."""
+    c_state = ffi.new("pyhanabi_state_t*")
+    lib.VectorEnvGetState(self._env, index, c_state)
+    return HanabiState(None, c_state)
+
+  def reset_all(self, observations=None, legal_moves=None,
+                current_players=None):
+    """Starts a new game in every environment and writes the outputs.
+
+    Raises:
+      TypeError: If an output is not a numpy array of the documented dtype.
+      ValueError: If an output does not have the documented shape or is not
+        C-contiguous.
+    """
+    lib.VectorEnvResetAll(self._env, *self._output_buffers(
+        observations, legal_moves, current_players))
+
+  def step(self, actions, observations=None, legal_moves=None,
+           current_players=None, rewards=None, dones=None):
+    """Applies one move uid per game and writes the outputs.
+
+    Args:
+      actions: int32 array [num_envs] of move uids, each legal for the current
+        player of the corresponding game.
+      observations, legal_moves, current_players, rewards, dones: output
+        arrays as described in the class docstring, or None.
+
+    Raises:
+      TypeError: If an array is not a numpy array of the documented dtype.
+      ValueError: If an array does not have the documented shape or is not
+        C-contiguous.
+    """
+    num_envs = self.num_envs()
+    c_actions = self._buffer("actions", actions, "int[]", (num_envs,),
+                             np.int32)
+    c_observations, c_legal_moves, c_current_players = self._output_buffers(
+        observations, legal_moves, current_players)
+    c_rewards = self._buffer("rewards", rewards, "float[]", (num_envs,),
+                             np.float32)
+    c_dones = self._buffer("dones", dones, "unsigned char[]", (num_envs,),
+                           np.uint8, np.bool_)
+    lib.VectorEnvStep(self._env, c_actions, c_observations, c_legal_moves,
+                      c_current_players, c_rewards, c_dones)
+
+  def _output_buffers(self, observations, legal_moves, current_players):
+    """Returns the buffers of the outputs written by both reset and step."""
+    num_envs = self.num_envs()
+    return (
+        self._buffer("observations", observations, "unsigned char[]",
+                     (num_envs, self._game.num_players(),
+                      self.observation_length()), np.uint8),
+        self._buffer("legal_moves", legal_moves, "unsigned char[]",
+                     (num_envs, self._game.max_moves()), np.uint8),
+        self._buffer("current_players", current_players, "int[]",
+                     (num_envs,), np.int32))
+
+  @staticmethod
+  def _buffer(name, array, c_type, shape, *dtypes):
+    """Returns a cdata view of array, or NULL if it is None.
+
+    The library reads and writes the whole shape without further checks, so
+    the dtype, shape and layout are checked here.
+    """
+    if array is None:
+      return ffi.NULL
+    if not isinstance(array, np.ndarray):
+      raise TypeError("Expected {} as a numpy array, got {}.".format(
+          name, type(array).__name__))
+    _check_dtype(name, array, *dtypes)
+    if array.shape != shape:
+      raise ValueError("Expected {} of shape {}, got {}.".format(
+          name, shape, array.shape))
+    if not array.flags["C_CONTIGUOUS"]:
+      raise ValueError("Expected {} as a C-contiguous array.".format(name))
+    return ffi.from_buffer(c_type, array)
 
 
 try_cdef()
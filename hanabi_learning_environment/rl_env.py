@@ -16,6 +16,10 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import collections.abc
+
+import numpy as np
+
 from hanabi_learning_environment import pyhanabi
 from hanabi_learning_environment.pyhanabi import color_char_to_idx
 
@@ -61,7 +65,7 @@ class Environment(object):
       info: dict, Optional debugging information.
 
     Raises:
-      AssertionError: When an illegal action is provided.
+      ValueError: When an illegal action is provided.
     """
     raise NotImplementedError("Not implemented in Abstract Base class")
 
@@ -82,7 +86,8 @@ class HanabiEnv(Environment):
   ```
   """
 
-  def __init__(self, config):
+  def __init__(self, config, lazy_observations=True,
+               current_player_only=False, debug=False):
     r"""Creates an environment with the given game configuration.
 
     Args:
@@ -99,13 +104,43 @@ class HanabiEnv(Environment):
             1: First-order common knowledge observation.
           - seed: int, Random seed.
           - random_start_player: bool, Random start player.
+      lazy_observations: bool, If True, player observations are
+        `LazyObservation` mappings whose fields are only computed when first
+        read. If False, they are plain dicts built eagerly.
+      current_player_only: bool, If True, only the acting player's
+        observation is built; the entries for all other players in
+        'player_observations' are None.
+      debug: bool, If True, actions are validated with the full
+        `HanabiState.move_is_legal` check and applied with the checked
+        `apply_move`. Otherwise they are validated by uid against the legal
+        moves bitmask, then applied without being checked again.
     """
     assert isinstance(config, dict), "Expected config to be of type dict."
     self.game = pyhanabi.HanabiGame(config)
+    self.debug = debug
 
     self.observation_encoder = pyhanabi.ObservationEncoder(
         self.game, pyhanabi.ObservationEncoderType.CANONICAL)
     self.players = self.game.num_players()
+    self.lazy_observations = lazy_observations
+    self.current_player_only = current_player_only
+    # Fields mapped to None are structured: they are all taken from one
+    # HanabiObservation.to_dict() call on the first read of any of them.
+    self._observation_fields = collections.OrderedDict([
+        ("current_player_offset", lambda obs: obs.cur_player_offset()),
+        ("life_tokens", lambda obs: obs.life_tokens()),
+        ("information_tokens", lambda obs: obs.information_tokens()),
+        ("num_players", lambda obs: obs.num_players()),
+        ("deck_size", lambda obs: obs.deck_size()),
+        ("fireworks", self._extract_fireworks),
+        ("legal_moves", None),
+        ("legal_moves_as_int", self._extract_legal_moves_as_int),
+        ("observed_hands", None),
+        ("discard_pile", None),
+        ("card_knowledge", None),
+        ("vectorized", self.observation_encoder.encode),
+        ("pyhanabi", lambda obs: obs),
+    ])
 
   def reset(self):
     r"""Resets the environment for a new game.
@@ -338,21 +373,27 @@ class HanabiEnv(Environment):
       info: dict, Optional debugging information.
 
     Raises:
-      AssertionError: When an illegal action is provided.
+      ValueError: When an illegal action is provided.
     """
     if isinstance(action, dict):
       # Convert dict action HanabiMove
       action = self._build_move(action)
     elif isinstance(action, int):
       # Convert int action into a Hanabi move.
+      if not 0 <= action < self.game.max_moves():
+        raise ValueError("Illegal action: {}".format(action))
       action = self.game.get_move(action)
+      self._check_legal(action)
     else:
       raise ValueError("Expected action as dict or int, got: {}".format(
           action))
 
     last_score = self.state.score()
-    # Apply the action to the state.
-    self.state.apply_move(action)
+    # Apply the action to the state. It was validated above.
+    if self.debug:
+      self.state.apply_move(action)
+    else:
+      self.state.apply_move_unchecked(action)
 
     while self.state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
       self.state.deal_random_card()
@@ -372,11 +413,16 @@ class HanabiEnv(Environment):
       dict, containing observations for all players.
     """
     obs = {}
-    player_observations = [self._extract_dict_from_backend(
-        player_id, self.state.observation(player_id))
-        for player_id in range(self.players)]  # pylint: disable=bad-continuation
+    current_player = self.state.cur_player()
+    player_observations = []
+    for player_id in range(self.players):
+      if self.current_player_only and player_id != current_player:
+        player_observations.append(None)
+      else:
+        player_observations.append(self._extract_dict_from_backend(
+            player_id, self.state.observation(player_id)))
     obs["player_observations"] = player_observations
-    obs["current_player"] = self.state.cur_player()
+    obs["current_player"] = current_player
     return obs
 
   def _extract_dict_from_backend(self, player_id, observation):
@@ -387,56 +433,21 @@ class HanabiEnv(Environment):
       observation: A `pyhanabi.HanabiObservation` object.
 
     Returns:
-      obs_dict: dict, mapping from HanabiObservation to a dict.
+      obs_dict: dict, mapping from HanabiObservation to a dict. A
+        `LazyObservation` with the same keys if lazy_observations is set.
     """
-    obs_dict = {}
+    obs_dict = LazyObservation(self._observation_fields, observation)
     obs_dict["current_player"] = self.state.cur_player()
-    obs_dict["current_player_offset"] = observation.cur_player_offset()
-    obs_dict["life_tokens"] = observation.life_tokens()
-    obs_dict["information_tokens"] = observation.information_tokens()
-    obs_dict["num_players"] = observation.num_players()
-    obs_dict["deck_size"] = observation.deck_size()
-
-    obs_dict["fireworks"] = {}
-    fireworks = self.state.fireworks()
-    for color, firework in zip(pyhanabi.COLOR_CHAR, fireworks):
-      obs_dict["fireworks"][color] = firework
-
-    obs_dict["legal_moves"] = []
-    obs_dict["legal_moves_as_int"] = []
-    for move in observation.legal_moves():
-      obs_dict["legal_moves"].append(move.to_dict())
-      obs_dict["legal_moves_as_int"].append(self.game.get_move_uid(move))
-
-    obs_dict["observed_hands"] = []
-    for player_hand in observation.observed_hands():
-      cards = [card.to_dict() for card in player_hand]
-      obs_dict["observed_hands"].append(cards)
-
-    obs_dict["discard_pile"] = [
-        card.to_dict() for card in observation.discard_pile()
-    ]
-
-    # Return hints received.
-    obs_dict["card_knowledge"] = []
-    for player_hints in observation.card_knowledge():
-      player_hints_as_dicts = []
-      for hint in player_hints:
-        hint_d = {}
-        if hint.color() is not None:
-          hint_d["color"] = pyhanabi.color_idx_to_char(hint.color())
-        else:
-          hint_d["color"] = None
-        hint_d["rank"] = hint.rank()
-        player_hints_as_dicts.append(hint_d)
-      obs_dict["card_knowledge"].append(player_hints_as_dicts)
-
-    # ipdb.set_trace()
-    obs_dict["vectorized"] = self.observation_encoder.encode(observation)
-    obs_dict["pyhanabi"] = observation
-
+    if not self.lazy_observations:
+      obs_dict = dict(obs_dict)
     return obs_dict
 
+  def _extract_fireworks(self, observation):
+    return dict(zip(pyhanabi.COLOR_CHAR, observation.fireworks()))
+
+  def _extract_legal_moves_as_int(self, observation):
+    return np.flatnonzero(observation.legal_moves_mask()).tolist()
+
   def _build_move(self, action):
     """Build a move from an action dict.
 
@@ -489,14 +500,206 @@ class HanabiEnv(Environment):
     else:
       raise ValueError("Unknown action_type: {}".format(action_type))
 
-    legal_moves = self.state.legal_moves()
-    assert (str(move) in map(
-        str,
-        legal_moves)), "Illegal action: {}. Move should be one of : {}".format(
-            move, legal_moves)
-
+    self._check_legal(move)
     return move
 
+  def _check_legal(self, move):
+    """Checks that move is legal for the current player.
+
+    The check does not rely on `assert`, since illegal moves are applied
+    unchecked afterwards when not in debug mode.
+
+    Args:
+      move: A `HanabiMove` object.
+
+    Raises:
+      ValueError: When move is illegal.
+    """
+    if self.debug:
+      legal = self.state.move_is_legal(move)
+    else:
+      legal = self.state.legal_move_uid(move) >= 0
+    if not legal:
+      raise ValueError("Illegal action: {}. Move should be one of : {}".format(
+          move, self.state.legal_moves()))
+
+
+class LazyObservation(collections.abc.MutableMapping):
+  """Player observation dict whose fields are computed on first access.
+
+  Behaves like the dict built by HanabiEnv, with the same keys, but each
+  value is extracted from the underlying `pyhanabi.HanabiObservation` only
+  when it is first read and then cached. Fields that are never read, such as
+  the card knowledge of a player who is not acting, cost nothing.
+
+  The wrapped HanabiObservation is a snapshot of the game, so values stay
+  correct even if they are first read after the environment has moved on.
+  Use dict(observation) to materialize every field.
+  """
+
+  def __init__(self, fields, observation):
+    """Creates a lazy view of observation.
+
+    Args:
+      fields: ordered mapping from key to a function taking the
+        `pyhanabi.HanabiObservation` and returning the value for that key, or
+        to None for keys of `HanabiObservation.to_dict()`. Those are decoded
+        together on the first read of any of them.
+      observation: A `pyhanabi.HanabiObservation` object.
+    """
+    self._fields = fields
+    self._observation = observation
+    self._values = {}
+    self._keys = collections.OrderedDict.fromkeys(fields)
+
+  def __getitem__(self, key):
+    if key not in self._values:
+      if key not in self._keys:
+        raise KeyError(key)
+      field_fn = self._fields.get(key)
+      if field_fn is not None:
+        self._values[key] = field_fn(self._observation)
+      else:
+        self._read_dict_fields()
+    return self._values[key]
+
+  def _read_dict_fields(self):
+    """Caches every unread to_dict() field from one decode."""
+    values = self._observation.to_dict()
+    for key, field_fn in self._fields.items():
+      if field_fn is None and key in self._keys and key not in self._values:
+        self._values[key] = values[key]
+
+  def __setitem__(self, key, value):
+    self._keys[key] = None
+    self._values[key] = value
+
+  def __delitem__(self, key):
+    del self._keys[key]
+    self._values.pop(key, None)
+
+  def __iter__(self):
+    return iter(self._keys)
+
+  def __len__(self):
+    return len(self._keys)
+
+  def __contains__(self, key):
+    return key in self._keys
+
+  def __repr__(self):
+    return repr(dict(self))
+
+
+class VectorHanabiEnv(Environment):
+  """Batched RL interface running many Hanabi games in lock step.
+
+  All games share one configuration and are owned by the C++ library, so each
+  reset or step crosses the library boundary once for the whole batch.
+  Observations are numpy arrays rather than dicts:
+
+  ```python
+
+  environment = rl_env.VectorHanabiEnv({'players': 2}, num_envs=256)
+  observations = environment.reset_all()
+  while training:
+    # One move uid per game, legal for that game's current player.
+    actions = policy(observations['vectorized'], observations['legal_moves'])
+    observations, rewards, dones, _ = environment.step(actions)
+  ```
+
+  Games that finish are reset automatically; their entries in the returned
+  observations describe the first position of the new game.
+  """
+
+  def __init__(self, config, num_envs, debug=False):
+    """Creates num_envs games sharing the given game configuration.
+
+    Args:
+      config: dict, With parameters for the game, as for HanabiEnv.
+      num_envs: int, number of games to run concurrently.
+      debug: bool, If True, the incrementally updated observation encodings
+        are checked against full encodings after every step.
+    """
+    assert isinstance(config, dict), "Expected config to be of type dict."
+    self.game = pyhanabi.HanabiGame(config)
+    self.num_envs = num_envs
+    self.players = self.game.num_players()
+    self.debug = debug
+    self._vector_env = pyhanabi.HanabiVectorEnv(self.game, num_envs,
+                                                verify_encoding=debug)
+    self._observation_length = self._vector_env.observation_length()
+
+  def reset(self, config=None):
+    """Resets all games. Equivalent to reset_all()."""
+    return self.reset_all()
+
+  def reset_all(self):
+    """Starts a new game in every environment.
+
+    Returns:
+      observations: dict, containing
+        - 'vectorized': uint8 array [num_envs, players, observation_length],
+          the canonical encoding from every player's point of view.
+        - 'legal_moves': uint8 array [num_envs, num_moves], 1 for move uids
+          that are legal for the current player.
+        - 'current_player': int32 array [num_envs].
+    """
+    observations = self._new_observations()
+    self._vector_env.reset_all(observations["vectorized"],
+                               observations["legal_moves"],
+                               observations["current_player"])
+    return observations
+
+  def vectorized_observation_shape(self):
+    """Returns the shape of one player's vectorized observation."""
+    return [self._observation_length]
+
+  def num_moves(self):
+    """Returns the total number of moves in this game (legal or not)."""
+    return self.game.max_moves()
+
+  def state(self, index):
+    """Returns a copy of the `pyhanabi.HanabiState` of game index."""
+    return self._vector_env.state(index)
+
+  def step(self, actions):
+    """Take one step in every game.
+
+    Args:
+      actions: array-like of num_envs int move uids, each legal for the
+        current player of the corresponding game.
+
+    Returns:
+      observations: dict, as returned by reset_all().
+      rewards: float32 array [num_envs], score differential of the step.
+      dones: bool array [num_envs], True where a game ended on this step (and
+        was then reset).
+      info: dict, Optional debugging information.
+    """
+    actions = np.ascontiguousarray(actions, dtype=np.int32)
+    assert actions.shape == (self.num_envs,), (
+        "Expected {} actions, got shape {}".format(self.num_envs,
+                                                   actions.shape))
+    observations = self._new_observations()
+    rewards = np.empty(self.num_envs, dtype=np.float32)
+    dones = np.empty(self.num_envs, dtype=np.bool_)
+    self._vector_env.step(actions, observations["vectorized"],
+                          observations["legal_moves"],
+                          observations["current_player"], rewards, dones)
+    return (observations, rewards, dones, {})
+
+  def _new_observations(self):
+    return {
+        "vectorized":
+            np.empty((self.num_envs, self.players, self._observation_length),
+                     dtype=np.uint8),
+        "legal_moves":
+            np.empty((self.num_envs, self.num_moves()), dtype=np.uint8),
+        "current_player":
+            np.empty(self.num_envs, dtype=np.int32),
+    }
+
 
 def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None):
   """Make an environment.
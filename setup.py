@@ -6,5 +6,5 @@ setup(
     description='Learning environment for the game of hanabi.',
     author='deepmind/hanabi-learning-environment',
     packages=['hanabi_learning_environment', 'hanabi_learning_environment.agents'],
-    install_requires=['cffi']
+    install_requires=['cffi', 'numpy']
 )